@@ -0,0 +1,131 @@
+# flow_budget.py [Memory budget for the live flow table (--max-flows / --max-memory)]
+# A SYN scan or UDP flood creates one flow per spoofed 5-tuple. Once the table goes over
+# budget, one eviction round brings it back to LOW_WATER of the budget by removing the
+# least recently active flows ("lru") or the ones with the fewest packets ("small"):
+#   finalize  hand them to on_evict right away; later packets of the flow start a new one
+#   spill     pickle them to a temporary file; drain() merges every fragment back, so the
+#             sent features are exact and only the resident flows cost memory
+# Table memory is estimated from flow and packet counts (FlowRecord sizes, see
+# flow_table.py), not measured, so the cut-off is deterministic and cheap to check.
+# counters() is sent along with every batch so the server sees when the client degrades.
+
+import heapq, math, os, pickle, tempfile, threading
+
+
+FLOW_BYTES = 1000      # FlowRecord + packed key + dict slot of a 1-packet IPv4 flow
+PACKET_BYTES = 14      # timestamp (8) + length (4) + flag word (2) per packet
+LOW_WATER = 0.9        # evict down to this fraction of the budget, so rounds are rare
+
+
+class FlowBudget:
+    """Keeps a flows dict of FlowRecords within max_flows / max_memory (bytes, estimated)"""
+
+    def __init__(self, max_flows=0, max_memory=0, policy="lru", mode="finalize", on_evict=None, spill_dir=None):
+        self.max_flows = max_flows
+        self.max_memory = max_memory
+        self.policy = policy
+        self.mode = mode
+        self.on_evict = on_evict
+        self.spill_dir = spill_dir
+        self.spill = None
+        self.spill_index = {}     # key -> offsets of its spilled fragments, in spill order
+        self.packets = 0          # packets held by resident flows
+        self.lock = threading.Lock()
+        self.stats = {"eviction_rounds": 0, "evicted_flows": 0, "evicted_packets": 0,
+                      "finalized_early": 0, "spilled_flows": 0, "spill_bytes": 0,
+                      "restored_fragments": 0, "peak_flows": 0}
+
+    def memory(self, n_flows):
+        return n_flows * FLOW_BYTES + self.packets * PACKET_BYTES
+
+    def over(self, n_flows):
+        return ((self.max_flows and n_flows > self.max_flows) or
+                (self.max_memory and self.memory(n_flows) > self.max_memory))
+
+    #Call after every packet added to flows
+    def account(self, flows):
+        self.packets += 1
+        n = len(flows)
+        if n > self.stats["peak_flows"]: self.stats["peak_flows"] = n
+        if self.over(n):
+            with self.lock:
+                self.evict(flows)
+
+    def _victims(self, flows, k):
+        if self.policy == "small":
+            return heapq.nsmallest(k, flows.items(), key=lambda kv: kv[1].packets())
+        return heapq.nsmallest(k, flows.items(), key=lambda kv: kv[1].end)
+
+    def evict(self, flows):
+        n = len(flows)
+        k = 0
+        if self.max_flows and n > self.max_flows * LOW_WATER:
+            k = n - int(self.max_flows * LOW_WATER)
+        if self.max_memory and self.memory(n) > self.max_memory * LOW_WATER:
+            # flows to drop at the current average size, at least one
+            k = max(k, math.ceil(n * (1 - self.max_memory * LOW_WATER / self.memory(n))), 1)
+        victims = self._victims(flows, min(k, n))
+        if not victims:
+            return
+        self.stats["eviction_rounds"] += 1
+        self.stats["evicted_flows"] += len(victims)
+        for key, f in victims:
+            del flows[key]
+            pk = f.packets()
+            self.packets -= pk
+            self.stats["evicted_packets"] += pk
+        if self.mode == "spill":
+            self._spill(victims)
+        else:
+            self.stats["finalized_early"] += len(victims)
+            if self.on_evict is not None:
+                self.on_evict([f for _, f in victims])
+
+    def _spill(self, victims):
+        if self.spill is None:
+            self.spill = tempfile.TemporaryFile(prefix="flowspill_", dir=self.spill_dir)
+        self.spill.seek(0, os.SEEK_END)
+        for key, f in victims:
+            data = pickle.dumps(f, pickle.HIGHEST_PROTOCOL)
+            self.spill_index.setdefault(key, []).append((self.spill.tell(), len(data)))
+            self.spill.write(data)
+            self.stats["spill_bytes"] += len(data)
+        self.stats["spilled_flows"] += len(victims)
+
+    #Every flow, spilled fragments merged in front of the resident part; empties the table.
+    #Only the swap holds the lock, eviction can go on (into a fresh spill file) meanwhile.
+    def drain(self, flows):
+        with self.lock:
+            resident = dict(flows)
+            flows.clear()
+            self.packets = 0
+            index, self.spill_index = self.spill_index, {}
+            spill, self.spill = self.spill, None
+        try:
+            for key, offsets in index.items():
+                f = None
+                for off, size in offsets:
+                    spill.seek(off)
+                    part = pickle.loads(spill.read(size))
+                    if f is None: f = part
+                    else: f.extend(part)
+                tail = resident.pop(key, None)
+                if tail is not None:
+                    f.extend(tail)
+                self.stats["restored_fragments"] += len(offsets)
+                yield f
+        finally:
+            if spill is not None: spill.close()
+        yield from resident.values()
+
+    def counters(self, n_flows=None):
+        out = dict(self.stats)
+        if n_flows is not None:
+            out["flows"] = n_flows
+            out["est_bytes"] = self.memory(n_flows)
+        out["spilled_pending"] = len(self.spill_index)
+        return out
+
+    def close(self):
+        if self.spill is not None:
+            self.spill.close(); self.spill = None
@@ -382,6 +382,9 @@ async def receive_batch_flows(request: Request):
         
         device_id = data.get("device_id")
         flows = data.get("flows", [])
+        flow_table = data.get("flow_table")  # client flow-table budget counters, if it runs with one
+        if flow_table and flow_table.get("evicted_flows"):
+            logger.warning(f"Device {device_id} is over its flow budget: {flow_table}")
         
         if not device_id:
             logger.error("device_id is required but not provided")
@@ -452,7 +455,8 @@ async def receive_batch_flows(request: Request):
             await devices_collection.update_one(
                 {"device_id": device_id},
                 {
-                    "$set": {"last_seen": datetime.now(timezone.utc)},
+                    "$set": {"last_seen": datetime.now(timezone.utc),
+                             **({"flow_table": flow_table} if flow_table else {})},
                     "$inc": {"total_flows": inserted_count}
                 }
             )
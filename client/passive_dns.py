@@ -0,0 +1,116 @@
+# passive_dns.py [IP -> hostname from the DNS answers seen on the wire: bounded, TTL-aware LRU]
+# The capture already sees the lookups that precede most connections. Each DNS response's
+# A/AAAA answers are filed under the name the client asked for (the question, not the CNAME
+# chain), valid for the record's TTL from the moment it was seen. Flows are enriched when
+# their records are built, by looking up the server address at the flow's start time, so
+# nothing on the capture path ever waits for a resolver. At most MAX_ENTRIES addresses are
+# kept; the least recently used go first.
+
+import socket, struct, threading
+from collections import OrderedDict
+
+
+MAX_ENTRIES = 65536
+MIN_TTL = 60            # seconds; TTL 0/short answers still cover the connection that follows
+MAX_TTL = 86400
+SNI_TTL = 300           # names taken from HTTP Host / TLS SNI carry no TTL of their own
+
+DNS_PORT = 53
+QTYPE_A, QTYPE_AAAA = 1, 28
+_hdr = struct.Struct("!HHHHHH").unpack_from
+_rr = struct.Struct("!HHIH").unpack_from
+
+
+#Name at pos -> (dotted name, position after it); follows compression pointers
+def read_name(buf, pos):
+    labels, end, hops = [], None, 0
+    while True:
+        n = buf[pos]
+        if n >= 0xC0:                                  # pointer to an earlier name
+            if end is None:
+                end = pos + 2
+            pos = ((n & 0x3F) << 8) | buf[pos + 1]
+            hops += 1
+            if hops > 16:
+                raise ValueError("DNS name pointer loop")
+            continue
+        if n == 0:
+            return ".".join(labels), pos + 1 if end is None else end
+        labels.append(str(buf[pos + 1:pos + 1 + n], "ascii", "replace"))
+        pos += 1 + n
+
+#Position after the name at pos, without decoding it
+def skip_name(buf, pos):
+    while True:
+        n = buf[pos]
+        if n >= 0xC0:
+            return pos + 2
+        if n == 0:
+            return pos + 1
+        pos += 1 + n
+
+#DNS response (UDP payload) -> (question name, [(address, ttl), ...]); None if not a usable answer
+def parse_response(buf):
+    try:
+        _, flags, qd, an, _, _ = _hdr(buf, 0)
+        if not flags & 0x8000 or flags & 0x000F or qd != 1 or an == 0:   # response, NOERROR
+            return None
+        qname, pos = read_name(buf, 12)
+        pos += 4                                       # qtype, qclass
+        answers = []
+        for _ in range(an):
+            pos = skip_name(buf, pos)
+            rtype, rclass, ttl, rdlen = _rr(buf, pos)
+            pos += 10
+            if rtype == QTYPE_A and rdlen == 4:
+                answers.append((socket.inet_ntoa(buf[pos:pos + 4]), ttl))
+            elif rtype == QTYPE_AAAA and rdlen == 16:
+                answers.append((socket.inet_ntop(socket.AF_INET6, buf[pos:pos + 16]), ttl))
+            pos += rdlen
+        return (qname.lower(), answers) if answers and qname else None
+    except (IndexError, ValueError, struct.error, OSError):
+        return None
+
+
+class DnsCache:
+    """address -> (name, expiry) in least-recently-used order; times in seconds"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()   # the capture thread adds, the send thread looks up
+        self.responses = 0             # DNS responses that gave at least one address
+        self.evicted = 0
+
+    def put(self, addr, name, ts, ttl):
+        expires = ts + min(max(ttl, MIN_TTL), MAX_TTL)
+        with self.lock:
+            entries = self.entries
+            entries[addr] = (name, expires)
+            entries.move_to_end(addr)
+            if len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.evicted += 1
+
+    #One DNS response payload seen at ts
+    def add_response(self, payload, ts):
+        parsed = parse_response(payload)
+        if parsed is None:
+            return
+        name, answers = parsed
+        self.responses += 1
+        for addr, ttl in answers:
+            self.put(addr, name, ts, ttl)
+
+    #Name for addr while its record was live at ts, else ""
+    def get(self, addr, ts):
+        with self.lock:
+            hit = self.entries.get(addr)
+            if hit is None or ts > hit[1]:
+                return ""
+            self.entries.move_to_end(addr)
+            return hit[0]
+
+    def describe(self):
+        return (f"{self.responses} DNS responses, {len(self.entries)} addresses cached"
+                f"{f', {self.evicted} evicted' if self.evicted else ''}")
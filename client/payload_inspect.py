@@ -0,0 +1,169 @@
+# payload_inspect.py [HTTP Host / TLS SNI from the first payload bytes of each flow]
+# Replaces per-packet Scapy HTTP dissection and the byte-by-byte "TLS anywhere" scan.
+# The request a client opens a connection with (HTTP request line + headers, or a TLS
+# ClientHello) sits at the start of its byte stream, so only that is parsed: in place on a
+# memoryview (struct.unpack_from / re on the buffer, no slicing copies), straight from the
+# packet's payload while it holds the whole message. A message split over segments is
+# reassembled by TCP sequence number into a small per-direction buffer, at most MAX_BYTES
+# and MAX_PACKETS payload packets. Once the name is found, the stream turns out to be
+# something else, or the budget runs out, the direction is marked done and every later
+# packet costs one dict lookup: DPI work is per flow, not per packet.
+
+import itertools, re, struct
+
+
+MAX_BYTES = 4096        # reassembly buffer per direction
+MAX_PACKETS = 4         # payload packets inspected per direction
+MAX_PENDING = 4         # out-of-order segments held while waiting for a gap to fill
+MAX_TRACKED = 65536     # directions remembered (done markers included); oldest dropped first
+
+MORE = object()         # parser result: message incomplete, wait for more bytes
+DONE = None             # state of a direction that is no longer inspected
+SEQ_MASK = 0xFFFFFFFF
+
+HTTP_METHODS = (b"GET ", b"POST ", b"HEAD ", b"PUT ", b"DELETE ", b"OPTIONS ", b"PATCH ", b"CONNECT ", b"TRACE ")
+HTTP_METHOD = re.compile(b"|".join(HTTP_METHODS))
+HTTP_REQUEST_LINE = re.compile(rb"[A-Z]+ (\S+) HTTP/\d\.\d\r\n")
+HTTP_HOST = re.compile(rb"\r\nHost:[ \t]*([^\r\n]*)\r\n", re.IGNORECASE)
+HTTP_HEADERS_END = re.compile(rb"\r\n\r\n")
+CRLF = re.compile(rb"\r\n")
+
+
+#HTTP request head -> ("http", host, path), None if not a request (or no Host), MORE if cut short
+def parse_http(buf):
+    if not HTTP_METHOD.match(buf):
+        head = bytes(buf[:8])
+        return MORE if len(head) < 8 and any(m.startswith(head) for m in HTTP_METHODS) else None
+    line = HTTP_REQUEST_LINE.match(buf)
+    if line is None:
+        return None if CRLF.search(buf) else MORE
+    host = HTTP_HOST.search(buf, line.end() - 2)
+    if host is not None:
+        target = line.group(1)
+        return "http", host.group(1).strip().decode("ascii", "ignore"), \
+            target.decode("ascii", "ignore") if target.startswith(b"/") else "/"
+    return None if HTTP_HEADERS_END.search(buf, line.end() - 2) else MORE
+
+#TLS ClientHello -> ("tls", server name, None), None if not one (or no SNI), MORE if cut short.
+#Only the first record is read; a ClientHello spanning records is parsed up to its end.
+def parse_client_hello(buf):
+    n = len(buf)
+    if n < 6:
+        return MORE if n == 0 or buf[0] == 0x16 else None
+    if buf[0] != 0x16 or buf[1] != 0x03 or buf[5] != 0x01:
+        return None                                   # not a handshake record / ClientHello
+    limit = 5 + struct.unpack_from(">H", buf, 3)[0]   # end of the record
+    try:
+        pos = 5 + 4 + 2 + 32                          # handshake header, client_version, random
+        pos += 1 + buf[pos]                           # session id
+        pos += 2 + struct.unpack_from(">H", buf, pos)[0]  # cipher suites
+        pos += 1 + buf[pos]                           # compression methods
+        end = min(pos + 2 + struct.unpack_from(">H", buf, pos)[0], limit)
+        pos += 2
+        while pos + 4 <= end:
+            ext_type, ext_len = struct.unpack_from(">HH", buf, pos)
+            pos += 4
+            if ext_type == 0:                         # server_name: list of (type, length, name)
+                p, list_end = pos + 2, pos + 2 + struct.unpack_from(">H", buf, pos)[0]
+                while p + 3 <= list_end:
+                    name_type, name_len = buf[p], struct.unpack_from(">H", buf, p + 1)[0]
+                    p += 3
+                    if name_type == 0:
+                        if p + name_len > n:
+                            return MORE
+                        return "tls", str(buf[p:p + name_len], "ascii", "ignore"), None
+                    p += name_len
+                return None
+            pos += ext_len
+        return MORE if pos > n or end > n else None
+    except (IndexError, struct.error):                # ran past the bytes received so far
+        return MORE if n < limit else None
+
+def parse(buf):
+    if len(buf) and buf[0] == 0x16:
+        return parse_client_hello(buf)
+    return parse_http(buf)
+
+def to_url(found):
+    kind, host, path = found
+    return f"https://{host}/" if kind == "tls" else f"http://{host}{path}"
+
+
+class _Stream:
+    """Bounded reassembly of the first bytes of one direction"""
+    __slots__ = ("buf", "next_seq", "packets", "pending")
+
+    def __init__(self, payload, seq):
+        self.buf = bytearray(payload)
+        self.next_seq = (seq + len(payload)) & SEQ_MASK
+        self.packets = 1
+        self.pending = {}          # seq -> payload of segments after a gap
+
+    #Add a segment; returns True if the contiguous prefix grew
+    def add(self, payload, seq, max_bytes):
+        ahead = (seq - self.next_seq) & SEQ_MASK
+        if ahead and ahead < 1 << 31:                 # gap: keep it until the hole is filled
+            if len(self.pending) < MAX_PENDING:
+                self.pending[seq] = payload
+            return False
+        grew = self._append(payload, (self.next_seq - seq) & SEQ_MASK, max_bytes)
+        while self.next_seq in self.pending:
+            grew = self._append(self.pending.pop(self.next_seq), 0, max_bytes) or grew
+        return grew
+
+    def _append(self, payload, skip, max_bytes):
+        if skip >= len(payload):                      # pure retransmission
+            return False
+        room = max_bytes - len(self.buf)
+        self.buf += memoryview(payload)[skip:skip + room]
+        self.next_seq = (self.next_seq + len(payload) - skip) & SEQ_MASK
+        return True
+
+
+class Inspector:
+    """Per-direction inspection state; feed() every TCP payload, get a URL back once"""
+
+    def __init__(self, max_bytes=MAX_BYTES, max_packets=MAX_PACKETS, max_tracked=MAX_TRACKED):
+        self.max_bytes, self.max_packets, self.max_tracked = max_bytes, max_packets, max_tracked
+        self.streams = {}          # (src, sport, dst, dport) -> _Stream, or DONE
+        self.inspected = 0         # payload packets parsed
+        self.found = 0
+
+    #One TCP segment with payload (bytes) -> "http://host/path" / "https://sni/" or None
+    def feed(self, key, seq, payload):
+        streams = self.streams
+        st = streams.get(key, MORE)
+        if st is DONE:
+            return None
+        self.inspected += 1
+        if st is MORE:             # first payload packet: parse it where it lies
+            with memoryview(payload) as mv:
+                found = parse(mv[:self.max_bytes])
+            if found is MORE and self.max_packets > 1:
+                streams[key] = _Stream(payload[:self.max_bytes], seq)
+                self._bound()
+                return None
+        else:
+            st.packets += 1
+            found = MORE
+            if st.add(payload, seq, self.max_bytes):
+                with memoryview(st.buf) as mv:
+                    found = parse(mv)
+            if found is MORE and st.packets < self.max_packets and len(st.buf) < self.max_bytes:
+                return None
+        streams[key] = DONE
+        self._bound()
+        if found is None or found is MORE:
+            return None
+        self.found += 1
+        return to_url(found)
+
+    #Forget the oldest directions once more than max_tracked are remembered
+    def _bound(self):
+        streams = self.streams
+        if len(streams) > self.max_tracked:
+            for key in list(itertools.islice(streams, len(streams) - self.max_tracked * 3 // 4)):
+                del streams[key]
+
+    def describe(self):
+        return f"{self.inspected} payload packets inspected, {self.found} names found"
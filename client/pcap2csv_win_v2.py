@@ -1,19 +1,25 @@
 # pcap2csv_win_v2.py [Convert PCAP/Live to CSV + capture HTTP URLs & TLS SNI]
 
-import argparse, csv, math, statistics, time, threading, signal, sys, os, re
-from scapy.all import PcapReader, IP, IPv6, TCP, UDP, sniff, Raw
-from scapy.layers.http import HTTPRequest
-from scapy.layers.tls.handshake import TLSClientHello
-import numpy as np
-import socket
+import argparse, csv, heapq, itertools, math, time, threading, signal, sys, os, re
+#Flow modules shared by the client, the dashboard worker and the legacy scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "flowlib"))
+from scapy.all import PcapReader, IP, IPv6, TCP, UDP, sniff, Raw, Padding, NoPayload
 from threading import Lock
 import re
-import socket
 import requests
 import json
 import threading
 from datetime import datetime
 import uuid
+import rawdecode
+import flow_shards
+import flow_table
+import flow_features
+import flow_budget
+import flow_sampling
+import prefilter
+import payload_inspect
+import passive_dns
 
 # Add these configuration variables after imports
 API_URL = "http://localhost:5000/api/batch-flows"  # Your server endpoint
@@ -24,7 +30,8 @@ batch_lock = threading.Lock()
 
 # Add these after other global variables
 flows_lock = Lock()
-ip_to_hostname = {}
+dns_cache = passive_dns.DnsCache()  # IP -> hostname from DNS answers (and URLs) seen on the wire
+inspector = payload_inspect.Inspector()  # per-direction HTTP/TLS inspection state
 
 def is_valid_hostname(hostname):
     """Validate if a string looks like a real hostname"""
@@ -50,69 +57,16 @@ def is_valid_hostname(hostname):
     
     return True
 
-def reverse_dns_lookup(ip):
-    """Try to get hostname from IP using reverse DNS"""
-    try:
-        hostname = socket.gethostbyaddr(ip)[0]
-        if is_valid_hostname(hostname):
-            return hostname
-    except:
-        pass
-    return None
-
 flows = {}
 running = True
+shard_pool = None  # flow_shards.ShardPool when --workers > 1 (parent process only)
+packet_seq = itertools.count()  # arrival order, lets the merge keep single-process flow order
+budget = None      # flow_budget.FlowBudget with --max-flows / --max-memory
+shard_budget = False  # the shard workers run with a budget (their counters are collected)
+table_counters = None  # latest budget counters, sent with every batch
 
 # ---------- helpers ----------
-def safe_mean(x): return statistics.fmean(x) if x else 0.0
-def safe_std(x): return statistics.pstdev(x) if len(x) > 1 else 0.0
-def safe_div(a,b): return a/b if b!=0 else 0.0
-def pctile(lst,q): return float(np.percentile(lst,q)) if lst else 0.0
-
-def iat_stats(times):
-    if len(times)<2: return (0,0,0,0)
-    gaps=[t2-t1 for t1,t2 in zip(times[:-1],times[1:])]
-    return (safe_mean(gaps),safe_std(gaps),min(gaps),max(gaps))
-
-def iat_all(times):
-    if len(times)<2: return (0,0,0,0,0,0,0,0)
-    gaps=[t2-t1 for t1,t2 in zip(times[:-1],times[1:])]
-    return (safe_mean(gaps),safe_std(gaps),min(gaps),max(gaps),
-            pctile(gaps,25),pctile(gaps,50),pctile(gaps,75),pctile(gaps,90))
-
-def total_iat(times):
-    if len(times)<2: return 0.0
-    gaps=[t2-t1 for t1,t2 in zip(times[:-1],times[1:])]
-    return sum(gaps)
-
-def active_idle_stats(times, threshold=1_000_000):
-    if len(times) < 2:
-        return (0,0,0,0,0,0,0,0)
-
-    times = sorted(times)
-    gaps = [t2 - t1 for t1, t2 in zip(times[:-1], times[1:])]
-
-    actives, idles = [], []
-    start = times[0]
-
-    for i, gap in enumerate(gaps):
-        if gap > threshold:
-            actives.append(times[i] - start)
-            idles.append(gap)
-            start = times[i + 1]
-
-    actives.append(times[-1] - start)
-
-    def stats(x):
-        return (
-            min(x) if x else 0,
-            safe_mean(x) if x else 0,
-            max(x) if x else 0,
-            safe_std(x) if x else 0
-        )
-
-    return (*stats(actives), *stats(idles))
-
+# (the flow features themselves are defined once, in flow_features.py)
 def pkt_len(pkt):
     try: return len(bytes(pkt))
     except: return 0
@@ -130,8 +84,7 @@ def get_l4_info(pkt):
     return None,None,None,None
 
 def make_bi_key(proto,a_ip,a_port,b_ip,b_port):
-    a=(a_ip,a_port); b=(b_ip,b_port)
-    return (proto,a,b) if a<=b else (proto,b,a)
+    return flow_table.pack_key(proto,a_ip,a_port,b_ip,b_port)
 
 def send_batch_to_server(batch_data):
     """Send batch of flows to the server"""
@@ -144,6 +97,10 @@ def send_batch_to_server(batch_data):
             "flows": batch_data,
             "timestamp": datetime.now().isoformat()
         }
+        if table_counters is not None:
+            payload["flow_table"] = table_counters
+        if flow_sampling.ENABLED:
+            payload["sampling"] = {"flow_rate": flow_sampling.FLOW_N, "packet_rate": flow_sampling.PACKET_N}
         
         response = requests.post(
             API_URL,
@@ -174,26 +131,66 @@ def save_failed_batch(batch_data):
         pass
 
 # ---------- main flow building ----------
-def process_packet(src,dst,sport,dport,proto,ts,length,flags):
+def process_packet(src,dst,sport,dport,proto,ts,length,flags,url=None):
+    if prefilter.ENABLED and not prefilter.accept(src,dst,sport,dport):
+        return
+    if flow_sampling.ENABLED and not flow_sampling.keep_packet():
+        return
     key=make_bi_key(proto,src,sport,dst,dport)
+    if flow_sampling.ENABLED and not flow_sampling.keep_flow(key):
+        return
+    if shard_pool is not None:  # the worker owning this key builds the flow
+        shard_pool.submit(key,(src,dst,sport,dport,proto,ts,length,flags,url,next(packet_seq)))
+        return
+    update_flow(key,src,dst,sport,dport,proto,ts,length,flags,url)
+
+# Add one (already sampled) packet to its flow
+def update_flow(key,src,dst,sport,dport,proto,ts,length,flags,url=None,seq=None):
     f=flows.get(key)
     if f is None:
-        f={"src":src,"dst":dst,"sport":sport,"dport":dport,"proto":proto,
-           "start":ts,"end":ts,
-           "fwd_times":[ts],"bwd_times":[],
-           "fwd_lens":[length],"bwd_lens":[],
-           "fwd_flags":[],"bwd_flags":[],
-           "urls":set()}  # <--- add urls/sni holder
-        if flags is not None: f["fwd_flags"].append(flags)
-        flows[key]=f
+        f=flows[key]=flow_table.FlowRecord(src,dst,sport,dport,proto,ts,length,flags)
+        if seq is not None: f.seq=seq
     else:
-        f["end"]=max(f["end"],ts)
-        if src==f["src"] and dst==f["dst"] and sport==f["sport"] and dport==f["dport"]:
-            f["fwd_times"].append(ts); f["fwd_lens"].append(length)
-            if flags is not None: f["fwd_flags"].append(flags)
-        else:
-            f["bwd_times"].append(ts); f["bwd_lens"].append(length)
-            if flags is not None: f["bwd_flags"].append(flags)
+        f.add(ts,length,flags,src==f.src and dst==f.dst and sport==f.sport and dport==f.dport)
+    if url:
+        with flows_lock:
+            f.add_url(url)  # urls/sni holder, created on first use
+    if budget is not None:
+        budget.account(flows)  # may evict flows (this one included) when over budget
+
+# Shard worker (--workers N): owns the flows whose key hashes to it. Each flow keeps the
+# parent's packet sequence number of its first packet (seq) so merged batches keep the
+# single-process order; "drain" hands back (seq, start, record) for the finished flows and
+# empties the table (the parent fills in Hostname: the DNS cache lives on the capture side).
+# A budget is split evenly over the shards and always spills (workers cannot send).
+def shard_worker(shard, inq, outq, budget_opts=None, sampling=None, features=None):
+    global budget
+    if budget_opts is not None:
+        budget = flow_budget.FlowBudget(**budget_opts)
+    if sampling is not None:  # the parent samples; the rows still carry (and scale by) the rates
+        flow_sampling.configure(*sampling)
+    if features is not None:
+        set_features(features)
+
+    def on_items(items):
+        for src, dst, sport, dport, proto, ts, length, flags, url, n in items:
+            update_flow(make_bi_key(proto, src, sport, dst, dport), src, dst, sport, dport, proto, ts, length, flags, url, n)
+
+    def on_command(cmd):
+        if cmd == "drain":
+            table = budget.drain(flows) if budget is not None else list(flows.values())
+            records = []
+            for batch in flow_batches(table):
+                records += zip([fl.seq for fl in batch], [fl.start for fl in batch], flow_records(batch, 0))
+            records.sort(key=lambda r: r[0])
+            flows.clear()
+            return records
+        if cmd == "budget":
+            return budget.counters(len(flows)) if budget is not None else None
+        return None
+
+    flow_shards.serve(shard, inq, outq, on_items, on_command)
+
 def handle_packet(pkt):
     ip,_=get_ip_layer(pkt)
     if ip is None: 
@@ -202,6 +199,11 @@ def handle_packet(pkt):
     if proto is None: 
         return
 
+    url = extract_url(pkt, ip, sport, dport) if proto == 'TCP' else None
+    if proto == 'UDP' and sport == passive_dns.DNS_PORT:
+        dns = pkt[UDP].payload
+        dns_cache.add_response(dns.original or bytes(dns), float(pkt.time))
+
     process_packet(
         ip.src,
         ip.dst,
@@ -210,293 +212,136 @@ def handle_packet(pkt):
         proto,
         float(pkt.time) * 1_000_000,  
         pkt_len(pkt),
-        flags
+        flags,
+        url
     )
 
-
-    url = None
-    try:
-        if pkt.haslayer(HTTPRequest):
-            http_layer = pkt[HTTPRequest]
-            host = http_layer.Host.decode(errors="ignore") if http_layer.Host else None
-            path = http_layer.Path.decode(errors="ignore") if http_layer.Path else None
-            if host and is_valid_hostname(host):
-                full_url = f"http://{host}{path}" if path else f"http://{host}/"
-                print(f"[HTTP] FOUND FULL URL: {full_url}")  # This will show in console
-                url = full_url
-    except:
-        pass
-    
-
-    # --- Extract TLS SNI properly ---
-    if url is None and TCP in pkt and pkt.haslayer(Raw) and (sport == 443 or dport == 443):
-        raw = pkt[Raw].load
-        try:
-            # Minimum TLS header length check
-            if len(raw) < 40 or raw[0] != 0x16:  # Not a Handshake
-                return
-                
-            # Parse TLS Record Layer
-            pos = 0
-            content_type = raw[pos]; pos += 1
-            version = int.from_bytes(raw[pos:pos+2], byteorder='big'); pos += 2
-            length = int.from_bytes(raw[pos:pos+2], byteorder='big'); pos += 2
-            
-            # Parse Handshake Protocol
-            handshake_type = raw[pos]; pos += 1
-            handshake_length = int.from_bytes(raw[pos:pos+3], byteorder='big'); pos += 3
-            handshake_version = int.from_bytes(raw[pos:pos+2], byteorder='big'); pos += 2
-            
-            # Skip random (32 bytes)
-            pos += 32
-            
-            # Session ID
-            session_id_length = raw[pos]; pos += 1
-            pos += session_id_length
-            
-            # Cipher Suites
-            cipher_suites_length = int.from_bytes(raw[pos:pos+2], byteorder='big'); pos += 2
-            pos += cipher_suites_length
-            
-            # Compression Methods
-            compression_methods_length = raw[pos]; pos += 1
-            pos += compression_methods_length
-            
-            # Extensions
-            if pos + 2 > len(raw):
-                return
-                
-            extensions_length = int.from_bytes(raw[pos:pos+2], byteorder='big'); pos += 2
-            
-            # Parse each extension
-            extensions_end = pos + extensions_length
-            while pos + 4 <= extensions_end:
-                ext_type = int.from_bytes(raw[pos:pos+2], byteorder='big'); pos += 2
-                ext_length = int.from_bytes(raw[pos:pos+2], byteorder='big'); pos += 2
-                
-                if ext_type == 0:  # SNI extension
-                    if pos + 2 > len(raw):
-                        break
-                    sni_list_length = int.from_bytes(raw[pos:pos+2], byteorder='big'); pos += 2
-                    sni_list_end = pos + sni_list_length
-                    
-                    while pos + 3 <= sni_list_end:
-                        name_type = raw[pos]; pos += 1
-                        name_length = int.from_bytes(raw[pos:pos+2], byteorder='big'); pos += 2
-                        
-                        if name_type == 0:  
-                            if pos + name_length <= len(raw):
-                                sni = raw[pos:pos+name_length].decode('utf-8', errors='ignore')
-                                if is_valid_hostname(sni):
-                                    url = f"https://{sni}/"  
-                                    print(f"[HTTPS] Found domain: {url}")  
-                                    break
-                            pos += name_length
-                        else:
-                            pos += name_length
-                    break
-                else:
-                    pos += ext_length
-                    
-        except Exception as e:
-            pass
-
-    # --- Enhanced TLS detection for modern sites ---
-    if url is None and TCP in pkt and pkt.haslayer(Raw):
-        raw = pkt[Raw].load
-        try:
-            if len(raw) > 10:
-                # Look for TLS handshake in any position
-                for i in range(len(raw) - 10):
-                    if (raw[i] == 0x16 and  
-                        raw[i+1] == 0x03 and  
-                        raw[i+2] in [0x01, 0x02, 0x03, 0x04]):  
-                        
-                        # Simple SNI search pattern
-                        sni_pattern = b'\x00\x00'
-                        sni_pos = raw.find(sni_pattern, i)
-                        if sni_pos != -1 and sni_pos + 5 < len(raw):
-                            sni_len = raw[sni_pos + 3]
-                            if sni_pos + 5 + sni_len <= len(raw):
-                                sni = raw[sni_pos+5:sni_pos+5+sni_len].decode('utf-8', errors='ignore')
-                                if is_valid_hostname(sni):
-                                    url = f"https://{sni}/"  
-                                    print(f"[HTTPS Alt] Found domain: {url}") 
-                                    break
-        except:
-            pass
-
     if url:
-        if is_valid_hostname(url.split('//')[-1].split('/')[0].split(':')[0]):
-            key = make_bi_key(proto, ip.src, sport, ip.dst, dport)
-            with flows_lock:
-                if key in flows:
-                    if "urls" not in flows[key]:
-                        flows[key]["urls"] = set()
-                    flows[key]["urls"].add(url) 
-                    
-                    ip_to_hostname[ip.dst] = url.split('//')[-1].split('/')[0]
+        dns_cache.put(ip.dst, url.split('//')[-1].split('/')[0], float(pkt.time), passive_dns.SNI_TTL)
+
+# HTTP Host+Path or TLS SNI opening this packet's direction, None if not (yet) known.
+# Only the first few payload packets of each direction are parsed (payload_inspect).
+def extract_url(pkt, ip, sport, dport):
+    tcp = pkt[TCP]
+    pl = tcp.payload
+    if type(pl) is Raw:
+        data = pl.load
+    elif isinstance(pl, (NoPayload, Padding)):
+        return None
+    else:
+        data = bytes(pl)
+    if not data:
+        return None
+    url = inspector.feed((ip.src, sport, ip.dst, dport), tcp.seq, data)
+    if url is None or not is_valid_hostname(url.split('//')[-1].split('/')[0]):
+        return None
+    if url.startswith("https"):
+        print(f"[HTTPS] Found domain: {url}")
+    else:
+        print(f"[HTTP] FOUND FULL URL: {url}")  # This will show in console
+    return url
 
-def process_and_send_flows():
-    """Process flows and send to server - WITH ALL ML FEATURES"""
-    snapshot = list(flows.items())
-    if not snapshot:
+# Header-only path (--decoder raw): flow features only, no Scapy dissection and no URL/SNI extraction
+def handle_raw(data, ts, linktype):
+    hdr = rawdecode.decode_packet(data, linktype)
+    if hdr is None:
         return
-    
+    src, dst, sport, dport, proto, flags = hdr
+    process_packet(src, dst, sport, dport, proto, ts * 1_000_000, len(data), flags)
+
+# Upload record fields in order: identity, features (flow_features), URLs and metadata;
+# scale_columns appends FlowSamplingRate / PktSamplingRate
+RECORD_FIELDS = [
+    "flow_id", "src_ip", "dst_ip", "src_port", "dst_port", "protocol",
+    "FlowDuration", "TotFwdPkts", "TotBwdPkts", "TotLenFwd", "TotLenBwd", "TotalBytes", "TotalPackets",
+    "FwdPktLenMean", "FwdPktLenStd", "FwdPktLenMin", "FwdPktLenMax",
+    "BwdPktLenMean", "BwdPktLenStd", "BwdPktLenMin", "BwdPktLenMax",
+    "FwdPktLenPct25", "FwdPktLenPct50", "FwdPktLenPct75", "FwdPktLenPct90",
+    "BwdPktLenPct25", "BwdPktLenPct50", "BwdPktLenPct75", "BwdPktLenPct90",
+    "FlowIATMean", "FlowIATStd", "FwdIATMean", "FwdIATStd", "BwdIATMean", "BwdIATStd",
+    "FlowIAT25", "FlowIAT50", "FlowIAT75", "FlowIAT90",
+    "FwdIAT25", "FwdIAT50", "FwdIAT75", "FwdIAT90",
+    "BwdIAT25", "BwdIAT50", "BwdIAT75", "BwdIAT90",
+    "TotalFwdIAT", "TotalBwdIAT",
+    "BytesPerSec", "PktsPerSec", "FwdBwdPktRatio", "FwdBwdByteRatio",
+    "Fwd_SYN", "Fwd_FIN", "Fwd_RST", "Fwd_PSH", "Fwd_ACK", "Fwd_URG",
+    "Bwd_SYN", "Bwd_FIN", "Bwd_RST", "Bwd_PSH", "Bwd_ACK", "Bwd_URG",
+    "MinActive", "MeanActive", "MaxActive", "StdActive",
+    "MinIdle", "MeanIdle", "MaxIdle", "StdIdle",
+    "URLs", "Hostname",
+    "FlowIATMin", "FlowIATMax", "FwdIATMin", "FwdIATMax", "BwdIATMin", "BwdIATMax",
+    "timestamp", "device_id", "FlowSamplingRate", "PktSamplingRate",
+]
+# the upload's *IATMin/Max columns carry the first/last timestamps, not gap extremes
+TIME_EXTREMES = ("FlowIATMin", "FlowIATMax", "FwdIATMin", "FwdIATMax", "BwdIATMin", "BwdIATMax")
+FEATURE_SPEC = "csv"                                # --features
+FEATURE_COLUMNS = flow_features.resolve("csv")
+OUT_FIELDS = RECORD_FIELDS
+
+#Select the feature columns (--features model|csv|list); identity, URL and metadata fields stay
+def set_features(spec):
+    global FEATURE_SPEC, FEATURE_COLUMNS, OUT_FIELDS
+    FEATURE_SPEC = spec
+    FEATURE_COLUMNS = flow_features.resolve(spec)
+    wanted = set(FEATURE_COLUMNS)
+    OUT_FIELDS = [f for f in RECORD_FIELDS if f in wanted or f not in flow_features.FEATURES]
+
+#Server name of a flow from the passive DNS cache, as known when the flow started (µs)
+def lookup_hostname(dst, src, start):
+    ts = start * 1e-6
+    return dns_cache.get(dst, ts) or dns_cache.get(src, ts)
+
+def flow_record(idx, fl):
+    """Upload record (selected ML features + URLs) for one flow"""
+    return flow_records([fl], idx)[0]
+
+RECORD_BATCH = 4096  # flows per flow_features pass when the table is drained lazily (spill)
+
+#Upload records for many flows at once (one flow_features pass), numbered from `start`.
+#Works on snapshots: periodic_send runs beside the capture thread that appends to the flows
+def flow_records(flow_list, start=1):
+    n = len(flow_list)
+    if n == 0:
+        return []
+    flow_list = [fl.snapshot() for fl in flow_list]
+    cols = flow_features.compute(flow_list, [c for c in FEATURE_COLUMNS if c not in TIME_EXTREMES],
+                                 active_threshold=1_000_000, zero_tail=True, time_scale=1e-6)
+    now, stamp = int(time.time()), datetime.now().isoformat()
+    cols["flow_id"] = [f"flow_{now}_{idx}" for idx in range(start, start + n)]
+    for col, field in (("src_ip", "src"), ("dst_ip", "dst"), ("src_port", "sport"), ("dst_port", "dport"), ("protocol", "proto")):
+        cols[col] = [fl[field] for fl in flow_list]
+    cols["URLs"] = [",".join(fl.get("urls", [])) for fl in flow_list]
+    cols["Hostname"] = [lookup_hostname(fl["dst"], fl["src"], fl["start"]) for fl in flow_list]
+    for side in ("fwd", "bwd"):
+        times = [fl[side + "_times"] for fl in flow_list]
+        cols[side.capitalize() + "IATMin"] = [min(t) if t else 0 for t in times]
+        cols[side.capitalize() + "IATMax"] = [max(t) if t else 0 for t in times]
+    cols["FlowIATMin"] = [min(a, b) if fl["bwd_times"] else a for a, b, fl in zip(cols["FwdIATMin"], cols["BwdIATMin"], flow_list)]
+    cols["FlowIATMax"] = [max(a, b) if fl["bwd_times"] else a for a, b, fl in zip(cols["FwdIATMax"], cols["BwdIATMax"], flow_list)]
+    cols["timestamp"] = [stamp] * n
+    cols["device_id"] = [DEVICE_ID] * n
+    flow_sampling.scale_columns(cols, n)
+    return [dict(zip(OUT_FIELDS, vals)) for vals in zip(*(cols[f] for f in OUT_FIELDS))]
+
+#Lists of up to RECORD_BATCH flows from any iterable of flows (a spilled table is restored lazily)
+def flow_batches(flow_iter):
+    it = iter(flow_iter)
+    while batch := list(itertools.islice(it, RECORD_BATCH)):
+        yield batch
+
+def iter_records(flow_iter):
+    idx = 1
+    for batch in flow_batches(flow_iter):
+        yield from flow_records(batch, idx)
+        idx += len(batch)
+
+#Send upload records in BATCH_SIZE batches; returns how many were sent
+def send_records(records):
     batch_data = []
-    
-    for idx, (key, fl) in enumerate(snapshot, start=1):
-        # Calculate all flow features
-        dur = max(0.0, fl["end"] - fl["start"])
-        all_times = sorted(fl["fwd_times"] + fl["bwd_times"])
-        flow_iat = iat_stats(all_times)
-        fwd_iat = iat_stats(fl["fwd_times"])
-        bwd_iat = iat_stats(fl["bwd_times"])
-        fwd_len_p = [pctile(fl["fwd_lens"], q) for q in (25, 50, 75, 90)]
-        bwd_len_p = [pctile(fl["bwd_lens"], q) for q in (25, 50, 75, 90)]
-        flow_iat_p = iat_all(all_times)
-        fwd_iat_p = iat_all(fl["fwd_times"])
-        bwd_iat_p = iat_all(fl["bwd_times"])
-        total_bytes = sum(fl["fwd_lens"]) + sum(fl["bwd_lens"])
-        total_pkts = len(fl["fwd_lens"]) + len(fl["bwd_lens"])
-
-        dur_sec = dur / 1_000_000  
-        bytes_per_sec = safe_div(total_bytes, dur_sec)
-        pkts_per_sec = safe_div(total_pkts, dur_sec)
-
-        pkt_ratio = safe_div(len(fl["fwd_lens"]), len(fl["bwd_lens"]))
-        byte_ratio = safe_div(sum(fl["fwd_lens"]), sum(fl["bwd_lens"]))
-        total_fiat = total_iat(fl["fwd_times"])
-        total_biat = total_iat(fl["bwd_times"])
-        act_idle = active_idle_stats(all_times)
-        
-        def count_flags(flags_list, mask): 
-            return sum(1 for f in flags_list if f & mask)
-        
-        fwd_syn = count_flags(fl["fwd_flags"], 0x02)
-        fwd_fin = count_flags(fl["fwd_flags"], 0x01)
-        fwd_rst = count_flags(fl["fwd_flags"], 0x04)
-        fwd_psh = count_flags(fl["fwd_flags"], 0x08)
-        fwd_ack = count_flags(fl["fwd_flags"], 0x10)
-        fwd_urg = count_flags(fl["fwd_flags"], 0x20)
-        bwd_syn = count_flags(fl["bwd_flags"], 0x02)
-        bwd_fin = count_flags(fl["bwd_flags"], 0x01)
-        bwd_rst = count_flags(fl["bwd_flags"], 0x04)
-        bwd_psh = count_flags(fl["bwd_flags"], 0x08)
-        bwd_ack = count_flags(fl["bwd_flags"], 0x10)
-        bwd_urg = count_flags(fl["bwd_flags"], 0x20)
-        
-        flow_data = {
-            "flow_id": f"flow_{int(time.time())}_{idx}",
-            "src_ip": fl["src"],
-            "dst_ip": fl["dst"],
-            "src_port": fl["sport"],
-            "dst_port": fl["dport"],
-            "protocol": fl["proto"],
-            
-            "FlowDuration": dur,
-            "TotFwdPkts": len(fl["fwd_lens"]),
-            "TotBwdPkts": len(fl["bwd_lens"]),
-            "TotLenFwd": sum(fl["fwd_lens"]),
-            "TotLenBwd": sum(fl["bwd_lens"]),
-            "TotalBytes": total_bytes,
-            "TotalPackets": total_pkts,
-            
-            "FwdPktLenMean": safe_mean(fl["fwd_lens"]),
-            "FwdPktLenStd": safe_std(fl["fwd_lens"]),
-            "FwdPktLenMin": min(fl["fwd_lens"], default=0),
-            "FwdPktLenMax": max(fl["fwd_lens"], default=0),
-            "BwdPktLenMean": safe_mean(fl["bwd_lens"]),
-            "BwdPktLenStd": safe_std(fl["bwd_lens"]),
-            "BwdPktLenMin": min(fl["bwd_lens"], default=0),
-            "BwdPktLenMax": max(fl["bwd_lens"], default=0),
-            
-            "FwdPktLenPct25": fwd_len_p[0],
-            "FwdPktLenPct50": fwd_len_p[1],
-            "FwdPktLenPct75": fwd_len_p[2],
-            "FwdPktLenPct90": fwd_len_p[3],
-            "BwdPktLenPct25": bwd_len_p[0],
-            "BwdPktLenPct50": bwd_len_p[1],
-            "BwdPktLenPct75": bwd_len_p[2],
-            "BwdPktLenPct90": bwd_len_p[3],
-            
-            "FlowIATMean": flow_iat[0],
-            "FlowIATStd": flow_iat[1],
-            # "FlowIATMin": flow_iat[2],
-            # "FlowIATMax": flow_iat[3],
-            "FwdIATMean": fwd_iat[0],
-            "FwdIATStd": fwd_iat[1],
-            # "FwdIATMin": fwd_iat[2],
-            # "FwdIATMax": fwd_iat[3],
-            "BwdIATMean": bwd_iat[0],
-            "BwdIATStd": bwd_iat[1],
-            # "BwdIATMin": bwd_iat[2],
-            # "BwdIATMax": bwd_iat[3],
-            
-            # IAT percentiles
-            "FlowIAT25": flow_iat_p[4],
-            "FlowIAT50": flow_iat_p[5],
-            "FlowIAT75": flow_iat_p[6],
-            "FlowIAT90": flow_iat_p[7],
-            "FwdIAT25": fwd_iat_p[4],
-            "FwdIAT50": fwd_iat_p[5],
-            "FwdIAT75": fwd_iat_p[6],
-            "FwdIAT90": fwd_iat_p[7],
-            "BwdIAT25": bwd_iat_p[4],
-            "BwdIAT50": bwd_iat_p[5],
-            "BwdIAT75": bwd_iat_p[6],
-            "BwdIAT90": bwd_iat_p[7],
-            
-            # Total IAT
-            "TotalFwdIAT": total_fiat,
-            "TotalBwdIAT": total_biat,
-            
-            # Rate calculations
-            "BytesPerSec": bytes_per_sec,
-            "PktsPerSec": pkts_per_sec,
-            "FwdBwdPktRatio": pkt_ratio,
-            "FwdBwdByteRatio": byte_ratio,
-            
-            # TCP Flags 
-            "Fwd_SYN": fwd_syn,
-            "Fwd_FIN": fwd_fin,
-            "Fwd_RST": fwd_rst,
-            "Fwd_PSH": fwd_psh,
-            "Fwd_ACK": fwd_ack,
-            "Fwd_URG": fwd_urg,
-            "Bwd_SYN": bwd_syn,
-            "Bwd_FIN": bwd_fin,
-            "Bwd_RST": bwd_rst,
-            "Bwd_PSH": bwd_psh,
-            "Bwd_ACK": bwd_ack,
-            "Bwd_URG": bwd_urg,
-            
-            # Active/Idle statistics 
-            "MinActive": act_idle[0],
-            "MeanActive": act_idle[1],
-            "MaxActive": act_idle[2],
-            "StdActive": act_idle[3],
-            "MinIdle": act_idle[4],
-            "MeanIdle": act_idle[5],
-            "MaxIdle": act_idle[6],
-            "StdIdle": act_idle[7],
-            
-            # URLs
-            "URLs": ",".join(fl.get("urls", [])),   
-            
-            "FlowIATMin": min(all_times) if all_times else 0,
-            "FlowIATMax": max(all_times) if all_times else 0,
-            "FwdIATMin": min(fl["fwd_times"]) if fl["fwd_times"] else 0,
-            "FwdIATMax": max(fl["fwd_times"]) if fl["fwd_times"] else 0,
-            "BwdIATMin": min(fl["bwd_times"]) if fl["bwd_times"] else 0,
-            "BwdIATMax": max(fl["bwd_times"]) if fl["bwd_times"] else 0,
-            
-            # Metadata
-            "timestamp": datetime.now().isoformat(),
-            "device_id": DEVICE_ID,
-        }
-        
+    count = 0
+    for flow_data in records:
         batch_data.append(flow_data)
+        count += 1
         
         # Send batch when size is reached
         if len(batch_data) >= BATCH_SIZE:
@@ -508,10 +353,49 @@ def process_and_send_flows():
     if batch_data:
         with batch_lock:
             send_batch_to_server(batch_data.copy())
-            
+    return count
+
+#Budget eviction in finalize mode: evicted flows go out right away
+def send_evicted(evicted):
+    send_records(flow_records(evicted))
+
+#Budget counters of this process or summed over the shards (peak_flows: sum of shard peaks)
+def update_table_counters():
+    global table_counters
+    if shard_pool is not None:
+        parts = [c for c in shard_pool.collect("budget") if c]
+        table_counters = {k: sum(c[k] for c in parts) for k in parts[0]} if parts else None
+    elif budget is not None:
+        table_counters = budget.counters(len(flows))
+    if table_counters and table_counters["evicted_flows"]:
+        c = table_counters
+        print(f"[!] Flow budget: {c['evicted_flows']} flows evicted in {c['eviction_rounds']} rounds "
+              f"({c['finalized_early']} finalized early, {c['spilled_flows']} spilled, "
+              f"{c['spill_bytes']} spill bytes), peak {c['peak_flows']} flows")
+
+def process_and_send_flows():
+    """Process flows and send to server - WITH ALL ML FEATURES"""
+    if budget is not None or shard_budget:
+        update_table_counters()
+    if shard_pool is not None:  # merge the shards' records back into first-seen order
+        records = []
+        for idx, (_, start, r) in enumerate(heapq.merge(*shard_pool.collect("drain"), key=lambda r: r[0]), start=1):
+            r["flow_id"] = f"flow_{int(time.time())}_{idx}"
+            r["device_id"] = DEVICE_ID
+            r["Hostname"] = lookup_hostname(r["dst_ip"], r["src_ip"], start)
+            records.append(r)
+    elif budget is not None:  # spilled flows are merged back one at a time
+        records = iter_records(budget.drain(flows))
+    else:
+        records = flow_records(list(flows.values()))
     
-    print(f"[+] Processed {len(snapshot)} flows (sent to server)")
-    flows.clear()
+    count = send_records(records)
+    if not count:
+        return
+    
+    print(f"[+] Processed {count} flows (sent to server)")
+    if budget is None:  # drain() already emptied the table
+        flows.clear()
 
 
 def periodic_send(interval=10):
@@ -524,6 +408,12 @@ def signal_handler(sig, frame):
     global running
     running = False
     print("\n[!] Stopping capture...")
+    if prefilter.ENABLED:
+        print(f"[*] Pre-filter dropped {prefilter.dropped} packets before the flow lookup")
+    if inspector.inspected:
+        print(f"[*] URL/SNI inspection: {inspector.describe()}")
+    if dns_cache.responses:
+        print(f"[*] Passive DNS: {dns_cache.describe()}")
     
     # Send any remaining flows in the batch buffer
     with batch_lock:
@@ -543,18 +433,92 @@ def signal_handler(sig, frame):
 
 def main():
     ap = argparse.ArgumentParser(description="PCAP/Live -> Server (CIC-like flow features + URL/SNI)")
-    ap.add_argument("-i", "--input", help="Input PCAP file")
+    ap.add_argument("-i", "--input", help="Input PCAP/PCAPNG file (may be .gz/.zst compressed, '-' reads stdin)")
     ap.add_argument("--live", action="store_true", help="Enable live capture mode")
     ap.add_argument("--iface", default="Wi-Fi", help="Network interface for live capture")
     ap.add_argument("--server", default="http://localhost:5000", help="Server URL")
     ap.add_argument("--device-id", help="Device ID")
+    ap.add_argument("--decoder", choices=("scapy", "raw"), default="scapy",
+                    help="Packet decoder: full Scapy dissection (with URL/SNI) or header-only raw bytes")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Shard flow assembly over N processes by flow key")
+    ap.add_argument("--pin-cpus", action="store_true", help="Pin each shard worker to its own CPU")
+    ap.add_argument("--max-flows", type=int, default=0,
+                    help="Flow table budget: evict flows once more than N are open (0 = unlimited)")
+    ap.add_argument("--max-memory", type=float, default=0,
+                    help="Flow table budget in MB (estimated from flow and packet counts, 0 = unlimited)")
+    ap.add_argument("--evict-policy", choices=("lru", "small"), default="lru",
+                    help="Which flows to evict: least recently active (default) or fewest packets")
+    ap.add_argument("--evict", choices=("finalize", "spill"), default="finalize",
+                    help="Evicted flows are sent early (default) or spilled to disk and merged back on send")
+    ap.add_argument("--spill-dir", default=None, help="Directory for the spill file (default: system temp)")
+    ap.add_argument("--flow-sample", type=int, default=1,
+                    help="Keep 1 in N flows (hash of the 5-tuple, whole flows kept; default 1 = all)")
+    ap.add_argument("--packet-sample", type=int, default=1,
+                    help="Keep 1 in N packets at random and scale counts/bytes by N (default 1 = all)")
+    ap.add_argument("--sample-seed", type=int, default=0,
+                    help="Seed for flow hashing and packet draws (same seed, same sample)")
+    ap.add_argument("--bpf", default=None,
+                    help="Kernel BPF filter for live capture, tcpdump syntax (e.g. \"not port 873\")")
+    ap.add_argument("--allow-net", action="append", default=[], metavar="CIDR[,CIDR]",
+                    help="Only build flows with an endpoint in these networks (longest prefix wins over --deny-net)")
+    ap.add_argument("--deny-net", action="append", default=[], metavar="CIDR[,CIDR]",
+                    help="Drop packets with an endpoint in these networks before any flow state")
+    ap.add_argument("--allow-ports", default=None, help="Only packets with a port in this set, e.g. 53,80,443,8000-8100")
+    ap.add_argument("--deny-ports", default=None, help="Drop packets with a port in this set, e.g. 873,10000-10100")
+    ap.add_argument("--features", default="csv",
+                    help="Feature columns to compute and upload: 'csv' (all), 'model' (the classifier's columns "
+                         "plus packet/byte counts) or a comma-separated list of sets and column names")
     args = ap.parse_args()
     
     # Update configuration from arguments
-    global API_URL, DEVICE_ID
+    global API_URL, DEVICE_ID, shard_pool, budget, shard_budget
     API_URL = f"{args.server.rstrip('/')}/api/batch-flows"
     if args.device_id:
         DEVICE_ID = args.device_id
+    try:
+        set_features(args.features)
+    except ValueError as e:
+        print(f"[!] Invalid --features: {e}")
+        sys.exit(1)
+    if len(FEATURE_COLUMNS) < len(flow_features.FEATURES):
+        print(f"[*] Features: {flow_features.describe(FEATURE_COLUMNS)}")
+    try:
+        prefilter.configure(args.allow_net, args.deny_net, args.allow_ports, args.deny_ports)
+    except ValueError as e:
+        print(f"[!] Invalid pre-filter: {e}")
+        sys.exit(1)
+    if prefilter.ENABLED:
+        print(f"[*] Pre-filter: {prefilter.describe()}")
+    if args.bpf:
+        if not args.live:
+            print("[!] --bpf only applies to live capture; ignoring it")
+            args.bpf = None
+        else:
+            err = prefilter.check_bpf(args.bpf, args.iface)
+            if err:
+                print(f"[!] Cannot compile BPF filter {args.bpf!r}: {err}")
+                sys.exit(1)
+            print(f"[*] Kernel BPF filter: {args.bpf}")
+    flow_sampling.configure(args.flow_sample, args.packet_sample, args.sample_seed)
+    if flow_sampling.ENABLED:
+        print(f"[*] Sampling: {flow_sampling.describe()}")
+    budget_opts = None
+    if args.max_flows or args.max_memory:
+        if args.workers > 1 and args.evict == "finalize":
+            print("[!] Shard workers cannot send evicted flows early; spilling them instead")
+            args.evict = "spill"
+        n = max(args.workers, 1)
+        budget_opts = {"max_flows": -(-args.max_flows // n), "max_memory": args.max_memory * 2**20 / n,
+                       "policy": args.evict_policy, "mode": args.evict, "spill_dir": args.spill_dir}
+        print(f"[*] Flow table budget: {args.max_flows or 'unlimited'} flows, "
+              f"{args.max_memory or 'unlimited'} MB ({args.evict_policy} eviction, {args.evict})")
+    if args.workers > 1:
+        shard_pool = flow_shards.ShardPool(args.workers, shard_worker, pin_cpus=args.pin_cpus,
+                                           worker_args=(budget_opts, flow_sampling.options(), FEATURE_SPEC))
+        shard_budget = budget_opts is not None
+    elif budget_opts is not None:
+        budget = flow_budget.FlowBudget(on_evict=send_evicted, **budget_opts)
     
     if args.live:
         signal.signal(signal.SIGINT, signal_handler)
@@ -563,7 +527,11 @@ def main():
         print(f"[*] Device ID: {DEVICE_ID}")
         
         threading.Thread(target=periodic_send, daemon=True).start()
-        sniff(iface=args.iface, prn=handle_packet, store=False)
+        if args.decoder == "raw":
+            for data, ts, linktype in rawdecode.iter_live_frames(args.iface, lambda: not running, args.bpf):
+                handle_raw(data, ts, linktype)
+        else:
+            sniff(iface=args.iface, prn=handle_packet, store=False, filter=args.bpf)
     else:
         if not args.input:
             print("Error: Input PCAP file required with -i")
@@ -572,12 +540,24 @@ def main():
         print(f"[*] Processing PCAP file: {args.input}")
         print(f"[*] Sending to server: {API_URL}")
         
-        with PcapReader(args.input) as pr:
-            for pkt in pr:
-                handle_packet(pkt)
+        if args.decoder == "raw":
+            for data, ts, linktype in rawdecode.iter_raw_records(args.input):
+                handle_raw(data, ts, linktype)
+        else:
+            with PcapReader(rawdecode.open_capture(args.input)) as pr:
+                for pkt in pr:
+                    handle_packet(pkt)
         
+        if prefilter.ENABLED:
+            print(f"[*] Pre-filter dropped {prefilter.dropped} packets before the flow lookup")
+        if inspector.inspected:
+            print(f"[*] URL/SNI inspection: {inspector.describe()}")
+        if dns_cache.responses:
+            print(f"[*] Passive DNS: {dns_cache.describe()}")
         # Process and send all flows
         process_and_send_flows()
+        if shard_pool is not None:
+            shard_pool.close()
         print("[+] PCAP processing complete!")
 if __name__=="__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,101 @@
+# test_passive_dns.py [parse_response on answers, compression pointers and malformed packets; DnsCache TTL/LRU]
+
+import socket, struct
+import pytest
+import passive_dns
+from passive_dns import DnsCache, parse_response, read_name
+
+
+def name(dotted):
+    return b"".join(bytes((len(l),)) + l.encode() for l in dotted.split(".")) + b"\x00"
+
+def rr(owner, rtype, ttl, rdata):
+    return owner + struct.pack("!HHIH", rtype, 1, ttl, len(rdata)) + rdata
+
+#Response to one question; answers are raw RRs (owner names may point at the question, offset 12)
+def response(qname, answers, flags=0x8180, qd=1):
+    return struct.pack("!HHHHHH", 0x1234, flags, qd, len(answers), 0, 0) + qname + b"\x00\x01\x00\x01" + b"".join(answers)
+
+A = lambda ip: socket.inet_aton(ip)
+AAAA = lambda ip: socket.inet_pton(socket.AF_INET6, ip)
+PTR_Q = b"\xc0\x0c"
+
+
+def test_a_and_aaaa_answers():
+    buf = response(name("WWW.Example.com"), [rr(PTR_Q, 1, 300, A("93.184.216.34")),
+                                             rr(PTR_Q, 28, 60, AAAA("2606:2800:220:1::248"))])
+    assert parse_response(buf) == ("www.example.com", [("93.184.216.34", 300), ("2606:2800:220:1::248", 60)])
+
+def test_cname_chain_files_under_the_question():
+    cname = name("edge.cdn.net")
+    # question, CNAME (owner -> question), A owned by the CNAME target (pointer into the first RR's rdata)
+    first = rr(PTR_Q, 5, 30, cname)
+    target = 12 + len(name("shop.example.com")) + 4 + 12
+    buf = response(name("shop.example.com"), [first, rr(struct.pack("!H", 0xC000 | target), 1, 20, A("10.0.0.9"))])
+    assert parse_response(buf) == ("shop.example.com", [("10.0.0.9", 20)])
+    assert read_name(buf, target) == ("edge.cdn.net", target + len(cname))
+
+def test_compressed_question_suffix():
+    # answer owner "a." + pointer to the question's "example.com"
+    buf = response(name("example.com"), [rr(b"\x01a\xc0\x0c", 1, 5, A("1.2.3.4"))])
+    assert read_name(buf, 12 + 13 + 4) == ("a.example.com", 12 + 13 + 4 + 4)
+    assert parse_response(buf) == ("example.com", [("1.2.3.4", 5)])
+
+@pytest.mark.parametrize("qname", [
+    b"\xc0\x0c",                        # points at itself
+    b"\x01a\xc0\x0c",                   # label, then back to its own start
+    b"\xc0\x10\x00\x00\xc0\x0c",        # two pointers chasing each other
+])
+def test_compression_pointer_loops(qname):
+    buf = response(qname, [rr(PTR_Q, 1, 300, A("1.2.3.4"))])
+    with pytest.raises(ValueError, match="loop"):
+        read_name(buf, 12)
+    assert parse_response(buf) is None
+
+def test_pointer_chain_within_hop_limit():
+    # 10 pointers in a row, each to the previous one, ending at a plain name
+    buf = bytearray(struct.pack("!HHHHHH", 0, 0x8180, 1, 0, 0, 0)) + name("deep.example")
+    prev = 12
+    for _ in range(10):
+        here = len(buf)
+        buf += struct.pack("!H", 0xC000 | prev)
+        prev = here
+    assert read_name(bytes(buf), prev) == ("deep.example", prev + 2)
+
+
+@pytest.mark.parametrize("buf", [
+    response(name("x.com"), [rr(PTR_Q, 1, 1, A("1.1.1.1"))], flags=0x0100),      # a query
+    response(name("x.com"), [rr(PTR_Q, 1, 1, A("1.1.1.1"))], flags=0x8183),      # NXDOMAIN
+    response(name("x.com"), [rr(PTR_Q, 1, 1, A("1.1.1.1"))], qd=2),
+    response(name("x.com"), []),
+    response(name("x.com"), [rr(PTR_Q, 16, 1, b"\x03txt")]),                      # no address
+    response(name("x.com"), [rr(PTR_Q, 1, 1, b"\x01\x02")]),                      # bad A length
+    response(b"\x3fabc", [rr(PTR_Q, 1, 1, A("1.1.1.1"))]),                          # label past the end
+    response(b"\xc0\xff", [rr(PTR_Q, 1, 1, A("1.1.1.1"))]),                         # pointer past the end
+    b"\x12\x34\x81",
+    b"",
+])
+def test_unusable(buf):
+    assert parse_response(buf) is None
+
+def test_truncated_answers():
+    buf = response(name("x.com"), [rr(PTR_Q, 1, 300, A("1.1.1.1")), rr(PTR_Q, 1, 300, A("2.2.2.2"))])
+    assert all(parse_response(buf[:cut]) is None for cut in range(len(buf)))   # never a partial answer list
+    assert parse_response(buf) == ("x.com", [("1.1.1.1", 300), ("2.2.2.2", 300)])
+
+
+def test_cache_ttl_and_lru():
+    cache = DnsCache(max_entries=2)
+    cache.add_response(response(name("a.com"), [rr(PTR_Q, 1, 0, A("1.1.1.1"))]), 100.0)
+    assert cache.get("1.1.1.1", 100.0 + passive_dns.MIN_TTL) == "a.com"             # TTL 0 -> MIN_TTL
+    assert cache.get("1.1.1.1", 100.1 + passive_dns.MIN_TTL) == ""
+    cache.put("2.2.2.2", "b.com", 0.0, 10 ** 9)
+    assert cache.get("2.2.2.2", passive_dns.MAX_TTL) == "b.com"
+    assert cache.get("2.2.2.2", passive_dns.MAX_TTL + 1) == ""
+    cache.put("3.3.3.3", "c.com", 0.0, 600)
+    cache.get("2.2.2.2", 0.0)                                                       # most recent now
+    cache.put("4.4.4.4", "d.com", 0.0, 600)
+    assert cache.get("3.3.3.3", 0.0) == "" and cache.get("2.2.2.2", 0.0) == "b.com"
+    assert cache.evicted == 2 and cache.responses == 1
+    cache.add_response(b"garbage", 0.0)
+    assert cache.responses == 1
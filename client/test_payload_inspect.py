@@ -0,0 +1,97 @@
+# test_payload_inspect.py [HTTP Host / TLS SNI parsing on whole, truncated and split input]
+
+import struct
+import pytest
+import payload_inspect
+from payload_inspect import MORE, Inspector, parse_client_hello, parse_http
+
+
+HTTP = b"GET /index.html?q=1 HTTP/1.1\r\nUser-Agent: t\r\nhost:  example.com \r\nAccept: */*\r\n\r\n"
+
+
+#TLS record holding a ClientHello with the given extensions (server_name first when sni is set)
+def client_hello(sni=b"www.example.org", session_id=b"s" * 32, extra=b"", record_len=None):
+    ext = extra
+    if sni is not None:
+        names = b"\x00" + struct.pack(">H", len(sni)) + sni
+        ext = struct.pack(">HHH", 0, len(names) + 2, len(names)) + names + ext
+    body = (b"\x03\x03" + b"r" * 32 + bytes((len(session_id),)) + session_id
+            + struct.pack(">H", 4) + b"\x13\x01\x13\x02" + b"\x01\x00" + struct.pack(">H", len(ext)) + ext)
+    hs = b"\x01" + struct.pack(">I", len(body))[1:] + body
+    return b"\x16\x03\x01" + struct.pack(">H", len(hs) if record_len is None else record_len) + hs
+
+PADDING = struct.pack(">HH", 21, 600) + b"\x00" * 600     # an extension ahead of server_name
+
+
+def test_http_request():
+    assert parse_http(HTTP) == ("http", "example.com", "/index.html?q=1")
+    assert parse_http(memoryview(HTTP)) == ("http", "example.com", "/index.html?q=1")
+    assert parse_http(b"CONNECT host:443 HTTP/1.1\r\nHost: host:443\r\n\r\n") == ("http", "host:443", "/")
+
+def test_http_not_a_request():
+    assert parse_http(b"HTTP/1.1 200 OK\r\n\r\n") is None
+    assert parse_http(b"GET / HTTP/1.1\r\nAccept: */*\r\n\r\n") is None     # no Host
+    assert parse_http(b"GET nonsense\r\n") is None
+    assert parse_http(b"\x00\x01binary") is None
+
+@pytest.mark.parametrize("cut", [1, 3, 4, 12, 30, 40, 60])
+def test_http_truncated(cut):
+    assert parse_http(HTTP[:cut]) is MORE
+
+
+def test_client_hello():
+    assert parse_client_hello(client_hello()) == ("tls", "www.example.org", None)
+    assert parse_client_hello(client_hello(extra=PADDING)) == ("tls", "www.example.org", None)
+    assert parse_client_hello(client_hello(sni=None, extra=PADDING)) is None
+
+def test_client_hello_sni_after_other_extensions():
+    sni = b"late.example.net"
+    names = b"\x00" + struct.pack(">H", len(sni)) + sni
+    ext = PADDING + struct.pack(">HHH", 0, len(names) + 2, len(names)) + names
+    assert parse_client_hello(client_hello(sni=None, extra=ext)) == ("tls", "late.example.net", None)
+
+def test_not_a_client_hello():
+    assert parse_client_hello(b"\x17\x03\x03\x00\x10" + b"\x00" * 16) is None     # application data
+    assert parse_client_hello(b"\x16\x03\x03\x00\x04\x02\x00\x00\x00") is None    # ServerHello
+
+#MORE until the server name is complete, the name from then on (later extensions not needed)
+@pytest.mark.parametrize("hello", [client_hello(extra=PADDING), client_hello(sni=None, extra=PADDING + client_hello()[-24:])])
+def test_client_hello_truncated(hello):
+    sni_end = hello.rindex(b".org") + 4
+    for cut in range(len(hello) + 1):
+        want = MORE if cut < sni_end else ("tls", "www.example.org", None)
+        assert parse_client_hello(hello[:cut]) == want, cut
+        assert parse_client_hello(memoryview(hello)[:cut]) == want, cut
+
+
+def test_inspector_whole_messages():
+    ins = Inspector()
+    assert ins.feed(("c", 1, "s", 80), 1000, HTTP) == "http://example.com/index.html?q=1"
+    assert ins.feed(("c", 2, "s", 443), 5, client_hello()) == "https://www.example.org/"
+    assert ins.feed(("c", 1, "s", 80), 1000 + len(HTTP), HTTP) is None        # done after the first
+    assert ins.found == 2
+
+@pytest.mark.parametrize("payload", [HTTP, client_hello(extra=PADDING)])
+def test_inspector_split_and_reordered(payload):
+    parts = [payload[:7], payload[7:300], payload[300:]]
+    seqs = [0xFFFFFFF0, (0xFFFFFFF0 + 7) & 0xFFFFFFFF, (0xFFFFFFF0 + 300) & 0xFFFFFFFF]    # wraps
+    want = payload_inspect.to_url(payload_inspect.parse(payload))
+    ins = Inspector()
+    assert ins.feed("k", seqs[0], parts[0]) is None
+    assert ins.feed("k", seqs[2], parts[2]) is None                           # out of order: held
+    assert ins.feed("k", seqs[0], parts[0]) is None                           # retransmission
+    assert ins.feed("k", seqs[1], parts[1]) == want
+
+def test_inspector_gives_up():
+    ins = Inspector(max_packets=2)
+    assert ins.feed("k", 0, HTTP[:10]) is None
+    assert ins.feed("k", 10, HTTP[10:20]) is None                             # budget spent
+    assert ins.feed("k", 20, HTTP[20:]) is None
+    ins = Inspector(max_bytes=40)
+    assert ins.feed("k", 0, HTTP) is None                                     # Host beyond max_bytes
+
+def test_inspector_bounded():
+    ins = Inspector(max_tracked=100)
+    for i in range(1000):
+        ins.feed(i, 0, b"\x00 not a request")
+    assert len(ins.streams) <= 100
@@ -63,6 +63,8 @@ class FlowsController {
 
       const lastN = lastNSeconds ? parseInt(lastNSeconds) : null;
       const result = await pythonClient.getLiveFlows(sessionId, lastN);
+      // Whole-session top talkers from the worker; per-flow counting only for a time window
+      const published = lastN ? null : await pythonClient.getTopTalkers(sessionId);
 
       // Enhanced statistics
       const flows = result.flows.map(flowData => new FlowRecord(flowData));
@@ -74,8 +76,9 @@ class FlowsController {
           flows.reduce((sum, flow) => sum + flow.duration, 0) / flows.length : 0,
         suspiciousFlows: flows.filter(flow => flow.isSuspicious()).length,
         protocolDistribution: this.getProtocolDistribution(flows),
-        topSources: this.getTopSources(flows, 5),
-        topDestinations: this.getTopDestinations(flows, 5)
+        topSources: published ? this.getPublishedTop(published.sources, 5) : this.getTopSources(flows, 5),
+        topDestinations: published ? this.getPublishedTop(published.destinations, 5) : this.getTopDestinations(flows, 5),
+        topPorts: published ? this.getPublishedTop(published.ports, 5, 'port') : []
       };
 
       res.json({
@@ -180,6 +183,14 @@ class FlowsController {
       .map(([ip, count]) => ({ ip, count }));
   }
 
+  // Helper method to map a published top-K view (by bytes) to { ip, bytes, packets }
+  static getPublishedTop(view, limit = 5, keyName = 'ip') {
+    const packets = new Map(view.packets.map(e => [e.key, e.value]));
+    return view.bytes
+      .slice(0, limit)
+      .map(e => ({ [keyName]: e.key, bytes: e.value, packets: packets.get(e.key) ?? null, error: e.error }));
+  }
+
   // Helper method to get top destination IPs
   static getTopDestinations(flows, limit = 5) {
     const destinations = {};
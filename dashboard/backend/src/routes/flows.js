@@ -53,4 +53,27 @@ router.get('/:sessionId/stats', async (req, res) => {
   }
 });
 
+// Get the top talkers published by the capture worker (O(K), no flow scan)
+router.get('/:sessionId/top-talkers', async (req, res) => {
+  try {
+    const { sessionId } = req.params;
+    const topTalkers = await pythonClient.getTopTalkers(sessionId);
+
+    res.json({
+      success: true,
+      sessionId,
+      available: topTalkers !== null,
+      topTalkers
+    });
+
+  } catch (error) {
+    console.error('Error getting top talkers:', error);
+    res.status(500).json({
+      success: false,
+      error: 'Failed to get top talkers',
+      details: error.message
+    });
+  }
+});
+
 module.exports = router;
\ No newline at end of file
@@ -3,6 +3,14 @@ const path = require('path');
 const fs = require('fs-extra');
 const os = require('os');
 
+const PARALLEL_PCAP_BYTES = 64 * 1024 * 1024;
+const LIVE_IDLE_TIMEOUT = 60;     // seconds
+const LIVE_ACTIVE_TIMEOUT = 120;  // seconds, CICFlowMeter's default flow timeout
+const LIVE_TOPK = 10;             // top talkers the worker publishes to <output>.topk.json
+// How live flows reach the classifier: 'ring' = shared-memory Arrow batches (flow_ring.py),
+// 'files' = rotated CSV segments on disk (flow_segments.py). FLOW_HANDOFF=files forces the files
+const LIVE_HANDOFF = process.env.FLOW_HANDOFF === 'files' ? 'files' : 'ring';
+
 class PythonClient {
   constructor() {
     this.workerPath = path.join(__dirname, '..', '..', '..', 'worker');
@@ -39,7 +47,17 @@ class PythonClient {
     const outputFile = path.join(this.dataPath, `liveflows_${sessionId}.csv`);
 
     console.log(`[LIVE] Starting capture for session: ${sessionId}`);
-    const pythonProcess = this.spawnPython(['pcap2csv_win_new.py', '--live', '--iface', iface, '-o', outputFile], this.workerPath);
+    // Flows are finalized on FIN/RST or timeout and appended once, so the worker's memory
+    // follows the number of open flows instead of growing for the whole session. They go to
+    // rotated segments under <outputFile>.segments/ and, unless FLOW_HANDOFF=files, also to a
+    // shared-memory ring named after outputFile, so new rows are read without waiting for their
+    // segment (the segments stay the complete record). Either way the periodic classification
+    // reads only the rows published since its last run
+    const args = ['pcap2csv_win_new.py', '--live', '--iface', iface, '-o', outputFile,
+      '--idle-timeout', String(LIVE_IDLE_TIMEOUT), '--active-timeout', String(LIVE_ACTIVE_TIMEOUT), '--tcp-close',
+      '--topk', String(LIVE_TOPK), '--segments', '--segment-seconds', String(refreshRate)];
+    if (LIVE_HANDOFF === 'ring') args.push('--ring');
+    const pythonProcess = this.spawnPython(args, this.workerPath);
 
 
     // const scriptPath = path.join(this.workerPath, 'pcap2csv_win_new.py');
@@ -52,7 +70,8 @@ class PythonClient {
 
 
 
-    this.activeSessions.set(sessionId, { process: pythonProcess, outputFile, config, startTime: new Date(), status: 'running' });
+    this.activeSessions.set(sessionId, { process: pythonProcess, outputFile, config, startTime: new Date(), status: 'running',
+      lastRow: 0, recentFlows: [], totals: this.calculateStats([]) });
 
     pythonProcess.stdout.on('data', data => console.log(`[LIVE ${sessionId}] stdout:`, data.toString()));
     pythonProcess.stderr.on('data', data => console.error(`[LIVE ${sessionId}] stderr:`, data.toString()));
@@ -60,6 +79,8 @@ class PythonClient {
       console.log(`[LIVE ${sessionId}] process exited with code ${code}`);
       const session = this.activeSessions.get(sessionId);
       if (session) session.status = 'stopped';
+      // The worker completed its last segment on the way out: classify what the last cycle missed
+      if (session && session.classifyAndBroadcast) session.classifyAndBroadcast();
     });
 
     this.startPeriodicClassification(sessionId, refreshRate, lastNSeconds);
@@ -174,16 +195,21 @@ startPeriodicClassification(sessionId, refreshRate, lastNSeconds) {
       console.log(`[LIVE ${sessionId}] === Starting classification cycle ===`);
       console.log(`[LIVE ${sessionId}] Checking file:`, session.outputFile);
 
-      // Use null for lastNSeconds to get ALL flows, not just recent ones
-      const flows = await this.classifyFlows(session.outputFile, null);
+      // Only the rows published since the last cycle; totals accumulate across cycles
+      const newFlows = await this.classifyFlows(session.outputFile, null, session.lastRow);
+      if (newFlows.lastRow != null) session.lastRow = newFlows.lastRow;
       
-      if (!flows || flows.length === 0) {
-        console.warn(`[LIVE ${sessionId}] No flows extracted after classification`);
+      if (!newFlows || newFlows.length === 0) {
+        console.warn(`[LIVE ${sessionId}] No new flows since row ${session.lastRow}`);
         return;
       }
 
-      const stats = this.calculateStats(flows);
-      console.log(`🎉 [LIVE ${sessionId}] Classification successful: ${flows.length} flows, stats:`, stats);
+      const batchStats = this.calculateStats(newFlows);
+      for (const k of Object.keys(session.totals)) session.totals[k] += batchStats[k];
+      session.recentFlows = session.recentFlows.concat(newFlows).slice(-20);
+      const flows = session.recentFlows;
+      const stats = { ...session.totals };
+      console.log(`🎉 [LIVE ${sessionId}] Classification successful: ${newFlows.length} new flows, stats:`, stats);
 
       // Broadcast to clients
       if (global.broadcast) {
@@ -195,7 +221,7 @@ startPeriodicClassification(sessionId, refreshRate, lastNSeconds) {
             flows: flows.slice(-20), // Last 20 flows for display
             stats, 
             timestamp: new Date().toISOString(),
-            totalProcessed: flows.length
+            totalProcessed: stats.totalFlows
           }
         });
         console.log(`✅ [LIVE ${sessionId}] Broadcast complete`);
@@ -207,6 +233,8 @@ startPeriodicClassification(sessionId, refreshRate, lastNSeconds) {
     }
   };
 
+  session.classifyAndBroadcast = classifyAndBroadcast;
+
   // Start first classification after 8 seconds (give time for initial capture)
   setTimeout(classifyAndBroadcast, 8000);
   
@@ -223,10 +251,15 @@ startPeriodicClassification(sessionId, refreshRate, lastNSeconds) {
     console.log(`[ANALYZE] PCAP file: ${absPath}`);
     if (!await fs.pathExists(absPath)) return { success: false, uploadId, message: "PCAP not found", flows: [], stats: {}, outputFile: null };
 
-    const outputFile = path.join(this.dataPath, `analysis_${uploadId}.csv`);
-    console.log(`[ANALYZE] Output CSV: ${outputFile}`);
+    // Typed Parquet: a fraction of the CSV size, and the classifier reads it without re-parsing text
+    const outputFile = path.join(this.dataPath, `analysis_${uploadId}.parquet`);
+    console.log(`[ANALYZE] Output file: ${outputFile}`);
 
     const args = ['pcap2csv_win_new.py', '-i', absPath, '-o', outputFile];
+    // Large uploads are split into record-aligned chunks and processed on every core
+    const { size } = await fs.stat(absPath);
+    const cores = os.cpus().length;
+    if (size >= PARALLEL_PCAP_BYTES && cores > 1) args.push('--jobs', String(cores));
     return new Promise(resolve => {
       const pythonProcess = this.spawnPython(args, this.workerPath);
       let stdout = '', stderr = '';
@@ -304,16 +337,20 @@ startPeriodicClassification(sessionId, refreshRate, lastNSeconds) {
 
 
 /** ===================== CLASSIFY FLOWS ===================== **/
-async classifyFlows(csvFile, lastNSeconds = null) {
+// csvFile may be a segmented live output (flow_segments.py, plus the shared-memory ring of
+// flow_ring.py while a --ring capture runs): then only the rows after row afterRow are
+// classified, and the returned array's lastRow says where to resume
+async classifyFlows(csvFile, lastNSeconds = null, afterRow = null) {
   console.log(`[CLASSIFY] Starting classification for: ${csvFile}`);
   
-  if (!await fs.pathExists(csvFile)) {
+  if (!await fs.pathExists(csvFile) && !await fs.pathExists(path.join(`${csvFile}.segments`, 'manifest.json'))) {
     console.log(`[CLASSIFY] CSV file not found: ${csvFile}`);
     return [];
   }
 
   const escapedCsv = csvFile.replace(/\\/g, '\\\\');
   const pythonLastN = lastNSeconds === null ? 'None' : lastNSeconds;
+  const pythonAfter = afterRow === null ? 'None' : afterRow;
   const escapedWorker = this.workerPath.replace(/\\/g, '\\\\');
 
   const code = `
@@ -330,8 +367,10 @@ try:
     from classifier_core import classify_flows
     print("[NODE->PYTHON] Successfully imported classifier_core", flush=True)
     
-    result_df = classify_flows(r'${escapedCsv}', ${pythonLastN})
+    result_df = classify_flows(r'${escapedCsv}', ${pythonLastN}, ${pythonAfter})
     print(f"[NODE->PYTHON] Classification returned DataFrame with {len(result_df)} rows", flush=True)
+    if "last_row" in result_df.attrs:
+        print(f"===LAST_ROW==={result_df.attrs['last_row']}===", flush=True)
     
     if result_df is not None and not result_df.empty:
         flows = result_df.to_dict('records')
@@ -377,9 +416,11 @@ except Exception as e:
       try {
         // Look for the JSON between markers
         const jsonMatch = stdout.match(/===JSON_START===(.*)===JSON_END===/s);
+        const rowMatch = stdout.match(/===LAST_ROW===(\d+)===/);
         
         if (jsonMatch && jsonMatch[1]) {
           const result = JSON.parse(jsonMatch[1].trim());
+          if (rowMatch && Array.isArray(result)) result.lastRow = Number(rowMatch[1]);
           console.log(`🎉 [CLASSIFY] SUCCESS! Parsed ${result.length} flows from Python`);
           resolve(Array.isArray(result) ? result : []);
         } else {
@@ -432,6 +473,20 @@ except Exception as e:
     return { flows, stats: this.calculateStats(flows) };
   }
 
+  // Top sources/destinations/ports by bytes and packets, kept by the worker in fixed memory
+  // (Space-Saving) and rewritten with every periodic dump: reading it costs O(K), not O(flows).
+  // null until the first dump.
+  async getTopTalkers(sessionId) {
+    const session = this.activeSessions.get(sessionId);
+    if (!session) throw new Error('Session not found');
+    try {
+      return await fs.readJson(`${session.outputFile}.topk.json`);
+    } catch (err) {
+      if (err.code === 'ENOENT') return null;
+      throw err;
+    }
+  }
+
   getSessionInfo(sessionId) {
     const session = this.activeSessions.get(sessionId);
     return session ? { sessionId, status: session.status, startTime: session.startTime, config: session.config } : null;
@@ -0,0 +1,5 @@
+# conftest.py [Worker tests import the shared flow modules the way the worker does]
+
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "flowlib"))
@@ -0,0 +1,126 @@
+# flow_accum.py [Constant-memory per-flow accumulators (--flow-state stream)]
+# Instead of keeping every timestamp, length and flag of a flow, each packet updates
+# running statistics: counts, sums, Welford mean/variance, min/max, last-seen times,
+# per-direction IAT stats, the active/idle state machine and TCP flag counters.
+# Finalizing a flow is O(1) and nothing is re-sorted.
+# Assumes a flow's packets arrive in timestamp order (captures and live taps do); at flow
+# level a late packet counts as a zero gap instead of being sorted back into place.
+# The percentile columns come from quantile_sketch: exact while a series is short, then a
+# KLL sketch of O(k) items (--quantiles picks the sketch; --quantiles exact keeps every
+# sample and makes the flow state O(n) again).
+
+import math
+from quantile_sketch import new_quantiles
+
+
+FLAG_BITS = (0x02, 0x01, 0x04, 0x08, 0x10, 0x20)   # SYN FIN RST PSH ACK URG (CSV column order)
+
+
+class RunningStats:
+    """count / sum / min / max plus Welford mean and variance of a stream"""
+    __slots__ = ("n", "total", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, x):
+        self.n += 1
+        self.total += x
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+        if self.min is None or x < self.min: self.min = x
+        if self.max is None or x > self.max: self.max = x
+
+    def avg(self):
+        return self.total / self.n if self.n else 0.0
+
+    def std(self):   # population std, like statistics.pstdev
+        return math.sqrt(max(self.m2, 0.0) / self.n) if self.n > 1 else 0.0
+
+    def with_value(self, x):
+        c = RunningStats()
+        c.n, c.total, c.mean, c.m2, c.min, c.max = self.n, self.total, self.mean, self.m2, self.min, self.max
+        c.add(x)
+        return c
+
+
+class FlowAccumulator:
+    """O(1) state of one bidirectional flow. Dict-style access ( f["end"], f.get("fin") )
+    is kept for the scalar fields the expiry and shard code read and write."""
+    __slots__ = ("src", "dst", "sport", "dport", "proto", "start", "end", "fin", "seq",
+                 "last", "last_fwd", "last_bwd", "active_start",
+                 "fwd_len", "bwd_len", "flow_iat", "fwd_iat", "bwd_iat", "active", "idle",
+                 "fwd_flags", "bwd_flags",
+                 "q_fwd_len", "q_bwd_len", "q_flow_iat", "q_fwd_iat", "q_bwd_iat")
+    threshold = 1.0    # active/idle split, seconds (class-wide, set by the caller)
+
+    def __init__(self, src, dst, sport, dport, proto, ts, length, flags):
+        self.src, self.dst, self.sport, self.dport, self.proto = src, dst, sport, dport, proto
+        self.start = self.end = self.last = self.last_fwd = self.active_start = ts
+        self.last_bwd = None
+        self.fwd_len, self.bwd_len = RunningStats(), RunningStats()
+        self.flow_iat, self.fwd_iat, self.bwd_iat = RunningStats(), RunningStats(), RunningStats()
+        self.active, self.idle = RunningStats(), RunningStats()
+        self.fwd_flags, self.bwd_flags = [0] * 6, [0] * 6
+        self.q_fwd_len, self.q_bwd_len = new_quantiles(), new_quantiles()
+        self.q_flow_iat, self.q_fwd_iat, self.q_bwd_iat = new_quantiles(), new_quantiles(), new_quantiles()
+        self.fwd_len.add(length); self.q_fwd_len.append(length)
+        if flags is not None: self._count_flags(self.fwd_flags, flags)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return hasattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    @staticmethod
+    def _count_flags(counts, flags):
+        for i, bit in enumerate(FLAG_BITS):
+            if flags & bit: counts[i] += 1
+
+    def add(self, ts, length, flags, fwd):
+        if ts > self.end: self.end = ts
+        # flow level: gaps between consecutive packets in time order, active/idle periods
+        t = ts if ts > self.last else self.last
+        g = t - self.last
+        self.flow_iat.add(g); self.q_flow_iat.append(g)
+        if g > self.threshold:
+            self.active.add(self.last - self.active_start)
+            self.idle.add(g)
+            self.active_start = t
+        self.last = t
+        # per direction: arrival-order gaps, lengths, flags
+        if fwd:
+            g = ts - self.last_fwd
+            self.fwd_iat.add(g); self.q_fwd_iat.append(g)
+            self.last_fwd = ts
+            self.fwd_len.add(length); self.q_fwd_len.append(length)
+            if flags is not None: self._count_flags(self.fwd_flags, flags)
+        else:
+            if self.last_bwd is not None:
+                g = ts - self.last_bwd
+                self.bwd_iat.add(g); self.q_bwd_iat.append(g)
+            self.last_bwd = ts
+            self.bwd_len.add(length); self.q_bwd_len.append(length)
+            if flags is not None: self._count_flags(self.bwd_flags, flags)
+
+    def packets(self):
+        return self.fwd_len.n + self.bwd_len.n
+
+    def active_stats(self):
+        """RunningStats of the active periods, including the one still open"""
+        if self.active_start != self.last:
+            return self.active.with_value(self.last - self.active_start)
+        return self.active
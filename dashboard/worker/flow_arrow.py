@@ -0,0 +1,123 @@
+# flow_arrow.py [Typed Parquet / Arrow IPC output for the flow tables]
+# CSV stores every value as text and the classifier re-infers the types on each read. Here the
+# flow columns get one fixed schema: features float32, counts and ports int32 (FlowID and byte
+# totals int64, they outgrow 2^31), protocol and port categories dictionary-encoded. Rows are
+# buffered into record batches of BATCH_ROWS and written as Parquet row groups (zstd) or Arrow
+# IPC batches; the file is built under <path>.part and renamed into place when closed, so a
+# reader never opens a half-written file. Each writer keeps one growing vocabulary per
+# dictionary column, so a later batch's dictionary only extends the earlier ones (an Arrow IPC
+# file takes deltas, not replacements) and the codes mean the same thing across the file.
+
+import os
+try:
+    import pyarrow as pa
+except ImportError:     # only needed for Parquet/Arrow output
+    pa = None
+
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+EXTENSIONS = {".parquet": "parquet", ".pq": "parquet", ".arrow": "arrow", ".feather": "arrow", ".ipc": "arrow"}
+BATCH_ROWS = 65536
+
+INT64_COLUMNS = {"FlowID", "TotLenFwd", "TotLenBwd", "TotalBytes"}
+INT32_COLUMNS = {"SrcPort", "DstPort", "TotFwdPkts", "TotBwdPkts", "TotalPackets",
+                 "FwdPktLenMin", "FwdPktLenMax", "BwdPktLenMin", "BwdPktLenMax",
+                 "FlowSamplingRate", "PktSamplingRate"} | \
+                {f"{side}_{flag}" for side in ("Fwd", "Bwd") for flag in ("SYN", "FIN", "RST", "PSH", "ACK", "URG")}
+STRING_COLUMNS = {"SrcIP", "DstIP"}
+CATEGORY_COLUMNS = {"Protocol": "int8", "SrcPortCat": "int8", "DstPortCat": "int8", "SourceFile": "int32"}  # index type
+
+
+#Output format named by a file's extension ("parquet" / "arrow"), "csv" for anything else
+def format_of(path):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), "csv")
+
+def column_type(name):
+    if name in INT64_COLUMNS: return pa.int64()
+    if name in INT32_COLUMNS: return pa.int32()
+    if name in STRING_COLUMNS: return pa.string()
+    if name in CATEGORY_COLUMNS: return pa.dictionary(getattr(pa, CATEGORY_COLUMNS[name])(), pa.string())
+    return pa.float32()
+
+def schema(columns):
+    return pa.schema([pa.field(name, column_type(name)) for name in columns])
+
+
+class FlowWriter:
+    """Batched writer of flow rows (dicts) or columns (dict of lists) to one Parquet/Arrow file"""
+
+    def __init__(self, path, columns, fmt=None):
+        if pa is None:
+            raise RuntimeError(f"{path}: Parquet/Arrow output needs the 'pyarrow' package")
+        self.path, self.columns = path, list(columns)
+        self.format = fmt or format_of(path)
+        self.schema = schema(self.columns)
+        self.part = path + ".part"
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(self.part, self.schema, compression="zstd")
+        else:
+            self.writer = pa.ipc.new_file(self.part, self.schema,
+                                          options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        self.vocab = {name: {} for name in self.columns if name in CATEGORY_COLUMNS}   # value -> code
+        self.pending = []      # rows waiting for a full batch
+        self.rows = 0
+
+    def write_rows(self, rows):
+        self.pending.extend(rows)
+        while len(self.pending) >= BATCH_ROWS:
+            chunk, self.pending = self.pending[:BATCH_ROWS], self.pending[BATCH_ROWS:]
+            self._write(chunk)
+
+    def write_columns(self, cols):
+        n = len(cols[self.columns[0]]) if cols else 0
+        for start in range(0, n, BATCH_ROWS):
+            self.write_batch({name: cols[name][start:start + BATCH_ROWS] for name in self.columns})
+
+    def _write(self, rows):
+        self.write_batch({name: [row.get(name) for row in rows] for name in self.columns})
+
+    def _array(self, field, values):
+        vocab = self.vocab.get(field.name)
+        if vocab is None:
+            return pa.array(values, type=field.type)
+        codes = [None if v is None else vocab.setdefault(str(v), len(vocab)) for v in values]
+        return pa.DictionaryArray.from_arrays(pa.array(codes, type=field.type.index_type),
+                                              pa.array(list(vocab), type=pa.string()))
+
+    def write_batch(self, cols):
+        batch = pa.record_batch([self._array(f, cols[f.name]) for f in self.schema], schema=self.schema)
+        if self.format == "parquet":
+            self.writer.write_table(pa.Table.from_batches([batch]), row_group_size=BATCH_ROWS)
+        else:
+            self.writer.write_batch(batch)
+        self.rows += batch.num_rows
+
+    def close(self):
+        if self.pending:
+            self._write(self.pending)
+            self.pending = []
+        self.writer.close()
+        os.replace(self.part, self.path)
+
+
+#One self-contained record batch of rows (dictionaries built per batch)
+def record_batch(schema, rows):
+    return pa.record_batch([pa.array([row.get(f.name) for row in rows], type=f.type) for f in schema], schema=schema)
+
+def write_rows(path, columns, rows, fmt=None):
+    w = FlowWriter(path, columns, fmt)
+    w.write_rows(rows)
+    w.close()
+
+def write_columns(path, columns, cols, fmt=None):
+    w = FlowWriter(path, columns, fmt)
+    w.write_columns(cols)
+    w.close()
+
+#DataFrame from a Parquet or Arrow IPC flow file
+def read_frame(path):
+    import pandas as pd
+    if format_of(path) == "parquet":
+        return pd.read_parquet(path)
+    return pd.read_feather(path)
@@ -0,0 +1,207 @@
+# flow_ring.py [Live handoff without file reads: a shared-memory ring of Arrow record batches]
+# With files, the classifier only sees a round's flows once the segment holding them is
+# rotated, and then re-parses the CSV. Here the capture worker also publishes each round's
+# finished (or changed) flow rows as Arrow IPC record batches into the slots of a named
+# shared-memory block, and the classifier maps the block and decodes the batches from there:
+# no file, no text parsing, one memcpy of the batch bytes.
+# The ring is only the fast path: every row is still appended to the --segments output
+# (the writer tees), which stays the durable record. Readers track a row position over the
+# whole run and take completed segments first, then the newer rows still in the ring; rows
+# the ring has already overwritten are simply read from their segment once it is rotated,
+# and after the capture stops (the last segment completed before the ring is removed)
+# everything comes from the segments.
+# Layout: a header (magic, mode, slot count/size, batches and rows published so far), then
+# `slots` fixed-size slots; batch n (from 1) goes to slot (n - 1) % slots, so the ring holds
+# the last `slots` batches. A slot is marked empty (seq 0) while it is rewritten and gets its
+# batch number (and first row) once complete; a reader copies the batch bytes out, checks the
+# number is unchanged and only then decodes its copy (decoding a slot that is being rewritten
+# could read arbitrary offsets).
+
+import hashlib, os, struct
+from multiprocessing import shared_memory
+import flow_arrow, flow_segments
+
+
+MAGIC = b"FLOWRNG1"
+RING_BYTES = 64 << 20
+RING_SLOTS = 64
+HEADER_BYTES = 64
+SLOT_HEADER = 32
+MODES = ("finished", "updates")
+
+VERSION = 2
+
+_head = struct.Struct("<8sHBBIQQQ")   # magic, version, mode, closed, slots, slot bytes, published, rows
+_slot = struct.Struct("<QQIQ")        # seq (0 while written), payload length, rows, first row
+
+
+#Shared-memory name of the ring for an output path (the same path the files would use)
+def ring_name(output):
+    return "flowring_" + hashlib.sha1(os.path.abspath(output).encode("utf-8")).hexdigest()[:12]
+
+#Attach to an existing block without taking ownership: before Python 3.13 the attaching
+#process registers it with the resource tracker, which would unlink it when that process exits
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class RingWriter:
+    """Publishes flow rows into the ring as Arrow record batches (capture worker side) and
+    hands the same rows to `files` (a flow_segments.SegmentWriter), which keeps them"""
+
+    def __init__(self, output, headers, files, mode="finished", ring_bytes=RING_BYTES, slots=RING_SLOTS):
+        if flow_arrow.pa is None:
+            raise RuntimeError("the shared-memory ring needs the 'pyarrow' package")
+        if slots < 1:
+            raise ValueError("the ring needs at least one slot")
+        self.name, self.mode, self.slots = ring_name(output), mode, slots
+        self.slot_bytes = max(ring_bytes // slots, 1 << 16)
+        size = HEADER_BYTES + slots * self.slot_bytes
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:      # left behind by a worker that did not exit cleanly
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self.schema = flow_arrow.schema(headers)
+        self.files = files
+        self.published = self.rows = 0
+        self.row_bytes = 0           # serialized bytes per row of the last batch, sizes the next ones
+        sink = flow_arrow.pa.BufferOutputStream()
+        flow_arrow.pa.ipc.new_stream(sink, self.schema).close()
+        self.overhead = sink.tell()  # schema message + end marker, paid by every batch
+        self._write_header()
+        self.label = f"shared-memory ring {self.name} + {files.label}"
+
+    def _write_header(self, closed=False):
+        _head.pack_into(self.shm.buf, 0, MAGIC, VERSION, MODES.index(self.mode), closed,
+                        self.slots, self.slot_bytes, self.published, self.rows)
+
+    #Ring first, then the segments: a reader never finds rows in a completed segment that the
+    #ring has not counted yet
+    def append(self, rows):
+        if rows:
+            self._append(rows)
+        self.files.append(rows)
+
+    def _append(self, rows):
+        batch = flow_arrow.record_batch(self.schema, rows)
+        step = len(rows)
+        if self.row_bytes:
+            step = max(1, min(step, int((self.slot_bytes - SLOT_HEADER - self.overhead) * 0.9 / self.row_bytes)))
+        for start in range(0, len(rows), step):
+            self._publish(batch.slice(start, step))
+
+    #One batch into the next slot, halving it (slices, no copies) until it fits
+    def _publish(self, batch):
+        seq = self.published + 1
+        off = HEADER_BYTES + (seq - 1) % self.slots * self.slot_bytes
+        buf = self.shm.buf
+        _slot.pack_into(buf, off, 0, 0, 0, 0)
+        sink = flow_arrow.pa.FixedSizeBufferWriter(flow_arrow.pa.py_buffer(buf[off + SLOT_HEADER:off + self.slot_bytes]))
+        try:
+            with flow_arrow.pa.ipc.new_stream(sink, self.schema) as w:
+                w.write_batch(batch)
+            length = sink.tell()
+        except OSError:             # ran past the end of the slot
+            if batch.num_rows == 1:
+                raise ValueError(f"one flow row does not fit a {self.slot_bytes}-byte ring slot")
+            half = batch.num_rows // 2
+            self._publish(batch.slice(0, half))
+            self._publish(batch.slice(half))
+            return
+        finally:
+            del sink
+        _slot.pack_into(buf, off, seq, length, batch.num_rows, self.rows)
+        self.row_bytes = max(length - self.overhead, 1) / batch.num_rows
+        self.published, self.rows = seq, self.rows + batch.num_rows
+        self._write_header()
+
+    #The last segment is completed before the ring goes away, so no row is left in memory only
+    def close(self):
+        self.files.close()
+        self._write_header(closed=True)
+        self.shm.close()
+        self.shm.unlink()
+
+
+# ---------------- readers ----------------
+#Arrow-backed columns (strings, dictionaries) as plain objects, like the rows read from the segments
+def _detach(df):
+    import numpy as np
+    for col in df.columns:
+        if not isinstance(df[col].dtype, np.dtype):
+            df[col] = df[col].astype(object)
+    return df
+
+#Rows from row `after` on that are still in the ring, or None when there is no ring for this
+#output. Returns (DataFrame, its first row, the row after its last): the rows are contiguous,
+#starting at `after` or at the oldest batch the ring still holds, and end before a batch that
+#was overwritten while being read. A ring with fewer rows than `after` belongs to a new capture
+#under the same name: then it is read from row 0.
+def read_frame(output, after=0):
+    if flow_arrow.pa is None:
+        return None
+    import pandas as pd
+    pa = flow_arrow.pa
+    try:
+        shm = _attach(ring_name(output))
+    except (FileNotFoundError, OSError):
+        return None
+    try:
+        magic, version, _, _, slots, slot_bytes, published, rows = _head.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            return None
+        after = after if 0 < (after or 0) <= rows else 0
+        first, position, frames = None, after, []
+        for seq in range(max(1, published - slots + 1), published + 1):
+            off = HEADER_BYTES + (seq - 1) % slots * slot_bytes
+            got, length, n, start = _slot.unpack_from(shm.buf, off)
+            if got == seq and start + n <= position:
+                continue
+            data = bytes(shm.buf[off + SLOT_HEADER:off + SLOT_HEADER + min(length, slot_bytes - SLOT_HEADER)])
+            if got != seq or _slot.unpack_from(shm.buf, off)[0] != seq or (first is not None and start != position):
+                if first is None:    # the oldest slot, being rewritten: start after it
+                    continue
+                break
+            df = _detach(pa.ipc.open_stream(data).read_all().to_pandas())
+            if start < position:
+                df = df.iloc[position - start:]
+            if first is None:
+                first = max(start, position)
+            frames.append(df)
+            position = start + n
+    finally:
+        shm.close()
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    return df, (after if first is None else first), position
+
+#Live output of a capture (--segments, with or without --ring) from row `after` on, or None when
+#there is no segment manifest for this output. Completed segments first, then the rows after
+#them still in the ring; when the ring has moved past the last completed segment, those rows
+#wait until their segment is completed. Returns (DataFrame (latest row per flow in "updates"
+#mode), the row position to resume from, rows taken from the ring)
+def read_live(output, after=0):
+    manifest = flow_segments.read_manifest(output)
+    if manifest is None:
+        return None
+    after = after or 0
+    ring = read_frame(output, after)
+    if (ring[2] if ring is not None else flow_segments.total_rows(manifest)) < after:
+        after = 0            # a new capture under the same name: start over
+    df, position = flow_segments.read_frame(manifest, after)
+    from_ring = 0
+    if ring is not None and ring[2] > position and ring[1] <= position:
+        import pandas as pd
+        tail = ring[0].iloc[position - ring[1]:]
+        df = pd.concat([df, tail], ignore_index=True) if len(df) else tail.reset_index(drop=True)
+        position, from_ring = ring[2], len(tail)
+    return flow_segments.latest_rows(df, manifest["mode"]), position, from_ring
@@ -0,0 +1,131 @@
+# flow_segments.py [Append-only live output: rotated CSV segments listed in a manifest]
+# Rewriting liveflows_<session>.csv every round costs the whole table each time, and a
+# reader that opens it mid-write sees half a file. Here each round's new rows are appended
+# to an open segment (a dot-file readers ignore); once it is big or old enough it is
+# flushed, fsynced and renamed into place, and the manifest listing the completed segments
+# is replaced (write temp + os.replace), so a reader only ever sees whole segments and can
+# pick up just the rows after the last it consumed (a row position over the whole run).
+# Layout: <output>.segments/seg-000001.csv, ..., manifest.json. With mode "finished" every
+# flow appears once; with mode "updates" a flow reappears whenever it changed and its
+# last row (by FlowID) is the current one.
+
+import csv, json, os, time
+
+
+MANIFEST = "manifest.json"
+SEGMENT_BYTES = 16 << 20
+SEGMENT_SECONDS = 30
+
+
+def segment_dir(output):
+    return output + ".segments"
+
+def manifest_path(output):
+    return os.path.join(segment_dir(output), MANIFEST)
+
+
+class SegmentWriter:
+    """Appends rows to the open segment, rotates it into place by size or age"""
+
+    def __init__(self, output, headers, mode="finished", max_bytes=SEGMENT_BYTES, max_seconds=SEGMENT_SECONDS):
+        self.dir = self.label = segment_dir(output)
+        self.headers, self.mode = headers, mode
+        self.max_bytes, self.max_seconds = max_bytes, max_seconds
+        os.makedirs(self.dir, exist_ok=True)
+        for name in os.listdir(self.dir):      # a new run starts a new series
+            if name.startswith(("seg-", ".seg-")) or name == MANIFEST:
+                os.remove(os.path.join(self.dir, name))
+        self.segments = []
+        self.fh = None
+        self.write_manifest()
+
+    def _open(self):
+        self.seq = len(self.segments) + 1
+        self.name = f"seg-{self.seq:06d}.csv"
+        self.part = os.path.join(self.dir, f".{self.name}.part")
+        self.fh = open(self.part, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.fh, fieldnames=self.headers, extrasaction="ignore")
+        self.writer.writeheader()
+        self.opened, self.rows, self.first_id, self.last_id = time.time(), 0, None, None
+
+    def append(self, rows):
+        if rows:
+            if self.fh is None:
+                self._open()
+            self.writer.writerows(rows)
+            self.fh.flush()
+            self.rows += len(rows)
+            if self.first_id is None:
+                self.first_id = rows[0].get("FlowID")
+            self.last_id = rows[-1].get("FlowID")
+        self.maybe_rotate()
+
+    def maybe_rotate(self, now=None):
+        if self.fh is None:
+            return
+        if self.fh.tell() >= self.max_bytes or (now or time.time()) - self.opened >= self.max_seconds:
+            self.rotate()
+
+    #Complete the open segment: fsync, rename into place, then list it in the manifest
+    def rotate(self):
+        if self.fh is None:
+            return None
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+        size = self.fh.tell()
+        self.fh.close()
+        self.fh = None
+        os.replace(self.part, os.path.join(self.dir, self.name))
+        self.segments.append({"seq": self.seq, "name": self.name, "rows": self.rows, "bytes": size,
+                              "first_flow_id": self.first_id, "last_flow_id": self.last_id,
+                              "opened": self.opened, "closed": time.time()})
+        self.write_manifest()
+        return self.name
+
+    def write_manifest(self):
+        tmp = os.path.join(self.dir, f".{MANIFEST}.tmp")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"version": 1, "mode": self.mode, "headers": self.headers,
+                       "segments": self.segments, "updated": time.time()}, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, os.path.join(self.dir, MANIFEST))
+
+    def close(self):
+        self.rotate()
+
+
+# ---------------- readers ----------------
+#Manifest of a segmented output (path: the output name, its .segments dir or the manifest), or None
+def read_manifest(path):
+    for candidate in (path, os.path.join(path, MANIFEST), manifest_path(path)):
+        if os.path.basename(candidate) == MANIFEST and os.path.isfile(candidate):
+            with open(candidate, encoding="utf-8") as fh:
+                manifest = json.load(fh)
+            manifest["dir"] = os.path.dirname(candidate)
+            return manifest
+    return None
+
+#Rows in the completed segments (row positions count the rows of the whole run)
+def total_rows(manifest):
+    return sum(s["rows"] for s in manifest["segments"])
+
+#Latest row per flow in "updates" mode (a flow reappears whenever it changed)
+def latest_rows(df, mode):
+    if mode == "updates" and "FlowID" in df.columns:
+        df = df.drop_duplicates("FlowID", keep="last").sort_values("FlowID", kind="stable").reset_index(drop=True)
+    return df
+
+#DataFrame of the rows of the completed segments from row `after` on (latest row per flow in
+#"updates" mode) and the row position after them (`after` when there is nothing new)
+def read_frame(manifest, after=0):
+    import pandas as pd
+    after, start, frames = after or 0, 0, []
+    for s in manifest["segments"]:
+        if start + s["rows"] > after:
+            skip = max(after - start, 0)
+            frames.append(pd.read_csv(os.path.join(manifest["dir"], s["name"]), skiprows=range(1, skip + 1)))
+        start += s["rows"]
+    if not frames:
+        return pd.DataFrame(columns=manifest["headers"]), max(after, start)
+    return latest_rows(pd.concat(frames, ignore_index=True), manifest["mode"]), start
@@ -0,0 +1,147 @@
+# heavy_hitters.py [Top-K sources, destinations and ports in fixed memory (--topk)]
+# Space-Saving (Metwally et al. 2005), batched and mergeable: each summary keeps at most
+# `capacity` counters. Items new to the summary start at its floor (no dropped item can
+# have counted more), then the largest `capacity` counters are kept and the floor rises to
+# the smallest of them. A reported value v with error e means a true value in [v - e, v];
+# any item that is missing counted at most the floor, published as maxError.
+# Six summaries (source IP, destination IP, service port x bytes, packets) are fed from
+# process_packet. Packets are pre-aggregated per (src, dst, port) in one dict and flushed
+# every BATCH packets, so a packet costs a single dict update, not six heap operations.
+# snapshot() is what gets published next to the flow CSV (<output>.topk.json).
+
+import heapq, json, os, threading, time
+
+
+BATCH = 4096
+DIMENSIONS = ("sources", "destinations", "ports")
+METRICS = ("bytes", "packets")
+
+
+class SpaceSaving:
+    """At most capacity counters item -> [count, error], updated a batch at a time"""
+    __slots__ = ("capacity", "counts", "floor")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.floor = 0           # upper bound on the count of any item not in counts
+
+    #weights: item -> total weight in this batch
+    def update(self, weights):
+        counts, m = self.counts, self.floor
+        for item, w in weights.items():
+            c = counts.get(item)
+            if c is None:
+                counts[item] = [w + m, m]
+            else:
+                c[0] += w
+        self._truncate()
+
+    def merge(self, other):
+        counts, m, mo = self.counts, self.floor, other.floor
+        for item, c in counts.items():
+            if item not in other.counts:
+                c[0] += mo; c[1] += mo
+        for item, (cnt, err) in other.counts.items():
+            c = counts.get(item)
+            if c is None:
+                counts[item] = [cnt + m, err + m]
+            else:
+                c[0] += cnt; c[1] += err
+        self.floor = m + mo
+        self._truncate()
+
+    #Keep the capacity largest counters; whatever is dropped is at most the new minimum
+    def _truncate(self):
+        if len(self.counts) > self.capacity:
+            self.counts = dict(heapq.nlargest(self.capacity, self.counts.items(), key=lambda kv: kv[1][0]))
+            self.floor = max(self.floor, min(c[0] for c in self.counts.values()))
+
+    def top(self, k):
+        return heapq.nlargest(k, ((item, c[0], c[1]) for item, c in self.counts.items()), key=lambda t: t[1])
+
+
+class HeavyHitters:
+    """Top talkers by bytes and packets for sources, destinations and (service) ports"""
+
+    def __init__(self, k=10, capacity=None):
+        self.k = k
+        self.capacity = capacity or max(1000, 50 * k)
+        self.summaries = {(d, m): SpaceSaving(self.capacity) for d in DIMENSIONS for m in METRICS}
+        self.pending = {}                # (src, dst, port) -> [bytes, packets] since the last flush
+        self.n_pending = 0
+        self.total_bytes = 0
+        self.total_packets = 0
+        self.lock = threading.Lock()     # live runs publish from the periodic dump thread
+
+    #One packet; weight scales sampled traffic back up. The service port is the lower of the two.
+    def add(self, src, dst, sport, dport, length, weight=1):
+        sport, dport = sport or 0, dport or 0     # portless protocols count as port 0
+        port = sport if sport < dport else dport
+        key = (src, dst, port)
+        with self.lock:
+            c = self.pending.get(key)
+            if c is None:
+                self.pending[key] = [length * weight, weight]
+            else:
+                c[0] += length * weight; c[1] += weight
+            self.n_pending += 1
+            if self.n_pending >= BATCH:
+                self._flush()
+
+    def _flush(self):
+        for i, dim in enumerate(DIMENSIONS):
+            agg = {}
+            for key, (b, p) in self.pending.items():
+                c = agg.get(key[i])
+                if c is None: agg[key[i]] = [b, p]
+                else: c[0] += b; c[1] += p
+            self.summaries[(dim, "bytes")].update({item: c[0] for item, c in agg.items()})
+            self.summaries[(dim, "packets")].update({item: c[1] for item, c in agg.items()})
+            if i == 0:
+                self.total_bytes += sum(c[0] for c in agg.values())
+                self.total_packets += sum(c[1] for c in agg.values())
+        self.pending.clear()
+        self.n_pending = 0
+
+    def __getstate__(self):                # sent back from --jobs chunk workers
+        state = dict(self.__dict__)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    #Combine a summary built elsewhere (another chunk of the capture); error bounds add up
+    def merge(self, other):
+        with self.lock:
+            self._flush(); other._flush()
+            for key, s in self.summaries.items():
+                s.merge(other.summaries[key])
+            self.total_bytes += other.total_bytes
+            self.total_packets += other.total_packets
+
+    def snapshot(self, k=None):
+        k = k or self.k
+        with self.lock:
+            self._flush()
+            tops = {(dim, m): s.top(k) for (dim, m), s in self.summaries.items()}
+            floors = {m: max(self.summaries[(dim, m)].floor for dim in DIMENSIONS) for m in METRICS}
+        out = {"generated": time.time(), "k": k, "capacity": self.capacity,
+               "totalBytes": self.total_bytes, "totalPackets": self.total_packets, "maxError": floors}
+        for dim in DIMENSIONS:
+            out[dim] = {m: [{"key": item, "value": v, "error": e} for item, v, e in tops[(dim, m)]]
+                        for m in METRICS}
+        return out
+
+    #Atomically replace path with the current snapshot (readers never see a partial file)
+    def publish(self, path, k=None):
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.snapshot(k), fh)
+        os.replace(tmp, path)
+
+
+def topk_path(csv_path):
+    return csv_path + ".topk.json"
@@ -0,0 +1,247 @@
+# mmap_reader.py [Memory-mapped pcap/pcapng reader -> batched NumPy header arrays]
+# Walks record boundaries over an mmap of the capture (no per-packet reads or copies)
+# and decodes only the headers the flow builder needs. Memory stays constant no
+# matter how big the file is: pages are file-backed and each batch is fixed size.
+
+import mmap, struct
+import numpy as np
+import rawdecode
+
+
+# One row per TCP/UDP packet. Addresses are raw bytes (4 for IPv4, zero padded to 16).
+# caplen is the captured length (what the CSV has always used), wirelen the original one.
+PACKET_DTYPE = np.dtype([
+    ("ts", "f8"),
+    ("caplen", "u4"),
+    ("wirelen", "u4"),
+    ("ipver", "u1"),
+    ("src", "V16"),
+    ("dst", "V16"),
+    ("sport", "u2"),
+    ("dport", "u2"),
+    ("proto", "u1"),
+    ("flags", "u2"),    # TCP flags, 0 for UDP
+])
+
+DEFAULT_BATCH = 65536
+
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1_000_000),
+    b"\xa1\xb2\xc3\xd4": (">", 1_000_000),
+    b"\x4d\x3c\xb2\xa1": ("<", 1_000_000_000),
+    b"\xa1\xb2\x3c\x4d": (">", 1_000_000_000),
+}
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB, PCAPNG_PB, PCAPNG_SPB, PCAPNG_EPB = 1, 2, 3, 6
+
+
+class MmapPcapReader:
+    """Iterate a pcap or pcapng file as NumPy batches of PACKET_DTYPE rows.
+    start/end restrict it to a byte range that begins on a record boundary (see split_ranges)."""
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH, start=None, end=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.start = start
+        self.end = end
+        self.packets = 0        # records walked
+        self.skipped = 0        # records that were not TCP/UDP over IP
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self._mm, "madvise"):
+            self._mm.madvise(mmap.MADV_SEQUENTIAL)
+        self._mv = memoryview(self._mm)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._mv is not None:
+            self._mv.release(); self._mv = None
+            self._mm.close(); self._f.close()
+
+    def __iter__(self):
+        magic = bytes(self._mv[:4])
+        if magic in PCAP_MAGICS:
+            records = self._pcap_records(*PCAP_MAGICS[magic])
+        elif struct.unpack("<I", magic)[0] == PCAPNG_SHB:
+            records = self._pcapng_records()
+        else:
+            raise ValueError(f"{self.path}: not a pcap/pcapng file (magic {magic!r})")
+        yield from self._batches(records)
+
+    # ---------------- record walkers -> (data_view, ts, wirelen, linktype) ----------------
+    def _pcap_records(self, endian, div):
+        mv = self._mv
+        linktype = struct.unpack_from(endian + "I", mv, 20)[0]
+        rec = struct.Struct(endian + "IIII")
+        pos = max(24, self.start or 0)
+        end = min(len(mv), self.end or len(mv))
+        while pos + 16 <= end:
+            sec, frac, caplen, wirelen = rec.unpack_from(mv, pos)
+            pos += 16
+            if pos + caplen > end: break          # truncated tail
+            # int/int true division is correctly rounded, same as float(pkt.time)
+            yield mv[pos:pos + caplen], (sec * div + frac) / div, wirelen, linktype
+            pos += caplen
+
+    def _pcapng_records(self):
+        mv = self._mv
+        pos, end = 0, min(len(mv), self.end or len(mv))
+        endian = "<"
+        ifaces = []                                # (linktype, snaplen, tsresol)
+        ranged = self.start is not None or self.end is not None
+        if ranged:
+            # a range needs the interfaces from the file preamble, which must come before any packet
+            endian, ifaces, data_start = pcapng_preamble(mv)
+            pos = max(data_start, self.start or 0)
+        while pos + 12 <= end:
+            btype = struct.unpack_from(endian + "I", mv, pos)[0]
+            if ranged and (btype == PCAPNG_SHB or btype == PCAPNG_IDB):
+                raise ValueError(f"{self.path}: section/interface block after the first packet, "
+                                 "cannot be split into ranges")
+            if btype == PCAPNG_SHB:
+                bom = bytes(mv[pos + 8:pos + 12])
+                endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+                ifaces = []
+            blen = struct.unpack_from(endian + "I", mv, pos + 4)[0]
+            if blen < 12 or pos + blen > end: break
+            if btype == PCAPNG_IDB:
+                linktype, _, snaplen = struct.unpack_from(endian + "HHI", mv, pos + 8)
+                ifaces.append((linktype, snaplen, self.idb_tsresol(mv, pos + 16, pos + blen - 4, endian)))
+            elif btype == PCAPNG_EPB or btype == PCAPNG_PB:
+                if btype == PCAPNG_EPB:
+                    intid, tshigh, tslow, caplen, wirelen = struct.unpack_from(endian + "IIIII", mv, pos + 8)
+                else:
+                    intid, _, tshigh, tslow, caplen, wirelen = struct.unpack_from(endian + "HHIIII", mv, pos + 8)
+                if intid < len(ifaces):
+                    linktype, _, tsresol = ifaces[intid]
+                    yield (mv[pos + 28:pos + 28 + caplen], ((tshigh << 32) | tslow) / tsresol,
+                           wirelen, linktype)
+            elif btype == PCAPNG_SPB and ifaces:
+                linktype, snaplen, _ = ifaces[0]
+                wirelen = struct.unpack_from(endian + "I", mv, pos + 8)[0]
+                caplen = min(wirelen, blen - 16, snaplen or wirelen)
+                # simple packets carry no timestamp
+                yield mv[pos + 12:pos + 12 + caplen], 0.0, wirelen, linktype
+            pos += blen
+
+    @staticmethod
+    def idb_tsresol(mv, pos, end, endian):
+        while pos + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", mv, pos)
+            if code == 0: break
+            if code == 9 and length >= 1:          # if_tsresol
+                v = mv[pos + 4]
+                return (2 if v & 0x80 else 10) ** (v & 0x7F)
+            pos += 4 + ((length + 3) & ~3)
+        return 1_000_000
+
+    # ---------------- batching ----------------
+    def _batches(self, records):
+        decode = rawdecode.decode_headers
+        rows = []
+        for data, ts, wirelen, linktype in records:
+            self.packets += 1
+            h = decode(data, linktype)
+            caplen = len(data)
+            data.release()
+            if h is None:
+                self.skipped += 1
+                continue
+            ver, src, dst, proto, sport, dport, flags = h
+            rows.append((ts, caplen, wirelen, ver, src, dst, sport, dport, proto, flags or 0))
+            if len(rows) >= self.batch_size:
+                yield np.array(rows, dtype=PACKET_DTYPE)
+                rows = []
+        if rows:
+            yield np.array(rows, dtype=PACKET_DTYPE)
+
+
+class StreamPcapReader(MmapPcapReader):
+    """Same batches from a source that cannot be mapped: stdin or a gzip/zstd compressed
+    capture (see rawdecode.open_capture). Records are read front to back."""
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH):
+        self.path = path
+        self.batch_size = batch_size
+        self.packets = 0
+        self.skipped = 0
+
+    def close(self):
+        pass
+
+    def __iter__(self):
+        records = ((memoryview(data), ts, wirelen, linktype)
+                   for data, ts, wirelen, linktype in rawdecode.iter_capture_records(self.path))
+        yield from self._batches(records)
+
+
+#Convenience wrapper: for batch in iter_batches(path): ...  (streams fall back to StreamPcapReader)
+def iter_batches(path, batch_size=DEFAULT_BATCH, start=None, end=None):
+    if start is None and end is None and rawdecode.is_stream(path):
+        reader = StreamPcapReader(path, batch_size)
+    else:
+        reader = MmapPcapReader(path, batch_size, start, end)
+    with reader:
+        yield from reader
+
+
+# ---------------- splitting a capture into record-aligned byte ranges ----------------
+#Walk the pcapng SHB + IDBs up to the first packet block -> (endian, ifaces, offset)
+def pcapng_preamble(mv):
+    bom = bytes(mv[8:12])
+    endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+    ifaces, pos = [], 0
+    while pos + 12 <= len(mv):
+        btype, blen = struct.unpack_from(endian + "II", mv, pos)
+        if btype in (PCAPNG_EPB, PCAPNG_PB, PCAPNG_SPB) or blen < 12:
+            break
+        if btype == PCAPNG_IDB:
+            linktype, _, snaplen = struct.unpack_from(endian + "HHI", mv, pos + 8)
+            ifaces.append((linktype, snaplen, MmapPcapReader.idb_tsresol(mv, pos + 16, pos + blen - 4, endian)))
+        pos += blen
+    return endian, ifaces, pos
+
+
+#Split a capture into up to n byte ranges that each start on a record boundary: one pass
+#over the record headers (lengths only, no packet bytes touched) finds the first boundary
+#at or after each even cut. Guessing boundaries from plausible-looking headers instead can
+#land inside a packet whose payload happens to look like records.
+def split_ranges(path, n):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mv = memoryview(mm)
+        try:
+            magic = bytes(mv[:4])
+            if magic in PCAP_MAGICS:
+                endian = PCAP_MAGICS[magic][0]
+                data_start, head = 24, 16
+                length = lambda pos: 16 + struct.unpack_from(endian + "I", mv, pos + 8)[0]
+            elif struct.unpack("<I", magic)[0] == PCAPNG_SHB:
+                endian, _, data_start = pcapng_preamble(mv)
+                head = 12
+
+                def length(pos):
+                    btype, blen = struct.unpack_from(endian + "II", mv, pos)
+                    if btype == PCAPNG_SHB or btype == PCAPNG_IDB:
+                        raise ValueError(f"{path}: section/interface block after the first packet, "
+                                         "cannot be split into ranges")
+                    return max(blen, 12)
+            else:
+                raise ValueError(f"{path}: not a pcap/pcapng file (magic {magic!r})")
+            size = len(mv) - data_start
+            targets = [data_start + size * i // n for i in range(1, n)]
+            cuts, pos = [data_start], data_start
+            while targets and pos + head <= len(mv):
+                if pos >= targets[0]:
+                    cuts.append(pos)
+                    while targets and targets[0] <= pos:
+                        targets.pop(0)
+                pos += length(pos)
+            cuts.append(len(mv))
+            return list(zip(cuts[:-1], cuts[1:]))
+        finally:
+            mv.release()
@@ -0,0 +1,1209 @@
+# pcap2csv_win.py [Convert PCAP to CSV]
+# Minimal CIC-style flow features from a PCAP (Windows-friendly, no tcpdump)
+# Requires: scapy (you already have it)
+
+import argparse, csv, glob, heapq, itertools, math, time, threading, signal, sys, os
+#Flow modules shared by the client, the dashboard worker and the legacy scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "flowlib"))
+from scapy.all import PcapReader, IP, IPv6, TCP, UDP, sniff
+import multiprocessing as mp
+import rawdecode
+import mmap_reader
+import flow_columnar
+import flow_features
+import afpacket
+import flow_shards
+import flow_accum
+import flow_table
+import quantile_sketch
+import flow_sampling
+import prefilter
+import heavy_hitters
+import flow_segments
+import flow_arrow
+import flow_ring
+
+
+BASE_DIR = os.path.dirname(__file__)
+DATA_DIR = os.path.abspath(os.path.join(BASE_DIR, "..", "data"))  # <-- Add this
+
+flows = {}
+running = True
+written_ids = set()
+addr_names = {}   # raw address bytes -> printable IP, for the batch readers
+shard_pool = None # flow_shards.ShardPool when --workers > 1 (parent process only)
+packet_seq = itertools.count()  # arrival order, lets the merge keep single-process FlowIDs
+top_talkers = None      # heavy_hitters.HeavyHitters with --topk (parent process; --jobs chunks build their own)
+topk_file = None        # where top_talkers is published, <output>.topk.json
+FLOW_STATE = "lists"    # per-flow state: "lists" keeps every packet (flow_table), "stream" O(1) accumulators (flow_accum)
+OUTPUT_FORMAT = "csv"   # --format: "csv", or typed "parquet" / "arrow" files (flow_arrow)
+arrow_writers = {}      # incremental Parquet/Arrow output: file name -> open flow_arrow.FlowWriter
+
+
+
+#Statistical Helper Functions(To prevent mathematical errors); the flow features themselves
+#are defined once in flow_features.py
+def safe_div(a, b): 
+    return a / b if b != 0 else 0.0 #To check if safe division
+
+
+#Packet Length Extraction
+def pkt_len(pkt):
+    try:
+        return len(bytes(pkt))
+    except Exception:
+        return 0
+
+#IP Protocol Detection
+def get_ip_layer(pkt):
+    if IP in pkt:
+        return pkt[IP], 'IPv4'
+    if IPv6 in pkt:
+        return pkt[IPv6], 'IPv6'
+    return None, None
+
+#Transport Layer Analysis->Identifies TCP/UDP Protocols,src/dst ports
+def get_l4_info(pkt):
+    if TCP in pkt: l4=pkt[TCP]; return 'TCP', int(l4.sport), int(l4.dport), l4.flags
+    if UDP in pkt: l4=pkt[UDP]; return 'UDP', int(l4.sport), int(l4.dport), None
+    return None,None,None,None
+
+
+#Bidirectional Flow Key Generation
+def make_bi_key(proto, a_ip, a_port, b_ip, b_port):
+    # direction-agnostic 5-tuple key (so fwd/bwd live in one flow), packed into one bytes object
+    return flow_table.pack_key(proto, a_ip, a_port, b_ip, b_port)
+    
+
+# ---------------- Flow expiry (--idle-timeout / --active-timeout / --tcp-close) ----------------
+IDLE_TIMEOUT = 0.0      # finish a flow after this many seconds without packets (0 = never)
+ACTIVE_TIMEOUT = 0.0    # finish a flow once it has lasted this long; later packets start a new one (0 = never)
+TCP_CLOSE = False       # finish TCP flows on RST, or once FIN was seen in both directions
+EXPIRY = False          # any of the above: flows are finalized once, written incrementally, then dropped
+SWEEP_INTERVAL = 1.0    # seconds of capture time between timeout sweeps
+finished = []           # finalized flows waiting to be written, in finish order
+finished_lock = threading.Lock()
+flow_ids = itertools.count(1)   # FlowIDs keep counting across incremental writes
+next_sweep = 0.0
+emit_file = None        # offline runs: sweeps append finished rows to this file right away
+live_output = None      # live runs: -o, where Ctrl+C writes the flows still open
+live_sink = None        # live runs with --segments: flow_segments.SegmentWriter under <output>.segments/,
+                        # with --ring wrapped in a flow_ring.RingWriter that also publishes the rows
+                        # in shared memory (append(rows), close())
+# Expiry index: min-heap of (deadline, n, key, flow). A flow is pushed once when it opens;
+# packets only move its real deadline later, so an entry that surfaces early is re-pushed
+# with the current deadline and entries of flows that already ended are dropped. A sweep
+# therefore touches the expired flows (plus the few long-lived ones whose deadline moved)
+# instead of the whole table.
+expiry_heap = []
+expiry_lock = threading.Lock()   # capture thread and the live wall-clock sweep share the heap
+heap_seq = itertools.count()
+
+def configure_expiry(idle, active, tcp_close):
+    global IDLE_TIMEOUT, ACTIVE_TIMEOUT, TCP_CLOSE, EXPIRY
+    IDLE_TIMEOUT, ACTIVE_TIMEOUT, TCP_CLOSE = idle or 0.0, active or 0.0, bool(tcp_close)
+    EXPIRY = bool(IDLE_TIMEOUT or ACTIVE_TIMEOUT or TCP_CLOSE)
+
+#Flow-building settings, handed to shard/batch worker processes (spawn does not inherit globals)
+def run_options():
+    return {"expiry": (IDLE_TIMEOUT, ACTIVE_TIMEOUT, TCP_CLOSE), "flow_state": FLOW_STATE,
+            "quantiles": (quantile_sketch.MODE, quantile_sketch.EXACT_LIMIT, quantile_sketch.KLL_K),
+            "sampling": flow_sampling.options(), "prefilter": prefilter.options(), "incremental": INCREMENTAL,
+            "features": FEATURE_SPEC, "format": OUTPUT_FORMAT}
+
+def apply_run_options(opts):
+    global FLOW_STATE, INCREMENTAL, OUTPUT_FORMAT
+    configure_expiry(*opts["expiry"])
+    FLOW_STATE = opts["flow_state"]
+    INCREMENTAL = opts["incremental"]
+    quantile_sketch.configure(*opts["quantiles"])
+    flow_sampling.configure(*opts["sampling"])
+    prefilter.configure(*opts["prefilter"])
+    set_features(opts["features"])
+    OUTPUT_FORMAT = opts["format"]
+
+def flow_deadline(f):
+    deadline = math.inf
+    if IDLE_TIMEOUT: deadline = f["end"] + IDLE_TIMEOUT
+    if ACTIVE_TIMEOUT: deadline = min(deadline, f["start"] + ACTIVE_TIMEOUT)
+    return deadline
+
+def expired(f, now):
+    return flow_deadline(f) < now
+
+def schedule_expiry(key, f):
+    if IDLE_TIMEOUT or ACTIVE_TIMEOUT:
+        with expiry_lock:
+            heapq.heappush(expiry_heap, (flow_deadline(f), next(heap_seq), key, f))
+
+def finish_flow(key):
+    f = flows.pop(key, None)
+    if f is not None:
+        with finished_lock:
+            finished.append(f)
+
+def finish_all():
+    for key in list(flows):
+        finish_flow(key)
+    with expiry_lock:
+        expiry_heap.clear()
+
+#Finish every flow that has timed out by `now`, in deadline order
+def sweep_flows(now):
+    with expiry_lock:
+        while expiry_heap and expiry_heap[0][0] < now:
+            _, _, key, f = heapq.heappop(expiry_heap)
+            if flows.get(key) is not f:
+                continue                 # already finished (FIN/RST, or restarted after a timeout)
+            deadline = flow_deadline(f)
+            if deadline < now:
+                finish_flow(key)
+            else:
+                heapq.heappush(expiry_heap, (deadline, next(heap_seq), key, f))
+
+def take_finished():
+    global finished
+    with finished_lock:
+        done, finished = finished, []
+    return done
+
+#Per-packet expiry work: TCP teardown, plus a timeout sweep every SWEEP_INTERVAL of capture time
+def expire_on_packet(key, f, src, sport, ts, flags):
+    global next_sweep
+    if TCP_CLOSE and flags is not None:
+        if flags & 0x04:
+            finish_flow(key)
+        elif flags & 0x01:
+            f["fin"] = f.get("fin", 0) | (1 if src == f["src"] and sport == f["sport"] else 2)
+            if f["fin"] == 3: finish_flow(key)
+    if ts >= next_sweep:
+        next_sweep = ts + SWEEP_INTERVAL
+        sweep_flows(ts)
+        if emit_file is not None:
+            emit_finished(emit_file)
+
+
+# ---------------- Packet Processing ----------------
+def process_packet(src, dst, sport, dport, proto, ts, length, flags):
+    if prefilter.ENABLED and not prefilter.accept(src, dst, sport, dport):
+        return None
+    if flow_sampling.ENABLED and not flow_sampling.keep_packet():
+        return None
+    key = make_bi_key(proto, src, sport, dst, dport)
+    if flow_sampling.ENABLED and not flow_sampling.keep_flow(key):
+        return None
+    if top_talkers is not None:
+        top_talkers.add(src, dst, sport, dport, length, flow_sampling.FLOW_N * flow_sampling.PACKET_N)
+    if shard_pool is not None:   # the worker owning this key builds the flow
+        shard_pool.submit(key, (src, dst, sport, dport, proto, ts, length, flags, next(packet_seq)))
+        return None
+    return update_flow(key, src, dst, sport, dport, proto, ts, length, flags)
+
+#Add one (already sampled) packet to its flow
+def update_flow(key, src, dst, sport, dport, proto, ts, length, flags):
+    f = flows.get(key)
+    if f is not None and EXPIRY and expired(f, ts):
+        finish_flow(key)         # timed out: this packet opens a new flow
+        f = None
+    if f is None:
+        state = flow_accum.FlowAccumulator if FLOW_STATE == "stream" else flow_table.FlowRecord
+        f = flows[key] = state(src, dst, sport, dport, proto, ts, length, flags)
+        if EXPIRY: schedule_expiry(key, f)
+    else:
+        f.add(ts, length, flags, src == f.src and dst == f.dst and sport == f.sport and dport == f.dport)
+    if INCREMENTAL:
+        dirty.add(key)           # after the update: a snapshot taking the set has to see this packet
+    if EXPIRY:
+        expire_on_packet(key, f, src, sport, ts, flags)
+    return f
+
+
+#Shard worker (--workers N): owns the flows whose key hashes to it. Each flow keeps the
+#parent's sequence number of its first packet ("seq"), so merged rows come out in the
+#same FlowID order as a single-process run.
+def shard_worker(shard, inq, outq, opts=None):
+    if opts is not None:
+        apply_run_options(opts)
+
+    def on_items(items):
+        for src, dst, sport, dport, proto, ts, length, flags, n in items:
+            f = update_flow(make_bi_key(proto, src, sport, dst, dport), src, dst, sport, dport, proto, ts, length, flags)
+            if "seq" not in f: f["seq"] = n
+
+    def on_command(cmd):
+        if cmd == "rows":
+            fls = list(flows.values())
+            return sorted(zip((fl["seq"] for fl in fls), flow_rows(fls, 0)), key=lambda sr: sr[0])
+        if cmd == "changed_rows":
+            return sorted((flows[key]["seq"], row) for key, row in refresh_rows())
+        if cmd[0] == "expire":       # ("expire", now, final)
+            _, now, final = cmd
+            if final: finish_all()
+            elif now is not None: sweep_flows(now)
+            fls = take_finished()
+            return sorted(zip((fl["seq"] for fl in fls), flow_rows(fls, 0)), key=lambda sr: sr[0])
+        return None
+
+    flow_shards.serve(shard, inq, outq, on_items, on_command)
+
+
+# ---------------- Live Capture Handlers ----------------
+def handle_packet(pkt):
+    ip, _ = get_ip_layer(pkt)
+    if ip is None: return
+    proto, sport, dport, flags = get_l4_info(pkt)
+    if proto is None: return
+    process_packet(ip.src, ip.dst, sport, dport, proto, float(pkt.time), pkt_len(pkt), flags)
+
+#Header-only path (--decoder raw): length comes from the capture record, no Scapy dissection
+def handle_raw(data, ts, linktype):
+    hdr = rawdecode.decode_packet(data, linktype)
+    if hdr is None: return
+    src, dst, sport, dport, proto, flags = hdr
+    process_packet(src, dst, sport, dport, proto, ts, len(data), flags)
+
+#Ring-buffer path (--capture afpacket): one decoded batch per kernel block
+def process_packets(batch):
+    for src, dst, sport, dport, proto, ts, length, flags in batch:
+        process_packet(src, dst, sport, dport, proto, ts, length, flags)
+
+def report_prefilter():
+    if prefilter.ENABLED:
+        print(f"[*] Pre-filter dropped {prefilter.dropped} packets before the flow lookup")
+
+def report_ring_stats(packets, drops, freezes):
+    print(f"[*] AF_PACKET ring: {packets} packets seen by kernel, {drops} dropped, {freezes} queue freezes")
+
+def addr_name(ver, raw):
+    name = addr_names.get(raw)
+    if name is None:
+        name = addr_names[raw] = rawdecode.ip_to_str(ver, raw[:4] if ver == 4 else raw)
+    return name
+
+#Batch path (--decoder mmap): one structured array of headers per call
+def process_batch(batch):
+    for ts, length, ver, src, dst, sport, dport, proto, flags in zip(
+            batch["ts"].tolist(), batch["caplen"].tolist(), batch["ipver"].tolist(),
+            batch["src"].tolist(), batch["dst"].tolist(), batch["sport"].tolist(),
+            batch["dport"].tolist(), batch["proto"].tolist(), batch["flags"].tolist()):
+        process_packet(addr_name(ver, src), addr_name(ver, dst), sport, dport,
+                       rawdecode.PROTO_NAMES[proto], ts, length,
+                       flags if proto == rawdecode.IPPROTO_TCP else None)
+
+# def dump_flows_to_csv(filename):
+#     # Ensure output is in DATA_DIR
+#     if not os.path.isabs(filename):
+#         filename = os.path.join(DATA_DIR, filename)
+
+#     headers=[  
+#         "FlowID","SrcIP","DstIP","SrcPort","DstPort","Protocol",
+#         "FlowDuration",
+#         "TotFwdPkts","TotBwdPkts","TotLenFwd","TotLenBwd",
+#         "FwdPktLenMean","FwdPktLenStd","FwdPktLenMin","FwdPktLenMax",
+#         "BwdPktLenMean","BwdPktLenStd","BwdPktLenMin","BwdPktLenMax",
+#         "FlowIATMean","FlowIATStd","FlowIATMin","FlowIATMax",
+#         "FwdIATMean","FwdIATStd","FwdIATMin","FwdIATMax",
+#         "BwdIATMean","BwdIATStd","BwdIATMin","BwdIATMax",
+#         "TotalFwdIAT","TotalBwdIAT",
+#         "TotalBytes","TotalPackets",
+#         "BytesPerSec","PktsPerSec","FwdBwdPktRatio","FwdBwdByteRatio",
+#         "FwdPktLenPct25","FwdPktLenPct50","FwdPktLenPct75","FwdPktLenPct90",
+#         "BwdPktLenPct25","BwdPktLenPct50","BwdPktLenPct75","BwdPktLenPct90",
+#         "FlowIAT25","FlowIAT50","FlowIAT75","FlowIAT90",
+#         "FwdIAT25","FwdIAT50","FwdIAT75","FwdIAT90",
+#         "BwdIAT25","BwdIAT50","BwdIAT75","BwdIAT90",
+#         "Fwd_SYN","Fwd_FIN","Fwd_RST","Fwd_PSH","Fwd_ACK","Fwd_URG",
+#         "Bwd_SYN","Bwd_FIN","Bwd_RST","Bwd_PSH","Bwd_ACK","Bwd_URG",
+#         "MinActive","MeanActive","MaxActive","StdActive",
+#         "MinIdle","MeanIdle","MaxIdle","StdIdle",
+#         "SrcPortCat","DstPortCat"
+#     ]
+#     with open(filename,"w",newline="",encoding="utf-8") as fcsv:
+#         w=csv.DictWriter(fcsv,fieldnames=headers); w.writeheader()
+#         for idx,(key,fl) in enumerate(flows.items(),start=1):
+#             dur=max(0.0,fl["end"]-fl["start"])
+#             all_times=sorted(fl["fwd_times"]+fl["bwd_times"])
+#             flow_iat=iat_stats(all_times)
+#             fwd_iat=iat_stats(fl["fwd_times"])
+#             bwd_iat=iat_stats(fl["bwd_times"])
+#             fwd_len_p=[pctile(fl["fwd_lens"],q) for q in (25,50,75,90)]
+#             bwd_len_p=[pctile(fl["bwd_lens"],q) for q in (25,50,75,90)]
+#             flow_iat_p=iat_all(all_times)
+#             fwd_iat_p=iat_all(fl["fwd_times"])
+#             bwd_iat_p=iat_all(fl["bwd_times"])
+#             total_bytes=sum(fl["fwd_lens"])+sum(fl["bwd_lens"])
+#             total_pkts=len(fl["fwd_lens"])+len(fl["bwd_lens"])
+#             bytes_per_sec=safe_div(total_bytes,dur)
+#             pkts_per_sec=safe_div(total_pkts,dur)
+#             pkt_ratio=safe_div(len(fl["fwd_lens"]),len(fl["bwd_lens"]))
+#             byte_ratio=safe_div(sum(fl["fwd_lens"]),sum(fl["bwd_lens"]))
+#             total_fiat=total_iat(fl["fwd_times"])
+#             total_biat=total_iat(fl["bwd_times"])
+#             act_idle=active_idle_stats(all_times)
+#             def count_flags(flags_list,mask): return sum(1 for f in flags_list if f & mask)
+#             fwd_syn=count_flags(fl["fwd_flags"],0x02)
+#             fwd_fin=count_flags(fl["fwd_flags"],0x01)
+#             fwd_rst=count_flags(fl["fwd_flags"],0x04)
+#             fwd_psh=count_flags(fl["fwd_flags"],0x08)
+#             fwd_ack=count_flags(fl["fwd_flags"],0x10)
+#             fwd_urg=count_flags(fl["fwd_flags"],0x20)
+#             bwd_syn=count_flags(fl["bwd_flags"],0x02)
+#             bwd_fin=count_flags(fl["bwd_flags"],0x01)
+#             bwd_rst=count_flags(fl["bwd_flags"],0x04)
+#             bwd_psh=count_flags(fl["bwd_flags"],0x08)
+#             bwd_ack=count_flags(fl["bwd_flags"],0x10)
+#             bwd_urg=count_flags(fl["bwd_flags"],0x20)
+#             def port_cat(p):
+#                 if p in (80,443): return "Web"
+#                 if p in (1935,554,8554): return "Multimedia"
+#                 if p in (5222,5228,443): return "Social"
+#                 if p<1024: return "System"
+#                 return "Other"
+#             row={
+#                 "FlowID":idx,
+#                 "SrcIP":fl["src"],"DstIP":fl["dst"],
+#                 "SrcPort":fl["sport"],"DstPort":fl["dport"],"Protocol":fl["proto"],
+#                 "FlowDuration":dur,
+#                 "TotFwdPkts":len(fl["fwd_lens"]), "TotBwdPkts":len(fl["bwd_lens"]),
+#                 "TotLenFwd":sum(fl["fwd_lens"]), "TotLenBwd":sum(fl["bwd_lens"]),
+#                 "FwdPktLenMean":safe_mean(fl["fwd_lens"]), "FwdPktLenStd":safe_std(fl["fwd_lens"]),
+#                 "FwdPktLenMin":min(fl["fwd_lens"],default=0), "FwdPktLenMax":max(fl["fwd_lens"],default=0),
+#                 "BwdPktLenMean":safe_mean(fl["bwd_lens"]), "BwdPktLenStd":safe_std(fl["bwd_lens"]),
+#                 "BwdPktLenMin":min(fl["bwd_lens"],default=0), "BwdPktLenMax":max(fl["bwd_lens"],default=0),
+#                 "FlowIATMean":flow_iat[0],"FlowIATStd":flow_iat[1],
+#                 "FlowIATMin":flow_iat[2],"FlowIATMax":flow_iat[3],
+#                 "FwdIATMean":fwd_iat[0],"FwdIATStd":fwd_iat[1],
+#                 "FwdIATMin":fwd_iat[2],"FwdIATMax":fwd_iat[3],
+#                 "BwdIATMean":bwd_iat[0],"BwdIATStd":bwd_iat[1],
+#                 "BwdIATMin":bwd_iat[2],"BwdIATMax":bwd_iat[3],
+#                 "TotalFwdIAT":total_fiat,"TotalBwdIAT":total_biat,
+#                 "TotalBytes":total_bytes,"TotalPackets":total_pkts,
+#                 "BytesPerSec":bytes_per_sec,"PktsPerSec":pkts_per_sec,
+#                 "FwdBwdPktRatio":pkt_ratio,"FwdBwdByteRatio":byte_ratio,
+#                 "FwdPktLenPct25":fwd_len_p[0],"FwdPktLenPct50":fwd_len_p[1],
+#                 "FwdPktLenPct75":fwd_len_p[2],"FwdPktLenPct90":fwd_len_p[3],
+#                 "BwdPktLenPct25":bwd_len_p[0],"BwdPktLenPct50":bwd_len_p[1],
+#                 "BwdPktLenPct75":bwd_len_p[2],"BwdPktLenPct90":bwd_len_p[3],
+#                 "FlowIAT25":flow_iat_p[4],"FlowIAT50":flow_iat_p[5],
+#                 "FlowIAT75":flow_iat_p[6],"FlowIAT90":flow_iat_p[7],
+#                 "FwdIAT25":fwd_iat_p[4],"FwdIAT50":fwd_iat_p[5],
+#                 "FwdIAT75":fwd_iat_p[6],"FwdIAT90":fwd_iat_p[7],
+#                 "BwdIAT25":bwd_iat_p[4],"BwdIAT50":bwd_iat_p[5],
+#                 "BwdIAT75":bwd_iat_p[6],"BwdIAT90":bwd_iat_p[7],
+#                 "Fwd_SYN":fwd_syn,"Fwd_FIN":fwd_fin,"Fwd_RST":fwd_rst,
+#                 "Fwd_PSH":fwd_psh,"Fwd_ACK":fwd_ack,"Fwd_URG":fwd_urg,
+#                 "Bwd_SYN":bwd_syn,"Bwd_FIN":bwd_fin,"Bwd_RST":bwd_rst,
+#                 "Bwd_PSH":bwd_psh,"Bwd_ACK":bwd_ack,"Bwd_URG":bwd_urg,
+#                 "MinActive":act_idle[0],"MeanActive":act_idle[1],
+#                 "MaxActive":act_idle[2],"StdActive":act_idle[3],
+#                 "MinIdle":act_idle[4],"MeanIdle":act_idle[5],
+#                 "MaxIdle":act_idle[6],"StdIdle":act_idle[7],
+#                 "SrcPortCat":port_cat(fl["sport"]), "DstPortCat":port_cat(fl["dport"])
+#             }
+#             w.writerow(row)
+#     print(f"[+] Updated {filename} with {len(flows)} flows")
+
+
+CSV_HEADERS = [
+    "FlowID","SrcIP","DstIP","SrcPort","DstPort","Protocol",
+    "FlowDuration",
+    "TotFwdPkts","TotBwdPkts","TotLenFwd","TotLenBwd",
+    "FwdPktLenMean","FwdPktLenStd","FwdPktLenMin","FwdPktLenMax",
+    "BwdPktLenMean","BwdPktLenStd","BwdPktLenMin","BwdPktLenMax",
+    "FlowIATMean","FlowIATStd","FlowIATMin","FlowIATMax",
+    "FwdIATMean","FwdIATStd","FwdIATMin","FwdIATMax",
+    "BwdIATMean","BwdIATStd","BwdIATMin","BwdIATMax",
+    "TotalFwdIAT","TotalBwdIAT",
+    "TotalBytes","TotalPackets",
+    "BytesPerSec","PktsPerSec","FwdBwdPktRatio","FwdBwdByteRatio",
+    "FwdPktLenPct25","FwdPktLenPct50","FwdPktLenPct75","FwdPktLenPct90",
+    "BwdPktLenPct25","BwdPktLenPct50","BwdPktLenPct75","BwdPktLenPct90",
+    "FlowIAT25","FlowIAT50","FlowIAT75","FlowIAT90",
+    "FwdIAT25","FwdIAT50","FwdIAT75","FwdIAT90",
+    "BwdIAT25","BwdIAT50","BwdIAT75","BwdIAT90",
+    "Fwd_SYN","Fwd_FIN","Fwd_RST","Fwd_PSH","Fwd_ACK","Fwd_URG",
+    "Bwd_SYN","Bwd_FIN","Bwd_RST","Bwd_PSH","Bwd_ACK","Bwd_URG",
+    "MinActive","MeanActive","MaxActive","StdActive",
+    "MinIdle","MeanIdle","MaxIdle","StdIdle",
+    "SrcPortCat","DstPortCat",
+    "FlowSamplingRate","PktSamplingRate"
+]
+
+
+port_cat = flow_features.port_cat
+ID_HEADERS = CSV_HEADERS[:6]
+RATE_HEADERS = CSV_HEADERS[-2:]
+FEATURE_SPEC = "csv"                               # --features
+FEATURE_COLUMNS = flow_features.resolve("csv")     # statistical columns computed and written
+OUT_HEADERS = CSV_HEADERS                          # columns of the output CSV
+
+#Select the feature columns (--features model|csv|list); identity and sampling-rate columns stay
+def set_features(spec):
+    global FEATURE_SPEC, FEATURE_COLUMNS, OUT_HEADERS
+    FEATURE_SPEC = spec
+    FEATURE_COLUMNS = flow_features.resolve(spec)
+    wanted = set(FEATURE_COLUMNS)
+    OUT_HEADERS = ID_HEADERS + [h for h in CSV_HEADERS if h in wanted] + RATE_HEADERS
+
+
+#Feature row for one flow record (column order as CSV_HEADERS)
+def flow_row(idx, fl):
+    if isinstance(fl, flow_accum.FlowAccumulator):
+        return accum_row(idx, fl)
+    return flow_rows([fl], idx)[0]
+
+
+#Same row from the O(1) accumulators (--flow-state stream); typing follows the list version
+#(bare 0 for statistics over fewer than two packets)
+def accum_row(idx, a):
+    def iat(st):
+        return (st.avg(), st.std(), st.min, st.max) if st.n else (0, 0, 0, 0)
+    def pcts(st, q):
+        return quantile_sketch.percentiles(q) if st.n else [0, 0, 0, 0]
+    def period(st):
+        return (st.min, st.avg(), st.max, st.std()) if st.n else (0, 0, 0, 0)
+
+    dur = max(0.0, a.end - a.start)
+    n_fwd, n_bwd = a.fwd_len.n, a.bwd_len.n
+    len_fwd, len_bwd = a.fwd_len.total, a.bwd_len.total
+    flow_iat, fwd_iat, bwd_iat = iat(a.flow_iat), iat(a.fwd_iat), iat(a.bwd_iat)
+    flow_iat_p, fwd_iat_p, bwd_iat_p = pcts(a.flow_iat, a.q_flow_iat), pcts(a.fwd_iat, a.q_fwd_iat), pcts(a.bwd_iat, a.q_bwd_iat)
+    fwd_len_p, bwd_len_p = quantile_sketch.percentiles(a.q_fwd_len), quantile_sketch.percentiles(a.q_bwd_len)
+    act_idle = period(a.active_stats()) + period(a.idle) if a.flow_iat.n else (0,) * 8
+    fwd_flags, bwd_flags = a.fwd_flags, a.bwd_flags
+    return flow_sampling.scale_row({
+        "FlowID": idx,
+        "SrcIP": a.src, "DstIP": a.dst,
+        "SrcPort": a.sport, "DstPort": a.dport, "Protocol": a.proto,
+        "FlowDuration": dur,
+        "TotFwdPkts": n_fwd, "TotBwdPkts": n_bwd,
+        "TotLenFwd": len_fwd, "TotLenBwd": len_bwd,
+        "FwdPktLenMean": a.fwd_len.avg(), "FwdPktLenStd": a.fwd_len.std(),
+        "FwdPktLenMin": a.fwd_len.min if n_fwd else 0, "FwdPktLenMax": a.fwd_len.max if n_fwd else 0,
+        "BwdPktLenMean": a.bwd_len.avg(), "BwdPktLenStd": a.bwd_len.std(),
+        "BwdPktLenMin": a.bwd_len.min if n_bwd else 0, "BwdPktLenMax": a.bwd_len.max if n_bwd else 0,
+        "FlowIATMean": flow_iat[0], "FlowIATStd": flow_iat[1],
+        "FlowIATMin": flow_iat[2], "FlowIATMax": flow_iat[3],
+        "FwdIATMean": fwd_iat[0], "FwdIATStd": fwd_iat[1],
+        "FwdIATMin": fwd_iat[2], "FwdIATMax": fwd_iat[3],
+        "BwdIATMean": bwd_iat[0], "BwdIATStd": bwd_iat[1],
+        "BwdIATMin": bwd_iat[2], "BwdIATMax": bwd_iat[3],
+        "TotalFwdIAT": a.fwd_iat.total if a.fwd_iat.n else 0.0,
+        "TotalBwdIAT": a.bwd_iat.total if a.bwd_iat.n else 0.0,
+        "TotalBytes": len_fwd + len_bwd, "TotalPackets": n_fwd + n_bwd,
+        "BytesPerSec": safe_div(len_fwd + len_bwd, dur), "PktsPerSec": safe_div(n_fwd + n_bwd, dur),
+        "FwdBwdPktRatio": safe_div(n_fwd, n_bwd), "FwdBwdByteRatio": safe_div(len_fwd, len_bwd),
+        "FwdPktLenPct25": fwd_len_p[0], "FwdPktLenPct50": fwd_len_p[1],
+        "FwdPktLenPct75": fwd_len_p[2], "FwdPktLenPct90": fwd_len_p[3],
+        "BwdPktLenPct25": bwd_len_p[0], "BwdPktLenPct50": bwd_len_p[1],
+        "BwdPktLenPct75": bwd_len_p[2], "BwdPktLenPct90": bwd_len_p[3],
+        "FlowIAT25": flow_iat_p[0], "FlowIAT50": flow_iat_p[1],
+        "FlowIAT75": flow_iat_p[2], "FlowIAT90": flow_iat_p[3],
+        "FwdIAT25": fwd_iat_p[0], "FwdIAT50": fwd_iat_p[1],
+        "FwdIAT75": fwd_iat_p[2], "FwdIAT90": fwd_iat_p[3],
+        "BwdIAT25": bwd_iat_p[0], "BwdIAT50": bwd_iat_p[1],
+        "BwdIAT75": bwd_iat_p[2], "BwdIAT90": bwd_iat_p[3],
+        "Fwd_SYN": fwd_flags[0], "Fwd_FIN": fwd_flags[1], "Fwd_RST": fwd_flags[2],
+        "Fwd_PSH": fwd_flags[3], "Fwd_ACK": fwd_flags[4], "Fwd_URG": fwd_flags[5],
+        "Bwd_SYN": bwd_flags[0], "Bwd_FIN": bwd_flags[1], "Bwd_RST": bwd_flags[2],
+        "Bwd_PSH": bwd_flags[3], "Bwd_ACK": bwd_flags[4], "Bwd_URG": bwd_flags[5],
+        "MinActive": act_idle[0], "MeanActive": act_idle[1],
+        "MaxActive": act_idle[2], "StdActive": act_idle[3],
+        "MinIdle": act_idle[4], "MeanIdle": act_idle[5],
+        "MaxIdle": act_idle[6], "StdIdle": act_idle[7],
+        "SrcPortCat": port_cat(a.sport), "DstPortCat": port_cat(a.dport)
+    })
+
+
+#Rows for many flow records at once, FlowIDs counting from `start`: one flow_features pass
+#over the whole batch computes only the selected columns (accumulators build their own rows).
+#Records are read through snapshots: periodic_dump runs beside the capture thread
+def flow_rows(flow_list, start=1):
+    n = len(flow_list)
+    if n == 0:
+        return []
+    if FLOW_STATE == "stream":
+        return [accum_row(idx, fl) for idx, fl in enumerate(flow_list, start=start)]
+    flow_list = [fl.snapshot() for fl in flow_list]
+    cols = flow_features.compute(flow_list, FEATURE_COLUMNS)
+    cols["FlowID"] = list(range(start, start + n))
+    for col, field in (("SrcIP", "src"), ("DstIP", "dst"), ("SrcPort", "sport"), ("DstPort", "dport"), ("Protocol", "proto")):
+        cols[col] = [fl[field] for fl in flow_list]
+    flow_sampling.scale_columns(cols, n)
+    return [dict(zip(OUT_HEADERS, vals)) for vals in zip(*(cols[h] for h in OUT_HEADERS))]
+
+
+# ---------------- Incremental snapshots (live capture without expiry) ----------------
+# periodic_dump rewrites every open flow every 30 s. update_flow records which flows saw
+# packets since the last snapshot; only those get their features recomputed, the other
+# rows come from the cache, so a dump costs the activity since the last one, not the table.
+INCREMENTAL = False     # track changed flows (set in main for live runs, handed to shard workers)
+dirty = set()           # keys of flows updated since the last snapshot
+row_cache = {}          # key -> feature row as of the last snapshot
+shard_rows = {}         # parent with --workers: first-packet seq -> latest row from the shards
+
+#Recompute the rows of the flows changed since the last call; returns their (key, row) pairs
+def refresh_rows():
+    global dirty
+    changed, dirty = dirty, set()
+    keys, fls = [], []
+    for key in changed:
+        fl = flows.get(key)
+        if fl is None:
+            row_cache.pop(key, None)
+        else:
+            keys.append(key); fls.append(fl)
+    out = list(zip(keys, flow_rows(fls, 0)))
+    row_cache.update(out)
+    return out
+
+#Rows for every flow, FlowID in first-seen order (merged from the shard workers when --workers > 1)
+def snapshot_rows():
+    if shard_pool is not None:
+        if INCREMENTAL:
+            for part in shard_pool.collect("changed_rows"):
+                shard_rows.update(part)
+            merged = (shard_rows[n] for n in sorted(shard_rows))
+        else:
+            merged = (row for _, row in heapq.merge(*shard_pool.collect("rows")))
+        rows = []
+        for idx, row in enumerate(merged, start=1):
+            row["FlowID"] = idx
+            rows.append(row)
+        return rows
+    # Create a copy of the flows dictionary to avoid modification during iteration
+    with threading.Lock():  # Use a lock to ensure thread safety
+        flows_copy = flows.copy()
+    if INCREMENTAL:
+        refresh_rows()
+        rows = []
+        for idx, (key, fl) in enumerate(flows_copy.items(), start=1):
+            row = row_cache.get(key)
+            if row is None:      # opened after refresh_rows took the dirty set
+                row = flow_row(0, fl)
+            row["FlowID"] = idx
+            rows.append(row)
+        return rows
+    return flow_rows(list(flows_copy.values()))
+
+
+def dump_flows_to_csv(filename, rows=None):
+    # Ensure output is in DATA_DIR
+    if not os.path.isabs(filename):
+        filename = os.path.join(DATA_DIR, filename)
+
+    headers = OUT_HEADERS
+    
+    try:
+        if rows is None:
+            rows = snapshot_rows()
+        
+        if not rows:
+            print(f"[!] No flows to dump to {filename}")
+            return
+            
+        if OUTPUT_FORMAT != "csv":
+            flow_arrow.write_rows(filename, headers, rows, OUTPUT_FORMAT)
+        else:
+            with open(filename, "w", newline="", encoding="utf-8") as fcsv:
+                w = csv.DictWriter(fcsv, fieldnames=headers, extrasaction="ignore")
+                w.writeheader()
+                w.writerows(rows)
+                
+        print(f"[+] Updated {filename} with {len(rows)} flows")
+        
+    except Exception as e:
+        print(f"[!] Error dumping flows to {filename}: {e}")
+        import traceback
+        traceback.print_exc()
+
+
+
+#Incremental output (expiry mode): finished flows are appended, each one exactly once
+#(Parquet/Arrow: buffered into the file's open writer, complete once close_output() runs)
+def append_rows_to_csv(filename, rows):
+    if not os.path.isabs(filename):
+        filename = os.path.join(DATA_DIR, filename)
+    if filename in arrow_writers:
+        arrow_writers[filename].write_rows(rows)
+        return
+    new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+    with open(filename, "a", newline="", encoding="utf-8") as fcsv:
+        w = csv.DictWriter(fcsv, fieldnames=OUT_HEADERS, extrasaction="ignore")
+        if new: w.writeheader()
+        w.writerows(rows)
+
+#Rows of the flows finished so far (after a sweep at `now`, or finishing everything when
+#final), numbered on from the previous call
+def take_finished_rows(now=None, final=False):
+    if shard_pool is not None:
+        rows = [row for _, row in heapq.merge(*shard_pool.collect(("expire", now, final)))]
+    else:
+        if final: finish_all()
+        elif now is not None: sweep_flows(now)
+        rows = flow_rows(take_finished(), 0)
+    for row in rows:
+        row["FlowID"] = next(flow_ids)
+    return rows
+
+def emit_finished(filename, now=None, final=False):
+    try:
+        rows = take_finished_rows(now, final)
+        if live_sink is not None:
+            live_sink.append(rows)
+            if rows:
+                print(f"[+] Appended {len(rows)} finished flows to {live_sink.label} ({len(flows)} still open)")
+        elif rows:
+            append_rows_to_csv(filename, rows)
+            print(f"[+] Appended {len(rows)} finished flows to {filename} ({len(flows)} still open)")
+    except Exception as e:
+        print(f"[!] Error writing finished flows to {filename}: {e}")
+        import traceback
+        traceback.print_exc()
+
+#Segmented live output without expiry: rows of the flows changed since the last round, each
+#flow keeping the FlowID it got when it was first written (first-seen order within a round)
+segment_ids = {}        # flow key (shard workers: first-packet seq) -> FlowID
+
+def changed_rows():
+    if shard_pool is not None:
+        pairs = list(heapq.merge(*shard_pool.collect("changed_rows"), key=lambda sr: sr[0]))
+    else:
+        pairs = sorted(refresh_rows(), key=lambda kr: flows[kr[0]]["start"])
+    rows = []
+    for ident, row in pairs:
+        fid = segment_ids.get(ident)
+        if fid is None:
+            fid = segment_ids[ident] = next(flow_ids)
+        row["FlowID"] = fid
+        rows.append(row)
+    return rows
+
+def emit_changed():
+    try:
+        rows = changed_rows()
+        live_sink.append(rows)
+        if rows:
+            print(f"[+] Appended {len(rows)} changed flows to {live_sink.label} ({len(segment_ids)} flows so far)")
+    except Exception as e:
+        print(f"[!] Error writing changed flows to {live_sink.label}: {e}")
+        import traceback
+        traceback.print_exc()
+
+#Start an incremental output file with just the header
+def reset_csv(filename):
+    if not os.path.isabs(filename):
+        filename = os.path.join(DATA_DIR, filename)
+    if OUTPUT_FORMAT != "csv":
+        arrow_writers[filename] = flow_arrow.FlowWriter(filename, OUT_HEADERS, OUTPUT_FORMAT)
+        return
+    with open(filename, "w", newline="", encoding="utf-8") as fcsv:
+        csv.writer(fcsv).writerow(OUT_HEADERS)
+
+#Finish the incremental Parquet/Arrow files (write the buffered rows and footer, rename into place)
+def close_output():
+    while arrow_writers:
+        _, w = arrow_writers.popitem()
+        w.close()
+
+
+#Writer for the columnar engine: same headers/row format as dump_flows_to_csv
+def write_columns_csv(filename, cols):
+    if not os.path.isabs(filename):
+        filename = os.path.join(DATA_DIR, filename)
+    if not cols:
+        print(f"[!] No flows to dump to {filename}")
+        return
+    if OUTPUT_FORMAT != "csv":
+        flow_arrow.write_columns(filename, OUT_HEADERS, cols, OUTPUT_FORMAT)
+        print(f"[+] Updated {filename} with {len(cols['FlowID'])} flows")
+        return
+    with open(filename, "w", newline="", encoding="utf-8") as fcsv:
+        w = csv.writer(fcsv)
+        w.writerow(OUT_HEADERS)
+        w.writerows(zip(*(cols[h] for h in OUT_HEADERS)))
+    print(f"[+] Updated {filename} with {len(cols['FlowID'])} flows")
+
+
+# ---------------- Chunked offline processing (--jobs N) ----------------
+#Pool task: partial flow state (and top talkers, with --topk) for one record-aligned byte range
+#of the capture. The run options come from the pool initializer (apply_run_options)
+def chunk_flows(path, start, end, topk=0):
+    global top_talkers
+    flow_sampling.reseed(start)
+    flows.clear()
+    top_talkers = heavy_hitters.HeavyHitters(topk) if topk else None
+    for batch in mmap_reader.iter_batches(path, start=start, end=end):
+        process_batch(batch)
+    part = list(flows.items())
+    flows.clear()
+    return part, top_talkers
+
+def _chunk_task(args):
+    return chunk_flows(*args)
+
+#Stitch one chunk's partial flows onto the table. Chunks are merged in file order, so
+#appending (FlowRecord.extend) keeps every time/length/flag series, and with it the IATs
+#and active/idle periods, exactly as a sequential read builds them.
+def merge_flows(part):
+    for key, pf in part:
+        f = flows.get(key)
+        if f is None:
+            flows[key] = pf
+        else:
+            f.extend(pf)
+
+def rows_for(flow_list):
+    return flow_rows(flow_list, 0)
+
+#Split the file into byte ranges, build partial flows per range in a process pool, merge
+#them, then compute the (independent) per-flow features in the same pool. Every process gets
+#the run options from the initializer: under spawn a process may only ever run rows_for
+def process_chunked(path, jobs):
+    global top_talkers
+    try:
+        ranges = mmap_reader.split_ranges(path, jobs)
+    except ValueError as e:
+        print(f"[!] {e}")
+        return None
+    print(f"[*] Processing {path} as {len(ranges)} chunks with {jobs} processes")
+    with mp.Pool(jobs, initializer=apply_run_options, initargs=(run_options(),)) as pool:
+        try:
+            topk = top_talkers.k if top_talkers is not None else 0
+            for part, talkers in pool.imap(_chunk_task, [(path, start, end, topk)
+                                                         for start, end in ranges]):
+                merge_flows(part)
+                if talkers is not None:
+                    top_talkers.merge(talkers)
+        except ValueError as e:   # pcapng with interfaces declared mid-file
+            print(f"[!] {e}; falling back to a sequential read")
+            flows.clear()
+            if top_talkers is not None:
+                top_talkers = heavy_hitters.HeavyHitters(top_talkers.k)
+            return None
+        flow_list = list(flows.values())
+        step = max(1, -(-len(flow_list) // (jobs * 4)))
+        rows = [row for part in pool.imap(rows_for, (flow_list[i:i + step] for i in range(0, len(flow_list), step)))
+                for row in part]
+    for idx, row in enumerate(rows, start=1):
+        row["FlowID"] = idx
+    return rows
+
+
+#-i value -> path: "-" is stdin, relative names live in DATA_DIR
+def resolve_input(name):
+    if name == rawdecode.STDIN or os.path.isabs(name):
+        return name
+    return os.path.join(DATA_DIR, name)
+
+#Feed every packet of one capture (file, stdin, .gz/.zst) into process_packet
+def read_capture(input_pcap, decoder):
+    if decoder == "mmap":
+        for batch in mmap_reader.iter_batches(input_pcap):
+            process_batch(batch)
+    elif decoder == "raw":
+        for data, ts, linktype in rawdecode.iter_raw_records(input_pcap):
+            handle_raw(data, ts, linktype)
+    else:
+        with PcapReader(rawdecode.open_capture(input_pcap)) as pr:
+            for pkt in pr:
+                ip, _ = get_ip_layer(pkt)
+                if ip is None: continue
+                proto, sport, dport, flags = get_l4_info(pkt)
+                if proto is None: continue
+                process_packet(ip.src, ip.dst, sport, dport, proto, float(pkt.time), pkt_len(pkt), flags)
+
+
+# ---------------- Batch mode (-i <dir> or -i "<glob>") ----------------
+CAPTURE_EXTS = (".pcap", ".pcapng", ".cap", ".pcap.gz", ".pcapng.gz", ".pcap.zst", ".pcapng.zst")
+
+#A directory (its capture files), a glob pattern, or a single file -> sorted list of paths
+def expand_inputs(spec):
+    if os.path.isdir(spec):
+        return sorted(os.path.join(spec, n) for n in os.listdir(spec) if n.lower().endswith(CAPTURE_EXTS))
+    if glob.has_magic(spec):
+        return sorted(p for p in glob.glob(spec) if os.path.isfile(p))
+    return [spec]
+
+#Pool task: one capture -> its own CSV (out_csv) or, when merging, its rows back to the parent.
+#Returns (path, rows_or_None, stats) and never raises, so one bad file does not stop the batch.
+def batch_task(args):
+    global flow_ids, next_sweep
+    path, out_csv, decoder, engine, opts = args
+    t0 = time.time()
+    try:
+        flows.clear(); addr_names.clear()
+        apply_run_options(opts)
+        if engine == "columnar":
+            cols = flow_columnar.flow_features(flow_columnar.load_columns(path), FEATURE_COLUMNS)
+            rows = [dict(zip(OUT_HEADERS, r)) for r in zip(*(cols[h] for h in OUT_HEADERS))] if cols else []
+        else:
+            take_finished(); flow_ids = itertools.count(1); next_sweep = 0.0
+            read_capture(path, decoder)
+            rows = take_finished_rows(final=True) if EXPIRY else snapshot_rows()
+            flows.clear()
+        stats = {"flows": len(rows), "packets": sum(r.get("TotalPackets", 0) for r in rows), "error": None}
+        if out_csv is not None:
+            dump_flows_to_csv(out_csv, rows)
+            rows = None
+    except Exception as e:
+        rows, stats = None, {"flows": 0, "packets": 0, "error": f"{type(e).__name__}: {e}"}
+    stats["bytes"] = os.path.getsize(path) if os.path.exists(path) else 0
+    stats["seconds"] = time.time() - t0
+    return path, rows, stats
+
+def print_batch_summary(results, wall):
+    print(f"\n{'file':<40} {'packets':>10} {'flows':>8} {'MB':>9} {'sec':>8} {'pkts/s':>10} {'MB/s':>8}")
+    tot_pkts = tot_bytes = 0
+    for path, st in results:
+        name = os.path.basename(path)[:40]
+        if st["error"]:
+            print(f"{name:<40} FAILED: {st['error']}")
+            continue
+        mb, sec = st["bytes"] / 1e6, max(st["seconds"], 1e-9)
+        print(f"{name:<40} {st['packets']:>10} {st['flows']:>8} {mb:>9.1f} {sec:>8.2f} "
+              f"{st['packets'] / sec:>10.0f} {mb / sec:>8.1f}")
+        tot_pkts += st["packets"]; tot_bytes += st["bytes"]
+    failed = sum(1 for _, st in results if st["error"])
+    print(f"[+] {len(results) - failed}/{len(results)} files, {tot_pkts} packets, {tot_bytes / 1e6:.1f} MB "
+          f"in {wall:.2f}s wall ({tot_pkts / max(wall, 1e-9):.0f} pkts/s, {tot_bytes / 1e6 / max(wall, 1e-9):.1f} MB/s)")
+
+#Process many captures in a bounded pool. Per-file mode writes <output_dir>/<file name>.csv
+#(.parquet / .arrow with --format); merge mode streams every file's rows (in input order) into
+#one output file with a SourceFile column.
+def process_batch_files(paths, output, jobs, decoder, engine, merge=False):
+    if not merge:
+        os.makedirs(output, exist_ok=True)
+    ext = flow_arrow.FORMATS[OUTPUT_FORMAT]
+    tasks = [(p, None if merge else os.path.join(output, os.path.basename(p) + ext),
+              decoder, engine, run_options()) for p in paths]
+    print(f"[*] Batch: {len(paths)} files, {jobs} processes, "
+          + (f"merged into {output}" if merge else f"one {ext} file per capture in {output}"))
+    t0 = time.time()
+    results, flow_id = [], 0
+    fcsv = fout = None
+    try:
+        if merge and OUTPUT_FORMAT != "csv":
+            fout = flow_arrow.FlowWriter(output, OUT_HEADERS + ["SourceFile"], OUTPUT_FORMAT)
+            write = fout.write_rows
+        elif merge:
+            fcsv = open(output, "w", newline="", encoding="utf-8")
+            w = csv.DictWriter(fcsv, fieldnames=OUT_HEADERS + ["SourceFile"], extrasaction="ignore")
+            w.writeheader()
+            write = w.writerows
+        with mp.Pool(jobs) as pool:
+            for path, rows, stats in pool.imap(batch_task, tasks):
+                results.append((path, stats))
+                if rows:
+                    for row in rows:
+                        flow_id += 1
+                        row["FlowID"] = flow_id
+                        row["SourceFile"] = os.path.basename(path)
+                    write(rows)
+    finally:
+        if fcsv is not None:
+            fcsv.close()
+        if fout is not None:
+            fout.close()
+    if merge:
+        print(f"[+] Updated {output} with {flow_id} flows")
+    print_batch_summary(results, time.time() - t0)
+    return results
+
+
+#Write the top-K summary next to the flow CSV, so top-talker views read K entries, not every flow
+def publish_top_talkers():
+    if top_talkers is not None and topk_file is not None:
+        top_talkers.publish(topk_file)
+
+
+def periodic_dump(filename, interval=30):
+    while running:
+        time.sleep(interval)
+        if EXPIRY:   # only what finished since the last round; quiet flows time out on the wall clock
+            emit_finished(filename, now=time.time())
+        elif live_sink is not None:
+            emit_changed()
+        else:
+            dump_flows_to_csv(filename)
+        publish_top_talkers()
+
+
+def signal_handler(sig, frame):
+    global running
+    running = False
+    print("\n[!] Stopping capture...")
+    report_prefilter()
+    publish_top_talkers()
+    if EXPIRY:
+        emit_finished(live_output, final=True)
+        close_output()
+    elif live_sink is not None:
+        emit_changed()
+    else:
+        dump_flows_to_csv(os.path.join(DATA_DIR, "final_liveflows" + flow_arrow.FORMATS[OUTPUT_FORMAT]))  # <-- Use DATA_DIR
+    if live_sink is not None:
+        live_sink.close()   # the last, partly filled segment is completed, then the ring is removed
+    sys.exit(0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="PCAP/Live -> CSV (CIC-like flow features, Windows-friendly)")
+    ap.add_argument("-i","--input", help="Input PCAP/PCAPNG file (may be .gz/.zst compressed, '-' reads stdin), "
+                                         "or a directory / quoted glob of captures (batch mode)")
+    ap.add_argument("-o","--output", required=True,
+                    help="Output CSV file (batch mode: output directory, or the merged CSV with --merge); "
+                         "a .parquet or .arrow name writes that format")
+    ap.add_argument("--format", choices=tuple(flow_arrow.FORMATS), default=None,
+                    help="Output format: CSV, or typed Parquet (zstd) / Arrow IPC files with float32/int32 "
+                         "columns and dictionary-encoded categories (default: from the -o extension, else csv)")
+    ap.add_argument("--live", action="store_true", help="Enable live capture mode")
+    ap.add_argument("--iface", default="Wi-Fi", help="Network interface for live capture")
+    ap.add_argument("--decoder", choices=("scapy", "raw", "mmap"), default="scapy",
+                    help="Packet decoder: full Scapy dissection, header-only raw bytes, "
+                         "or (offline only) memory-mapped batches of raw headers")
+    ap.add_argument("--engine", choices=("flow", "columnar"), default="flow",
+                    help="Offline feature engine: per-flow dict (default) or vectorized "
+                         "columnar (loads headers with the mmap reader)")
+    ap.add_argument("--capture", choices=("sniff", "afpacket"), default="sniff",
+                    help="Live capture backend: Scapy sniff() or the Linux TPACKET_V3 ring")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Shard flow assembly over N processes by flow key (flow engine only)")
+    ap.add_argument("--pin-cpus", action="store_true", help="Pin each shard worker to its own CPU")
+    ap.add_argument("--jobs", type=int, default=None,
+                    help="Offline: split the input at record boundaries into N byte ranges and "
+                         "process them in parallel (reads headers with the mmap reader). "
+                         "Batch mode: number of files processed concurrently (default: CPU count)")
+    ap.add_argument("--merge", action="store_true",
+                    help="Batch mode: write all flows into the single CSV given by -o")
+    ap.add_argument("--idle-timeout", type=float, default=0,
+                    help="Finish a flow after S seconds without packets (0 = never). Any of the expiry "
+                         "options makes the output incremental: finished flows are appended once and dropped")
+    ap.add_argument("--active-timeout", type=float, default=0,
+                    help="Finish a flow once it has lasted S seconds; later packets start a new flow (0 = never)")
+    ap.add_argument("--tcp-close", action="store_true",
+                    help="Finish TCP flows on RST, or once FIN was seen in both directions")
+    ap.add_argument("--flow-state", choices=("lists", "stream"), default="lists",
+                    help="Per-flow state: every packet's time/length/flags (default), or constant-memory "
+                         "running statistics, percentiles from bounded sketches (see --quantiles; flow engine only)")
+    ap.add_argument("--quantiles", choices=("kll", "p2", "exact"), default=None,
+                    help="Percentile columns with --flow-state stream: series stay exact up to --exact-below "
+                         "samples, then switch to a KLL sketch (default; rank error about 2.3/k, see "
+                         "quantile_sketch.py) or a P-square (constant memory, no error bound: on bimodal series, "
+                         "e.g. ACKs vs full-size packets, a percentile near the gap between the modes can be off "
+                         "by 11-12 rank points). 'exact' keeps every sample: O(n) memory per flow")
+    ap.add_argument("--exact-below", type=int, default=quantile_sketch.EXACT_LIMIT,
+                    help="Sketch modes: series with at most N samples stay exact (default %(default)s)")
+    ap.add_argument("--kll-k", type=int, default=quantile_sketch.KLL_K,
+                    help="KLL accuracy parameter k (default %(default)s)")
+    ap.add_argument("--flow-sample", type=int, default=1,
+                    help="Keep 1 in N flows (hash of the 5-tuple, whole flows kept; default 1 = all)")
+    ap.add_argument("--packet-sample", type=int, default=1,
+                    help="Keep 1 in N packets at random and scale counts/bytes by N (default 1 = all)")
+    ap.add_argument("--sample-seed", type=int, default=0,
+                    help="Seed for flow hashing and packet draws (same seed, same sample)")
+    ap.add_argument("--bpf", default=None,
+                    help="Kernel BPF filter for live capture, tcpdump syntax (e.g. \"not port 873\")")
+    ap.add_argument("--allow-net", action="append", default=[], metavar="CIDR[,CIDR]",
+                    help="Only build flows with an endpoint in these networks (longest prefix wins over --deny-net)")
+    ap.add_argument("--deny-net", action="append", default=[], metavar="CIDR[,CIDR]",
+                    help="Drop packets with an endpoint in these networks before any flow state")
+    ap.add_argument("--allow-ports", default=None, help="Only packets with a port in this set, e.g. 53,80,443,8000-8100")
+    ap.add_argument("--deny-ports", default=None, help="Drop packets with a port in this set, e.g. 873,10000-10100")
+    ap.add_argument("--topk", type=int, default=0,
+                    help="Track the top K sources, destinations and ports by bytes and packets in fixed memory "
+                         "(Space-Saving) and publish them to <output>.topk.json (0 = off)")
+    ap.add_argument("--features", default="csv",
+                    help="Feature columns to compute and write: 'csv' (all), 'model' (the classifier's columns "
+                         "plus packet/byte counts) or a comma-separated list of sets and column names")
+    ap.add_argument("--segments", action="store_true",
+                    help="Live: append finished (with expiry) or changed flows to rotated segment files under "
+                         "<output>.segments/, listed in its manifest.json, instead of rewriting one CSV")
+    ap.add_argument("--segment-mb", type=float, default=flow_segments.SEGMENT_BYTES / (1 << 20),
+                    help="--segments: complete a segment once it holds this many MiB (default %(default)s)")
+    ap.add_argument("--segment-seconds", type=float, default=flow_segments.SEGMENT_SECONDS,
+                    help="--segments: complete a segment once it is this old (default %(default)s)")
+    ap.add_argument("--ring", action="store_true",
+                    help="Live (implies --segments): also publish the rows as Arrow record batches into a "
+                         "shared-memory ring named after -o (see flow_ring.py), which classifier_core reads in "
+                         "place before their segment is completed. Without the ring only the segments are written")
+    ap.add_argument("--ring-mb", type=float, default=flow_ring.RING_BYTES / (1 << 20),
+                    help="--ring: size of the shared-memory block in MiB (default %(default)s)")
+    ap.add_argument("--ring-slots", type=int, default=flow_ring.RING_SLOTS,
+                    help="--ring: number of batches it holds before the oldest are overwritten (default %(default)s)")
+    args = ap.parse_args()
+
+    global shard_pool, emit_file, live_output, FLOW_STATE, top_talkers, topk_file, INCREMENTAL, live_sink, OUTPUT_FORMAT
+    configure_expiry(args.idle_timeout, args.active_timeout, args.tcp_close)
+    FLOW_STATE = args.flow_state
+    if FLOW_STATE != "stream":
+        if args.quantiles not in (None, "exact"):
+            print("[!] --quantiles sketches only apply to --flow-state stream; keeping exact percentiles")
+        args.quantiles = "exact"
+    elif args.quantiles is None:
+        args.quantiles = "kll"
+    quantile_sketch.configure(args.quantiles, args.exact_below, args.kll_k)
+    try:
+        set_features(args.features)
+    except ValueError as e:
+        print(f"[!] Invalid --features: {e}")
+        sys.exit(1)
+    if len(FEATURE_COLUMNS) < len(flow_features.FEATURES):
+        print(f"[*] Features: {flow_features.describe(FEATURE_COLUMNS)}")
+    if args.quantiles != "exact":
+        bound = (f"rank error ~{quantile_sketch.kll_rank_error():.2%}" if args.quantiles == "kll"
+                 else "no error bound, up to ~12 rank points off on bimodal series")
+        print(f"[*] Percentiles: exact up to {args.exact_below} samples, then {args.quantiles} ({bound})")
+    try:
+        prefilter.configure(args.allow_net, args.deny_net, args.allow_ports, args.deny_ports)
+    except ValueError as e:
+        print(f"[!] Invalid pre-filter: {e}")
+        sys.exit(1)
+    if prefilter.ENABLED:
+        print(f"[*] Pre-filter: {prefilter.describe()}")
+        if args.engine == "columnar":
+            print("[!] The pre-filter needs the flow engine; ignoring --engine columnar")
+            args.engine = "flow"
+    if args.bpf:
+        if not args.live:
+            print("[!] --bpf only applies to live capture; ignoring it")
+            args.bpf = None
+        else:
+            err = prefilter.check_bpf(args.bpf, args.iface)
+            if err:
+                print(f"[!] Cannot compile BPF filter {args.bpf!r}: {err}")
+                sys.exit(1)
+            print(f"[*] Kernel BPF filter: {args.bpf}")
+    flow_sampling.configure(args.flow_sample, args.packet_sample, args.sample_seed)
+    if flow_sampling.ENABLED:
+        print(f"[*] Sampling: {flow_sampling.describe()}")
+        if args.engine == "columnar":
+            print("[!] Sampling needs the flow engine; ignoring --engine columnar")
+            args.engine = "flow"
+    if EXPIRY and args.engine == "columnar":
+        print("[!] Flow expiry needs the flow engine; ignoring --engine columnar")
+        args.engine = "flow"
+    if args.topk > 0:
+        top_talkers = heavy_hitters.HeavyHitters(args.topk)
+        print(f"[*] Top talkers: top {args.topk} of {top_talkers.capacity} counters per view")
+        if args.engine == "columnar":
+            print("[!] --topk needs the flow engine; ignoring --engine columnar")
+            args.engine = "flow"
+
+    if args.segments and not args.live:
+        print("[!] --segments only applies to live capture; writing one CSV")
+        args.segments = False
+    if args.ring and not args.live:
+        print("[!] --ring only applies to live capture; writing one CSV")
+        args.ring = False
+    args.segments = args.segments or args.ring    # the ring is a fast path over the segments
+    OUTPUT_FORMAT = args.format or flow_arrow.format_of(args.output)
+    if OUTPUT_FORMAT != "csv":
+        if flow_arrow.pa is None:
+            print(f"[!] --format {OUTPUT_FORMAT} needs the 'pyarrow' package")
+            sys.exit(1)
+        if args.segments:
+            print(f"[!] --segments are written as CSV; ignoring --format {OUTPUT_FORMAT}")
+            OUTPUT_FORMAT = "csv"
+        elif args.live and EXPIRY:
+            print(f"[*] {OUTPUT_FORMAT} output is complete once capture stops (--segments for readable rounds)")
+
+    inputs = None
+    if not args.live and args.input and args.input != rawdecode.STDIN:
+        spec = args.input if os.path.isabs(args.input) else os.path.join(DATA_DIR, args.input)
+        if os.path.isdir(spec) or glob.has_magic(spec):
+            inputs = expand_inputs(spec)
+    if inputs is not None:
+        output = args.output if os.path.isabs(args.output) else os.path.join(DATA_DIR, args.output)
+        if not inputs:
+            print(f"[!] No capture files match {args.input}")
+            sys.exit(1)
+        if top_talkers is not None:
+            print("[!] --topk is not published in batch mode; ignoring it")
+            top_talkers = None
+        process_batch_files(inputs, output, args.jobs or os.cpu_count() or 1, args.decoder, args.engine, args.merge)
+        return
+
+    args.jobs = args.jobs or 1
+    parallel_chunks = args.jobs > 1 and not args.live and args.engine == "flow"
+    if parallel_chunks and (EXPIRY or FLOW_STATE == "stream"):
+        print("[!] --jobs cannot stitch expiring or streamed flow state across chunks; reading sequentially")
+        parallel_chunks = False
+    if parallel_chunks and (args.input == rawdecode.STDIN or rawdecode.is_stream(resolve_input(args.input))):
+        print("[!] --jobs needs a seekable, uncompressed capture; reading the stream sequentially")
+        parallel_chunks = False
+    INCREMENTAL = args.live and not EXPIRY    # periodic_dump re-snapshots the whole table
+    if args.workers > 1 and args.engine == "flow" and not parallel_chunks:
+        shard_pool = flow_shards.ShardPool(args.workers, shard_worker, pin_cpus=args.pin_cpus,
+                                           worker_args=(run_options(),))
+
+    if args.live:
+        signal.signal(signal.SIGINT, signal_handler)
+        print(f"[*] Sniffing on {args.iface}... Press Ctrl+C to stop.")
+        topk_file = heavy_hitters.topk_path(args.output)
+        output = args.output if os.path.isabs(args.output) else os.path.join(DATA_DIR, args.output)
+        mode = "finished" if EXPIRY else "updates"
+        if args.segments:
+            live_sink = flow_segments.SegmentWriter(output, OUT_HEADERS, mode,
+                                                    int(args.segment_mb * (1 << 20)), args.segment_seconds)
+            print(f"[*] Segmented output: {live_sink.dir} ({live_sink.mode}, "
+                  f"{args.segment_mb:g} MiB / {args.segment_seconds:g} s per segment)")
+            if args.ring:
+                try:
+                    live_sink = flow_ring.RingWriter(output, OUT_HEADERS, live_sink, mode,
+                                                     int(args.ring_mb * (1 << 20)), args.ring_slots)
+                    print(f"[*] Shared-memory output: {live_sink.name} ({mode}, {live_sink.slots} slots of "
+                          f"{live_sink.slot_bytes >> 10} KiB); classifier_core reads it for {output}")
+                except (RuntimeError, OSError, ValueError) as e:
+                    print(f"[!] Cannot create the shared-memory ring ({e}); writing the segments only")
+        elif EXPIRY:
+            live_output = args.output
+            reset_csv(live_output)
+        threading.Thread(target=periodic_dump, args=(args.output,), daemon=True).start()
+        if args.capture == "afpacket":
+            for batch in afpacket.capture_batches(args.iface, lambda: not running, on_stats=report_ring_stats,
+                                                   bpf=args.bpf):
+                process_packets(batch)
+        elif args.decoder != "scapy":   # no file to map when live: mmap falls back to raw
+            for data, ts, linktype in rawdecode.iter_live_frames(args.iface, lambda: not running, args.bpf):
+                handle_raw(data, ts, linktype)
+        else:
+            sniff(iface=args.iface, prn=handle_packet, store=False, filter=args.bpf)
+    else:
+        # Ensure input/output are in DATA_DIR
+        input_pcap = resolve_input(args.input)
+        output_csv = args.output
+        if not os.path.isabs(output_csv):
+            output_csv = os.path.join(DATA_DIR, output_csv)
+        topk_file = heavy_hitters.topk_path(output_csv)
+        if args.engine == "columnar":
+            write_columns_csv(output_csv, flow_columnar.flow_features(flow_columnar.load_columns(input_pcap), FEATURE_COLUMNS))
+            return
+        if parallel_chunks:
+            rows = process_chunked(input_pcap, args.jobs)
+            if rows is not None:
+                dump_flows_to_csv(output_csv, rows)
+                publish_top_talkers()
+                return
+        if EXPIRY:
+            reset_csv(output_csv)
+            if shard_pool is None:
+                emit_file = output_csv
+        read_capture(input_pcap, "mmap" if parallel_chunks else args.decoder)
+        report_prefilter()
+        publish_top_talkers()
+        if EXPIRY:
+            emit_finished(output_csv, final=True)
+            close_output()
+        else:
+            dump_flows_to_csv(output_csv)
+        if shard_pool is not None:
+            shard_pool.close()
+
+if __name__=="__main__":
+    main()
+
+
+
+
+
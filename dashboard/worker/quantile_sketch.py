@@ -0,0 +1,190 @@
+# quantile_sketch.py [Streaming quantile sketches for the percentile columns (--quantiles)]
+# The 25/50/75/90th percentile columns normally need every sample of a series. A sketch
+# answers them from bounded memory instead. Every series starts exact (the samples are
+# kept while there are at most exact_limit of them, and np.percentile gives the same
+# values as the list mode); past that it switches to the selected sketch:
+#
+#   kll    (default) KLL sketch (Karnin, Lang & Liberty 2016) with accuracy parameter k.
+#          Normalized rank error is about 2.296 / k**0.9723 with 99% confidence, i.e. about
+#          1.3% for the default k=200 (the returned value is one whose rank is off by at
+#          most that fraction of the series length). Memory is O(k) per series.
+#   p2     extended P-square (Jain & Chlamtac 1985, Raatikainen 1987): 11 markers track
+#          all four quantiles in constant memory. No guaranteed bound; on smooth
+#          distributions within about half a rank point, but on bimodal series (ACKs
+#          vs full-size packets, short vs long gaps) a percentile that falls between
+#          the modes can be off by 11-12 rank points.
+#   exact  never switch, keep every sample: 8 bytes per value of each of the five
+#          series, O(n) per flow (more than the list mode's per-packet arrays).
+
+import math, random
+from array import array
+import numpy as np
+
+
+PCTS = (25, 50, 75, 90)
+PROBS = tuple(p / 100 for p in PCTS)
+
+MODE = "kll"
+EXACT_LIMIT = 128
+KLL_K = 200
+_rng = random.Random(0x6B6C6C)   # fixed seed: same input, same output
+
+# P-square marker probabilities: 0, each p, the midpoints between them and 1 (11 for 4 quantiles)
+P2_MARKS = tuple(sorted({0.0, 1.0, *PROBS, PROBS[0] / 2,
+                         *((a + b) / 2 for a, b in zip(PROBS, PROBS[1:])), (PROBS[-1] + 1) / 2}))
+P2_INDEX = tuple(P2_MARKS.index(p) for p in PROBS)
+
+
+def configure(mode="kll", exact_limit=EXACT_LIMIT, k=KLL_K):
+    global MODE, EXACT_LIMIT, KLL_K
+    MODE, EXACT_LIMIT, KLL_K = mode, exact_limit, k
+
+def kll_rank_error(k=None):
+    return 2.296 / (k or KLL_K) ** 0.9723
+
+
+class P2Quantiles:
+    """Extended P-square estimator: marker heights follow the P2_MARKS quantiles"""
+    __slots__ = ("q", "pos", "n")
+
+    def __init__(self):
+        self.q = []            # marker heights (the first len(P2_MARKS) samples until then)
+        self.pos = None        # marker positions, 1-based
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def append(self, x):
+        self.n += 1
+        q, m = self.q, len(P2_MARKS)
+        if self.pos is None:
+            q.append(x)
+            if len(q) == m:
+                q.sort()
+                self.pos = list(range(1, m + 1))
+            return
+        pos = self.pos
+        if x < q[0]:
+            q[0] = x; k = 0
+        elif x >= q[-1]:
+            q[-1] = x; k = m - 2
+        else:
+            k = 0
+            while x >= q[k + 1]: k += 1
+        for i in range(k + 1, m):
+            pos[i] += 1
+        n1 = self.n - 1
+        for i in range(1, m - 1):
+            d = 1 + n1 * P2_MARKS[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i]) +
+                    (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:     # parabola overshoots: fall back to linear
+                    qp = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = qp
+                pos[i] += d
+
+    def quantiles(self):
+        if self.pos is None:
+            return [float(v) for v in np.percentile(self.q, PCTS)]
+        return [float(self.q[i]) for i in P2_INDEX]
+
+
+class KLLSketch:
+    """KLL quantile sketch: a stack of compactors, level h items weigh 2**h"""
+    __slots__ = ("k", "levels", "n", "size", "max_size")
+    C = 2 / 3
+
+    def __init__(self, k=None):
+        self.k = k or KLL_K
+        self.levels = [[]]
+        self.n = 0
+        self.size = 0
+        self.max_size = self._capacity(0)
+
+    def __len__(self):
+        return self.n
+
+    def _capacity(self, h):
+        return 2 + int(math.ceil(self.k * self.C ** (len(self.levels) - h - 1)))
+
+    def append(self, x):
+        self.levels[0].append(x)
+        self.n += 1
+        self.size += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def _compress(self):
+        for h in range(len(self.levels)):
+            level = self.levels[h]
+            if len(level) >= self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append([])
+                # keep every other item of the sorted level (random phase), promote it one level
+                level.sort()
+                keep = level.pop() if len(level) % 2 else None
+                self.levels[h + 1].extend(level[_rng.getrandbits(1)::2])
+                level[:] = [] if keep is None else [keep]
+                self.size = sum(len(lv) for lv in self.levels)
+                self.max_size = sum(self._capacity(i) for i in range(len(self.levels)))
+                if self.size < self.max_size:
+                    break
+
+    def quantiles(self):
+        if len(self.levels) == 1:      # nothing compacted yet: still every sample
+            return [float(v) for v in np.percentile(self.levels[0], PCTS)]
+        items = sorted((v, 1 << h) for h, lv in enumerate(self.levels) for v in lv)
+        total = sum(w for _, w in items)
+        out, cum, i = [], 0, 0
+        for p in PROBS:
+            target = p * total
+            while i < len(items) - 1 and cum + items[i][1] <= target:
+                cum += items[i][1]; i += 1
+            out.append(float(items[i][0]))
+        return out
+
+
+SKETCHES = {"p2": P2Quantiles, "kll": KLLSketch}
+
+
+class HybridQuantiles:
+    """Exact samples for small series, the configured sketch once there are more than EXACT_LIMIT"""
+    __slots__ = ("exact", "sketch")
+
+    def __init__(self):
+        self.exact = array("d")
+        self.sketch = None
+
+    def __len__(self):
+        return len(self.sketch) if self.sketch is not None else len(self.exact)
+
+    def append(self, x):
+        if self.sketch is not None:
+            self.sketch.append(x)
+            return
+        self.exact.append(x)
+        if len(self.exact) > EXACT_LIMIT:
+            self.sketch = SKETCHES[MODE]()
+            for v in self.exact:
+                self.sketch.append(v)
+            self.exact = None
+
+    def quantiles(self):
+        if self.sketch is not None:
+            return self.sketch.quantiles()
+        return [float(v) for v in np.percentile(self.exact, PCTS)]
+
+
+def new_quantiles():
+    return array("d") if MODE == "exact" else HybridQuantiles()
+
+def percentiles(q):
+    if not len(q):
+        return [0.0] * len(PCTS)
+    if isinstance(q, array):
+        return [float(v) for v in np.percentile(q, PCTS)]
+    return q.quantiles()
@@ -0,0 +1,92 @@
+# test_flow_arrow.py [Parquet / Arrow IPC flow files: column types, dictionaries across batches, values]
+
+import os
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import flow_arrow
+
+
+COLUMNS = ["FlowID", "SrcIP", "DstIP", "SrcPort", "DstPort", "Protocol", "FlowDuration", "TotFwdPkts",
+           "TotalBytes", "FwdIATMean", "Fwd_SYN", "SrcPortCat", "DstPortCat"]
+CATS = ("Web", "System", "Other", "Multimedia", "Social")
+
+
+def rows(n):
+    return [{"FlowID": i, "SrcIP": f"10.0.{i // 256}.{i % 256}", "DstIP": "2001:db8::1",
+             "SrcPort": 40000 + i % 20000, "DstPort": (443, 53, 80)[i % 3], "Protocol": ("TCP", "UDP")[i % 2],
+             "FlowDuration": i / 8, "TotFwdPkts": i % 50, "TotalBytes": i * 3_000_000,   # past 2**31
+             "FwdIATMean": 0 if i % 7 == 0 else i / 1000, "Fwd_SYN": i % 2,
+             "SrcPortCat": CATS[(i // 40) % 5], "DstPortCat": CATS[min(i // 100, 4)]}      # new values in later batches
+            for i in range(1, n + 1)]
+
+
+@pytest.fixture(params=["parquet", "arrow"])
+def written(request, tmp_path, monkeypatch):
+    if request.param == "parquet":
+        pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(flow_arrow, "BATCH_ROWS", 64)       # several batches / row groups
+    path = str(tmp_path / f"flows{flow_arrow.FORMATS[request.param]}")
+    data = rows(500)
+    flow_arrow.write_rows(path, COLUMNS, data)
+    return path, data
+
+
+def read_table(path):
+    if flow_arrow.format_of(path) == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(path)
+    with pa.ipc.open_file(path) as f:
+        return f.read_all()
+
+
+def test_column_types(written):
+    path, _ = written
+    assert not os.path.exists(path + ".part")
+    table = read_table(path)
+    assert len(table.to_batches()) == 8                    # 500 rows in batches of 64
+    types = {f.name: f.type for f in table.schema}
+    assert types["FlowID"] == pa.int64() and types["TotalBytes"] == pa.int64()
+    assert types["SrcPort"] == types["TotFwdPkts"] == types["Fwd_SYN"] == pa.int32()
+    assert types["FlowDuration"] == types["FwdIATMean"] == pa.float32()
+    assert types["SrcIP"] == pa.string()
+    for name in ("Protocol", "SrcPortCat", "DstPortCat"):
+        assert pa.types.is_dictionary(types[name]) and types[name].value_type == pa.string()
+    assert types["Protocol"].index_type == pa.int8()
+
+def test_values_round_trip(written):
+    path, data = written
+    table = read_table(path)
+    assert table.num_rows == len(data)
+    got = table.to_pylist()
+    for want, row in zip(data, got):
+        for name in COLUMNS:
+            if flow_arrow.column_type(name) == pa.float32():
+                assert row[name] == pytest.approx(want[name], rel=1e-6), name
+            else:
+                assert row[name] == want[name], name
+
+def test_read_frame(written):
+    pytest.importorskip("pandas")
+    path, data = written
+    df = flow_arrow.read_frame(path)
+    assert df["FlowID"].tolist() == [r["FlowID"] for r in data]
+    assert df["DstPortCat"].astype(str).tolist() == [r["DstPortCat"] for r in data]
+    assert str(df["FlowDuration"].dtype) == "float32" and str(df["TotFwdPkts"].dtype) == "int32"
+
+def test_columns_and_rows_agree(tmp_path, monkeypatch):
+    monkeypatch.setattr(flow_arrow, "BATCH_ROWS", 100)
+    data = rows(250)
+    a, b = str(tmp_path / "rows.arrow"), str(tmp_path / "cols.arrow")
+    flow_arrow.write_rows(a, COLUMNS, data)
+    flow_arrow.write_columns(b, COLUMNS, {name: [r[name] for r in data] for name in COLUMNS})
+    assert read_table(a).equals(read_table(b))
+
+def test_record_batch_schema():
+    batch = flow_arrow.record_batch(flow_arrow.schema(COLUMNS), rows(3))
+    assert batch.num_rows == 3 and batch.schema == flow_arrow.schema(COLUMNS)
+    assert batch.column("Protocol").to_pylist() == ["UDP", "TCP", "UDP"]
+
+def test_format_of():
+    assert [flow_arrow.format_of(p) for p in ("a.parquet", "a.PQ", "a.feather", "a.ipc", "a.arrow", "a.csv", "a")] == \
+        ["parquet", "parquet", "arrow", "arrow", "arrow", "csv", "csv"]
@@ -0,0 +1,118 @@
+# test_flow_segments.py [SegmentWriter rotation and manifest atomicity, read_frame positions]
+
+import json, os
+import pytest
+import flow_segments
+from flow_segments import SegmentWriter, read_manifest
+
+
+HEADERS = ["FlowID", "SrcIP", "TotalBytes"]
+
+def rows(first, n, size=0):
+    return [{"FlowID": i, "SrcIP": "10.0.0.1", "TotalBytes": i * 10 + size} for i in range(first, first + n)]
+
+def listing(output):
+    return sorted(os.listdir(flow_segments.segment_dir(output)))
+
+
+def test_rotates_by_size(tmp_path):
+    out = str(tmp_path / "live.csv")
+    w = SegmentWriter(out, HEADERS, max_bytes=200, max_seconds=3600)
+    assert read_manifest(out)["segments"] == []
+    w.append(rows(1, 3))
+    assert listing(out) == [".seg-000001.csv.part", "manifest.json"]   # open segment stays hidden
+    w.append(rows(4, 20))
+    w.append(rows(24, 2))
+    w.close()
+    m = read_manifest(out)
+    assert [s["name"] for s in m["segments"]] == ["seg-000001.csv", "seg-000002.csv"]
+    assert [(s["rows"], s["first_flow_id"], s["last_flow_id"]) for s in m["segments"]] == [(23, 1, 23), (2, 24, 25)]
+    assert listing(out) == ["manifest.json", "seg-000001.csv", "seg-000002.csv"]
+    for s in m["segments"]:
+        assert os.path.getsize(os.path.join(m["dir"], s["name"])) == s["bytes"]
+    assert flow_segments.total_rows(m) == 25
+
+def test_rotates_by_age(tmp_path):
+    out = str(tmp_path / "live.csv")
+    w = SegmentWriter(out, HEADERS, max_seconds=30)
+    w.maybe_rotate()                                  # nothing open: nothing to rotate
+    w.append(rows(1, 2))
+    w.maybe_rotate(now=w.opened + 29)
+    assert read_manifest(out)["segments"] == []
+    w.maybe_rotate(now=w.opened + 30)
+    assert [s["rows"] for s in read_manifest(out)["segments"]] == [2]
+    assert w.rotate() is None                         # closed segment is not listed twice
+    w.close()
+    assert len(read_manifest(out)["segments"]) == 1
+
+def test_new_run_starts_a_new_series(tmp_path):
+    out = str(tmp_path / "live.csv")
+    w = SegmentWriter(out, HEADERS, max_bytes=1)
+    w.append(rows(1, 2))
+    w.append(rows(3, 2))          # left open, as after a crash
+    w = SegmentWriter(out, HEADERS)
+    assert listing(out) == ["manifest.json"] and read_manifest(out)["segments"] == []
+
+
+#A crash while the manifest is rewritten leaves the previous manifest whole
+def test_manifest_replaced_atomically(tmp_path, monkeypatch):
+    out = str(tmp_path / "live.csv")
+    w = SegmentWriter(out, HEADERS, max_bytes=1)
+    w.append(rows(1, 2))
+    before = open(flow_segments.manifest_path(out), encoding="utf-8").read()
+    real_replace = os.replace
+
+    def crash(src, dst):
+        if os.path.basename(dst) == flow_segments.MANIFEST:
+            raise OSError("killed")
+        real_replace(src, dst)
+    monkeypatch.setattr(os, "replace", crash)
+    with pytest.raises(OSError):
+        w.append(rows(3, 2))
+    monkeypatch.undo()
+    assert open(flow_segments.manifest_path(out), encoding="utf-8").read() == before
+    m = read_manifest(out)
+    assert [s["name"] for s in m["segments"]] == ["seg-000001.csv"]
+    assert all(json.loads(before)["segments"][0][k] == m["segments"][0][k] for k in ("rows", "bytes"))
+
+#Segments are whole on disk before the manifest names them
+def test_segment_synced_before_listing(tmp_path, monkeypatch):
+    out = str(tmp_path / "live.csv")
+    w = SegmentWriter(out, HEADERS, max_bytes=1)
+    seen = []
+    real_write = w.write_manifest
+
+    def check():
+        for s in w.segments:
+            path = os.path.join(w.dir, s["name"])
+            seen.append(os.path.getsize(path) == s["bytes"] and not os.path.exists(os.path.join(w.dir, f".{s['name']}.part")))
+        real_write()
+    monkeypatch.setattr(w, "write_manifest", check)
+    for i in range(5):
+        w.append(rows(i * 3 + 1, 3))
+    assert seen and all(seen)
+
+
+def test_read_frame_positions(tmp_path):
+    pytest.importorskip("pandas")
+    out = str(tmp_path / "live.csv")
+    w = SegmentWriter(out, HEADERS, max_bytes=1)
+    for first in (1, 4, 6):
+        w.append(rows(first, {1: 3, 4: 2, 6: 4}[first]))
+    m = read_manifest(out)
+    df, pos = flow_segments.read_frame(m)
+    assert df["FlowID"].tolist() == list(range(1, 10)) and pos == 9
+    df, pos = flow_segments.read_frame(m, 4)           # from the middle of the second segment
+    assert df["FlowID"].tolist() == [5, 6, 7, 8, 9] and pos == 9
+    df, pos = flow_segments.read_frame(m, 9)
+    assert len(df) == 0 and list(df.columns) == HEADERS and pos == 9
+
+def test_updates_mode_keeps_latest_row(tmp_path):
+    pytest.importorskip("pandas")
+    out = str(tmp_path / "live.csv")
+    w = SegmentWriter(out, HEADERS, mode="updates", max_bytes=1)
+    w.append(rows(1, 3))
+    w.append(rows(2, 1, size=5) + rows(4, 1))
+    df, pos = flow_segments.read_frame(read_manifest(out))
+    assert pos == 5
+    assert df["FlowID"].tolist() == [1, 2, 3, 4] and df["TotalBytes"].tolist() == [10, 25, 30, 40]
@@ -0,0 +1,147 @@
+# test_mmap_reader.py [split_ranges record alignment and --jobs chunk stitching against a sequential read]
+
+import multiprocessing, os, random, struct, subprocess, sys
+import numpy as np
+import pytest
+import mmap_reader
+
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pcap2csv_win_new.py")
+
+
+
+#Ethernet/IPv4/TCP-or-UDP frame with `pad` payload bytes (only the headers the decoders read)
+def frame(src, dst, sport, dport, tcp, flags, pad):
+    l4 = struct.pack("!HHIIBBHHH", sport, dport, 0, 0, 0x50, flags, 0, 0, 0) if tcp else \
+        struct.pack("!HHHH", sport, dport, 8 + pad, 0)
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(l4) + pad, 0, 0, 64, 6 if tcp else 17, 0, src, dst)
+    return b"\x02\x00\x00\x00\x00\x02\x02\x00\x00\x00\x00\x01\x08\x00" + ip + l4 + b"\x00" * pad
+
+#`flows` flows, both directions, interleaved over the whole file, with idle gaps > 1 s
+def packets(n=3000, flows=5, seed=11):
+    rng = random.Random(seed)
+    conv = [(bytes((10, 0, i >> 8, i & 255)), bytes((10, 1, 0, 1)), 40000 + i, (443, 53, 80)[i % 3], i % 3 != 1)
+            for i in range(flows)]
+    t, out = 1_700_000_000.0, []
+    for _ in range(n):
+        t += rng.choice((0.001, 0.004, 0.02, 0.3, 1.7))
+        a, b, pa, pb, tcp = rng.choice(conv)
+        if rng.random() < 0.4:
+            a, b, pa, pb = b, a, pb, pa
+        out.append((t, frame(a, b, pa, pb, tcp, rng.choice((0x02, 0x10, 0x18, 0x11)), rng.randint(0, 1400))))
+    return out
+
+#pcap file -> offsets of its records
+def write_pcap(path, pkts):
+    offsets = []
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for ts, data in pkts:
+            offsets.append(f.tell())
+            sec = int(ts)
+            f.write(struct.pack("<IIII", sec, round((ts - sec) * 1e6), len(data), len(data)) + data)
+    return offsets
+
+def _block(btype, body):
+    body += b"\x00" * (-len(body) % 4)
+    return struct.pack("<II", btype, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+
+SHB = _block(mmap_reader.PCAPNG_SHB, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+IDB = _block(mmap_reader.PCAPNG_IDB, struct.pack("<HHI", 1, 0, 65535))
+
+#pcapng file (microsecond EPBs, `late_idb` = an IDB after the first packet) -> offsets of its EPBs
+def write_pcapng(path, pkts, late_idb=False):
+    offsets = []
+    with open(path, "wb") as f:
+        f.write(SHB + IDB)
+        for i, (ts, data) in enumerate(pkts):
+            if late_idb and i == 1:
+                f.write(IDB)
+            offsets.append(f.tell())
+            us = round(ts * 1e6)
+            f.write(_block(mmap_reader.PCAPNG_EPB, struct.pack("<IIIII", 0, us >> 32, us & 0xFFFFFFFF, len(data), len(data)) + data))
+    return offsets
+
+
+@pytest.fixture(scope="module")
+def captures(tmp_path_factory):
+    d = tmp_path_factory.mktemp("captures")
+    pkts = packets()
+    out = {}
+    for name, write in (("pcap", write_pcap), ("pcapng", write_pcapng)):
+        path = str(d / f"flows.{name}")
+        out[name] = (path, write(path, pkts))
+    return out
+
+
+@pytest.mark.parametrize("kind", ["pcap", "pcapng"])
+@pytest.mark.parametrize("n", [1, 2, 3, 7, 16, 64])
+def test_ranges_contiguous_on_record_boundaries(captures, kind, n):
+    path, offsets = captures[kind]
+    ranges = mmap_reader.split_ranges(path, n)
+    assert 1 <= len(ranges) <= n
+    assert ranges[0][0] == offsets[0] and ranges[-1][1] == os.path.getsize(path)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+    assert all(start < end for start, end in ranges)
+    assert {start for start, _ in ranges} <= set(offsets)
+    if n <= 16:
+        assert len(ranges) == n       # 3000 records: every cut finds its own boundary
+
+@pytest.mark.parametrize("kind", ["pcap", "pcapng"])
+def test_ranges_read_back_every_packet_once(captures, kind):
+    path, _ = captures[kind]
+    whole = np.concatenate(list(mmap_reader.iter_batches(path)))
+    parts = np.concatenate([b for start, end in mmap_reader.split_ranges(path, 7)
+                            for b in mmap_reader.iter_batches(path, batch_size=500, start=start, end=end)])
+    assert len(whole) == 3000 and np.array_equal(whole, parts)
+
+def test_pcapng_interface_after_first_packet(tmp_path):
+    path = str(tmp_path / "late_idb.pcapng")
+    write_pcapng(path, packets(50), late_idb=True)
+    with pytest.raises(ValueError, match="after the first packet"):
+        mmap_reader.split_ranges(path, 4)
+
+def test_not_a_capture(tmp_path):
+    path = tmp_path / "junk.pcap"
+    path.write_bytes(b"\x00" * 64)
+    with pytest.raises(ValueError, match="not a pcap"):
+        mmap_reader.split_ranges(str(path), 2)
+
+
+# ---------------- --jobs N against a sequential read ----------------
+#Run the worker (optionally under a given multiprocessing start method) -> CSV text
+def run_worker(tmp_path, name, args, start_method=None):
+    out = str(tmp_path / name)
+    script = tmp_path / f"run_{name}.py"
+    script.write_text(f"import multiprocessing as mp, sys\nsys.path.insert(0, {os.path.dirname(WORKER)!r})\n"
+                      "import pcap2csv_win_new as w\n"
+                      "if __name__ == '__main__':\n"
+                      f"    if {start_method!r}: mp.set_start_method({start_method!r})\n"
+                      "    w.main()\n")
+    proc = subprocess.run([sys.executable, str(script), "-o", out, *args], capture_output=True, text=True,
+                          cwd=str(tmp_path), timeout=300)
+    assert proc.returncode == 0, proc.stderr
+    with open(out, encoding="utf-8") as f:
+        return f.read()
+
+@pytest.mark.parametrize("kind", ["pcap", "pcapng"])
+def test_jobs_match_sequential(captures, tmp_path, kind):
+    pytest.importorskip("scapy")
+    path, _ = captures[kind]
+    seq = run_worker(tmp_path, "seq.csv", ["-i", path, "--decoder", "mmap"])
+    par = run_worker(tmp_path, "par.csv", ["-i", path, "--decoder", "mmap", "--jobs", "7"])
+    assert seq.count("\n") == 6          # header + 5 flows, each spanning every chunk
+    assert par == seq                    # IATs and active/idle stitched exactly
+
+#Every pool process gets the run options, also the ones that only compute rows under spawn
+#(many small flows: more row tasks than chunk tasks)
+def test_jobs_options_under_spawn(tmp_path):
+    pytest.importorskip("scapy")
+    path = str(tmp_path / "many.pcap")
+    write_pcap(path, packets(2000, flows=300))
+    args = ["-i", path, "--jobs", "16", "--packet-sample", "2"]
+    fork = run_worker(tmp_path, "fork.csv", args, "fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+    spawn = run_worker(tmp_path, "spawn.csv", args, "spawn")
+    assert spawn == fork
+    rate = fork.splitlines()[0].split(",").index("PktSamplingRate")
+    assert {line.split(",")[rate] for line in fork.splitlines()[1:]} == {"2"}
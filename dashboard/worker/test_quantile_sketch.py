@@ -0,0 +1,83 @@
+# test_quantile_sketch.py [Documented error bounds: KLL rank error, exact percentiles below EXACT_LIMIT]
+
+import numpy as np
+import pytest
+import quantile_sketch
+from quantile_sketch import PCTS, PROBS, HybridQuantiles, KLLSketch, P2Quantiles
+
+
+@pytest.fixture(autouse=True)
+def defaults():
+    quantile_sketch._rng.seed(0x6B6C6C)     # compaction coin flips independent of test order
+    yield
+    quantile_sketch.configure()
+
+
+def series(kind, n=100_000, seed=5):
+    rng = np.random.default_rng(seed)
+    if kind == "uniform":
+        return rng.uniform(0, 1500, n)
+    if kind == "bimodal":       # ACKs vs full-size packets
+        return np.where(rng.random(n) < 0.6, rng.normal(66, 4, n), rng.normal(1500, 20, n))
+    if kind == "sorted":
+        return np.sort(rng.exponential(0.05, n))
+    raise ValueError(kind)
+
+#Normalized rank error of v as the p-quantile of data: distance from p to v's rank interval
+def rank_error(data, v, p):
+    lo = np.searchsorted(data, v, "left") / len(data)
+    hi = np.searchsorted(data, v, "right") / len(data)
+    return max(lo - p, p - hi, 0.0)
+
+
+@pytest.mark.parametrize("kind", ["uniform", "bimodal", "sorted"])
+@pytest.mark.parametrize("k", [100, 200])
+def test_kll_rank_error_within_bound(kind, k):
+    data = series(kind)
+    sk = KLLSketch(k)
+    for x in data.tolist():
+        sk.append(x)
+    assert len(sk) == len(data)
+    assert sum(len(lv) for lv in sk.levels) < 4 * k        # O(k) items, not O(n)
+    ordered = np.sort(data)
+    bound = quantile_sketch.kll_rank_error(k)
+    for p, v in zip(PROBS, sk.quantiles()):
+        assert rank_error(ordered, v, p) <= bound, (kind, p)
+
+@pytest.mark.parametrize("mode", ["kll", "p2"])
+def test_hybrid_exact_up_to_limit(mode):
+    quantile_sketch.configure(mode, exact_limit=quantile_sketch.EXACT_LIMIT)
+    data = series("bimodal", quantile_sketch.EXACT_LIMIT + 1, seed=9).tolist()
+    q = HybridQuantiles()
+    for n, x in enumerate(data[:-1], start=1):
+        q.append(x)
+        assert q.quantiles() == [float(v) for v in np.percentile(data[:n], PCTS)]   # bit for bit
+        assert quantile_sketch.percentiles(q) == q.quantiles()
+    q.append(data[-1])
+    assert q.exact is None and isinstance(q.sketch, quantile_sketch.SKETCHES[mode]) and len(q) == len(data)
+
+def test_hybrid_uses_kll_by_default():
+    quantile_sketch.configure()
+    assert quantile_sketch.MODE == "kll"
+    q = quantile_sketch.new_quantiles()
+    for x in series("uniform", 10_000).tolist():
+        q.append(x)
+    assert isinstance(q.sketch, KLLSketch)
+
+def test_exact_mode_keeps_every_sample():
+    quantile_sketch.configure("exact")
+    q = quantile_sketch.new_quantiles()
+    data = series("sorted", 1000).tolist()
+    for x in data:
+        q.append(x)
+    assert len(q) == 1000 and quantile_sketch.percentiles(q) == [float(v) for v in np.percentile(data, PCTS)]
+    assert quantile_sketch.percentiles(quantile_sketch.new_quantiles()) == [0.0] * len(PCTS)
+
+#P-square has no guaranteed bound; on a smooth distribution it stays within about half a rank point
+def test_p2_on_uniform():
+    data = series("uniform", 20_000)
+    q = P2Quantiles()
+    for x in data.tolist():
+        q.append(x)
+    ordered = np.sort(data)
+    assert all(rank_error(ordered, v, p) <= 0.005 for p, v in zip(PROBS, q.quantiles()))
@@ -0,0 +1,242 @@
+# flow_features.py [Feature registry: every flow feature by name, computed lazily per batch]
+# One definition of the flow features for the worker, the client, the columnar engine and
+# the legacy scripts. A feature names the stages it reads; a stage is one segmented pass of
+# flow_kernel over the whole batch (length stats, gap percentiles, active/idle runs, ...)
+# and names the stages it builds on. Stages run on first use, so asking for the model's
+# columns never pays for the percentile lexsorts or the flag counts.
+# Feature sets (--features): "model" = the classifier's columns plus the packet/byte counts
+# the dashboard shows, "csv" = every column, or a comma-separated mix of sets and columns.
+
+import numpy as np
+from flow_kernel import PCTS, FLAG_BITS, pack, seg_stats, seg_percentiles, seg_gaps, typed, active_idle
+
+
+STAGES = {}      # stage -> (stages it needs, fn(batch, *their values))
+FEATURES = {}    # column -> (stages it needs, fn(batch, *their values) -> list), in CSV order
+F, B = slice(0, None, 2), slice(1, None, 2)      # fwd / bwd halves of a per-direction array
+
+
+def stage(name, *needs):
+    def register(fn):
+        STAGES[name] = (needs, fn)
+        return fn
+    return register
+
+def feature(name, *needs):
+    def register(fn):
+        FEATURES[name] = (needs, fn)
+        return fn
+    return register
+
+
+class Batch:
+    """Flow records (or arrays packed by the caller) and the stages computed for them so far"""
+
+    def __init__(self, flow_list=None, n=None, active_threshold=1.0, zero_tail=False, time_scale=1.0, **stages):
+        self.flows = flow_list
+        self.n = len(flow_list) if n is None else n
+        self.active_threshold = active_threshold
+        self.zero_tail = zero_tail          # client semantics: a zero-length last active run counts
+        self.time_scale = time_scale        # seconds per time unit (rates are per second)
+        self.done = dict(stages)            # stages handed in are used as they are
+
+    def get(self, name):
+        if name not in self.done:
+            needs, fn = STAGES[name]
+            self.done[name] = fn(self, *map(self.get, needs))
+        return self.done[name]
+
+    def column(self, name):
+        needs, fn = FEATURES[name]
+        return fn(self, *map(self.get, needs))
+
+    def columns(self, names=None):
+        return {name: self.column(name) for name in (FEATURES if names is None else names)}
+
+
+#Flow records (fwd/bwd times, lens and flags series; start, end, sport, dport) -> {column: list}
+def compute(flow_list, columns=None, active_threshold=1.0, zero_tail=False, time_scale=1.0):
+    if not flow_list:
+        return {}
+    return Batch(flow_list, active_threshold=active_threshold, zero_tail=zero_tail,
+                 time_scale=time_scale).columns(columns)
+
+
+# ---------------- stages ----------------
+# inputs; callers with their own arrays (flow_columnar) pass these to Batch directly
+@stage("series")
+def _series(b):                 # every per-packet series, packed in one pass over the records
+    return pack(b.flows)
+
+@stage("times", "series")
+def _times(b, series):          # (timestamps, dseg) grouped by dseg = 2*flow + (0 fwd / 1 bwd)
+    return series["times"]
+
+@stage("lens", "series")
+def _lens(b, series):           # lengths, same slots as times
+    return series["lens"][0]
+
+@stage("flags", "series")
+def _flags(b, series):          # (TCP flag ints, seg)
+    return series["flags"]
+
+@stage("bounds")
+def _bounds(b):
+    return (np.fromiter((fl["start"] for fl in b.flows), np.float64, b.n),
+            np.fromiter((fl["end"] for fl in b.flows), np.float64, b.n))
+
+@stage("ports")
+def _ports(b):
+    return [fl["sport"] for fl in b.flows], [fl["dport"] for fl in b.flows]
+
+# derived
+@stage("duration", "bounds")
+def _duration(b, bounds):
+    return np.maximum(0.0, bounds[1] - bounds[0])
+
+@stage("len_stats", "times", "lens")
+def _len_stats(b, times, lens):   # (count, sum, mean, std, min, max) per direction
+    return seg_stats(lens, times[1], 2 * b.n)
+
+@stage("len_pcts", "times", "lens", "len_stats")
+def _len_pcts(b, times, lens, st):
+    return seg_percentiles(lens, times[1], 2 * b.n, st[0])
+
+@stage("dir_gaps", "times")
+def _dir_gaps(b, times):        # fwd/bwd IATs in arrival order
+    return seg_gaps(*times)
+
+@stage("dir_iat", "dir_gaps")
+def _dir_iat(b, gaps):
+    return seg_stats(*gaps, 2 * b.n)
+
+@stage("dir_iat_pcts", "dir_gaps", "dir_iat")
+def _dir_iat_pcts(b, gaps, st):
+    return seg_percentiles(*gaps, 2 * b.n, st[0])
+
+@stage("flow_times", "times")
+def _flow_times(b, times):      # whole flow, sorted: (times, flow id, packets per flow)
+    ts, dseg = times
+    fid = dseg >> 1
+    order = np.lexsort((ts, fid))
+    return ts[order], fid[order], np.bincount(fid, minlength=b.n)
+
+@stage("flow_gaps", "flow_times")
+def _flow_gaps(b, ft):
+    return seg_gaps(ft[0], ft[1])
+
+@stage("flow_iat", "flow_gaps")
+def _flow_iat(b, gaps):
+    return seg_stats(*gaps, b.n)
+
+@stage("flow_iat_pcts", "flow_gaps", "flow_iat")
+def _flow_iat_pcts(b, gaps, st):
+    return seg_percentiles(*gaps, b.n, st[0])
+
+@stage("active_idle", "flow_times")
+def _active_idle(b, ft):
+    return active_idle(ft[0], ft[1], b.n, ft[2], b.active_threshold, b.zero_tail)
+
+@stage("flag_counts", "flags")
+def _flag_counts(b, flags):
+    values, seg = flags
+    return {name: np.bincount(seg, weights=(values & mask) != 0, minlength=2 * b.n).astype(np.int64)
+            for name, mask in FLAG_BITS}
+
+
+# ---------------- features ----------------
+def _ratio(a, b):
+    return np.divide(a, b, out=np.zeros(len(a)), where=b != 0).tolist()
+
+def port_cat(p):
+    if p in (80, 443): return "Web"
+    if p in (1935, 554, 8554): return "Multimedia"
+    if p in (5222, 5228, 443): return "Social"
+    if p < 1024: return "System"
+    return "Other"
+
+# IAT columns: (stats stage, percentile stage, slice of the per-segment arrays)
+IAT_SOURCES = (("Flow", "flow_iat", "flow_iat_pcts", slice(None)),
+               ("Fwd", "dir_iat", "dir_iat_pcts", F), ("Bwd", "dir_iat", "dir_iat_pcts", B))
+
+feature("FlowDuration", "duration")(lambda b, dur: dur.tolist())
+feature("TotFwdPkts", "len_stats")(lambda b, st: st[0][F].tolist())
+feature("TotBwdPkts", "len_stats")(lambda b, st: st[0][B].tolist())
+feature("TotLenFwd", "len_stats")(lambda b, st: st[1][F].astype(np.int64).tolist())
+feature("TotLenBwd", "len_stats")(lambda b, st: st[1][B].astype(np.int64).tolist())
+for side, sl in (("Fwd", F), ("Bwd", B)):
+    feature(f"{side}PktLenMean", "len_stats")(lambda b, st, sl=sl: st[2][sl].tolist())
+    feature(f"{side}PktLenStd", "len_stats")(lambda b, st, sl=sl: st[3][sl].tolist())
+    feature(f"{side}PktLenMin", "len_stats")(lambda b, st, sl=sl: st[4][sl].astype(np.int64).tolist())
+    feature(f"{side}PktLenMax", "len_stats")(lambda b, st, sl=sl: st[5][sl].astype(np.int64).tolist())
+# fewer than two packets -> bare 0, as the per-flow helpers returned
+for side, src, _, sl in IAT_SOURCES:
+    for i, stat in ((2, "Mean"), (3, "Std"), (4, "Min"), (5, "Max")):
+        feature(f"{side}IAT{stat}", src)(lambda b, st, sl=sl, i=i: typed(st[i][sl], st[0][sl] > 0))
+feature("TotalFwdIAT", "dir_iat")(lambda b, st: st[1][F].tolist())
+feature("TotalBwdIAT", "dir_iat")(lambda b, st: st[1][B].tolist())
+feature("TotalBytes", "len_stats")(lambda b, st: (st[1][F] + st[1][B]).astype(np.int64).tolist())
+feature("TotalPackets", "len_stats")(lambda b, st: (st[0][F] + st[0][B]).tolist())
+feature("BytesPerSec", "len_stats", "duration")(lambda b, st, dur: _ratio(st[1][F] + st[1][B], dur * b.time_scale))
+feature("PktsPerSec", "len_stats", "duration")(lambda b, st, dur: _ratio(st[0][F] + st[0][B], dur * b.time_scale))
+feature("FwdBwdPktRatio", "len_stats")(lambda b, st: _ratio(st[0][F], st[0][B]))
+feature("FwdBwdByteRatio", "len_stats")(lambda b, st: _ratio(st[1][F], st[1][B]))
+for side, sl in (("Fwd", F), ("Bwd", B)):
+    for i, q in enumerate(PCTS):
+        feature(f"{side}PktLenPct{q}", "len_pcts")(lambda b, p, sl=sl, i=i: p[i][sl].tolist())
+for side, src, pct, sl in IAT_SOURCES:
+    for i, q in enumerate(PCTS):
+        feature(f"{side}IAT{q}", src, pct)(lambda b, st, p, sl=sl, i=i: typed(p[i][sl], st[0][sl] > 0))
+for side, sl in (("Fwd", F), ("Bwd", B)):
+    for name, _ in FLAG_BITS:
+        feature(f"{side}_{name}", "flag_counts")(lambda b, c, sl=sl, name=name: c[name][sl].tolist())
+for j, period in ((0, "Active"), (1, "Idle")):
+    for i, stat in ((1, "Min"), (2, "Mean"), (3, "Max"), (4, "Std")):
+        feature(f"{stat}{period}", "active_idle")(lambda b, ai, j=j, i=i: typed(ai[j][i], ai[j][0]))
+feature("SrcPortCat", "ports")(lambda b, ports: [port_cat(p) for p in ports[0]])
+feature("DstPortCat", "ports")(lambda b, ports: [port_cat(p) for p in ports[1]])
+
+
+# ---------------- feature sets ----------------
+MODEL_COLUMNS = [          # ModelConfig.column_mapping / classifier_core, in that order
+    "FlowDuration", "TotalFwdIAT", "TotalBwdIAT",
+    "FwdIATMin", "BwdIATMin", "FwdIATMax", "BwdIATMax", "FwdIATMean", "BwdIATMean",
+    "PktsPerSec", "BytesPerSec",
+    "FlowIATMin", "FlowIATMax", "FlowIATMean", "FlowIATStd",
+    "MinActive", "MeanActive", "MaxActive", "StdActive",
+    "MinIdle", "MeanIdle", "MaxIdle", "StdIdle",
+]
+COUNT_COLUMNS = ["TotFwdPkts", "TotBwdPkts", "TotLenFwd", "TotLenBwd", "TotalBytes", "TotalPackets"]
+PRESETS = {"model": MODEL_COLUMNS + COUNT_COLUMNS, "csv": list(FEATURES)}
+
+
+#Feature set spec -> columns in CSV order; ValueError names the first unknown entry
+def resolve(spec=None):
+    wanted = set()
+    for name in (spec or "csv").split(","):
+        name = name.strip()
+        if name in PRESETS:
+            wanted.update(PRESETS[name])
+        elif name in FEATURES:
+            wanted.add(name)
+        elif name:
+            raise ValueError(f"unknown feature {name!r} (sets: {', '.join(PRESETS)}; or column names)")
+    return [col for col in FEATURES if col in wanted]
+
+#Stages the columns need, dependencies first
+def plan(columns):
+    order = []
+    def visit(name):
+        if name not in order:
+            for dep in STAGES[name][0]:
+                visit(dep)
+            order.append(name)
+    for col in columns:
+        for name in FEATURES[col][0]:
+            visit(name)
+    return order
+
+def describe(columns):
+    if len(columns) == len(FEATURES):
+        return f"all {len(columns)} columns"
+    return f"{len(columns)} columns, stages: {', '.join(plan(columns))}"
@@ -0,0 +1,120 @@
+# flow_kernel.py [Batched NumPy feature kernel: statistics for many flows at once]
+# Per-flow row code calls statistics/np.percentile a few dozen times per flow (gap lists
+# rebuilt for every IAT helper, 8 percentile calls, 12 flag passes). Here a whole
+# batch of flow records is packed into flat arrays, one slot per packet, with a segment
+# id per flow direction (2*i fwd, 2*i+1 bwd). Every feature is then a segmented reduction
+# (bincount / reduceat / one lexsort for percentiles) over the batch.
+# Semantics follow the per-flow helpers: fwd/bwd IATs in arrival order, flow IAT and
+# active/idle over sorted times, np.percentile's linear method bit for bit, bare int 0
+# where the scalar code returns 0. Mean/Std of float series can differ in the last bits
+# (statistics.fmean/pstdev round exactly, the vectorized sums do not).
+# The named features built from these live in flow_features.py. Shared (flowlib/) by the
+# dashboard worker, the client and the legacy scripts, and by flow_columnar.
+
+import numpy as np
+
+
+PCTS = (25, 50, 75, 90)
+FLAG_BITS = (("SYN", 0x02), ("FIN", 0x01), ("RST", 0x04), ("PSH", 0x08), ("ACK", 0x10), ("URG", 0x20))
+
+
+# ---------------- segmented helpers ----------------
+# All helpers take values already grouped by segment id (seg is non-decreasing).
+
+def seg_starts(counts):
+    starts = np.zeros(len(counts), dtype=np.int64)
+    np.cumsum(counts[:-1], out=starts[1:])
+    return starts
+
+#count, sum, mean, population std, min, max per segment (0 where a segment is empty)
+def seg_stats(values, seg, nseg):
+    counts = np.bincount(seg, minlength=nseg)
+    sums = np.bincount(seg, weights=values, minlength=nseg).astype(np.float64, copy=False)  # int64 when empty
+    nz = counts > 0
+    mean = np.zeros(nseg); mean[nz] = sums[nz] / counts[nz]
+    dev = values - mean[seg]
+    var = np.zeros(nseg); var[nz] = np.bincount(seg, weights=dev * dev, minlength=nseg)[nz] / counts[nz]
+    std = np.where(counts > 1, np.sqrt(var), 0.0)
+    mins = np.zeros(nseg); maxs = np.zeros(nseg)
+    if len(values):
+        starts = seg_starts(counts)[nz]
+        mins[nz] = np.minimum.reduceat(values, starts)
+        maxs[nz] = np.maximum.reduceat(values, starts)
+    return counts, sums, mean, std, mins, maxs
+
+#np.percentile(..., method="linear") per segment, bit-for-bit (same index and lerp formulas)
+def seg_percentiles(values, seg, nseg, counts, qs=PCTS):
+    order = np.lexsort((values, seg))
+    v = values[order]
+    starts = seg_starts(counts)
+    nz = counts > 0
+    out = []
+    for q in qs:
+        res = np.zeros(nseg)
+        n = counts[nz]
+        vi = (n - 1) * (q / 100)
+        prev = np.floor(vi)
+        above = vi >= n - 1
+        prev = np.where(above, n - 1, prev).astype(np.int64)
+        nxt = np.where(above, n - 1, prev + 1)
+        gamma = vi - prev
+        a = v[starts[nz] + prev]; b = v[starts[nz] + nxt]
+        diff = b - a
+        res[nz] = np.where(gamma >= 0.5, b - diff * (1 - gamma), a + diff * gamma)
+        out.append(res)
+    return out
+
+#Gaps between consecutive values of the same segment -> (gaps, gap_seg)
+def seg_gaps(values, seg):
+    same = seg[1:] == seg[:-1]
+    return (values[1:] - values[:-1])[same], seg[1:][same]
+
+#Python objects with the legacy types: int 0 where the scalar code returned a bare 0
+def typed(arr, ok):
+    out = arr.astype(object)
+    out[~ok] = 0
+    return out.tolist()
+
+#Active runs = stretches of sorted times split at gaps > threshold. A trailing run of zero
+#length counts only with zero_tail (the client's active_idle_stats; the worker's drops it).
+def active_idle(ts_f, fid_s, nf, n_flow, threshold, zero_tail=False):
+    n = len(ts_f)
+    gaps = np.diff(ts_f)
+    same = fid_s[1:] == fid_s[:-1]
+    is_idle = same & (gaps > threshold)
+    run_start = np.ones(n, dtype=bool); run_start[1:] = ~same | is_idle
+    run_end = np.ones(n, dtype=bool); run_end[:-1] = ~same | is_idle
+    starts, ends = np.flatnonzero(run_start), np.flatnonzero(run_end)
+    run_fid = fid_s[starts]
+    active = ts_f[ends] - ts_f[starts]
+    last_run = np.ones(len(starts), dtype=bool); last_run[:-1] = run_fid[1:] != run_fid[:-1]
+    keep = n_flow[run_fid] >= 2
+    if not zero_tail:
+        keep &= ~last_run | (active != 0)
+    has2 = n_flow >= 2
+
+    def stats(values, seg):
+        counts, _, mean, std, mn, mx = seg_stats(values, seg, nf)
+        return has2 & (counts > 0), mn, mean, mx, std
+
+    return stats(active[keep], run_fid[keep]), stats(gaps[is_idle], fid_s[1:][is_idle])
+
+
+# ---------------- flow records -> flat arrays ----------------
+SERIES = (("times", np.float64), ("lens", np.float64), ("flags", np.int64))
+
+#Pack the per-direction series (fl["fwd_"+field], fl["bwd_"+field]) of many flow records
+#in one pass over the records into {field: (values, seg)} with seg = 2*flow + (0 fwd /
+#1 bwd). Series may be arrays or lists (an empty list converts as float64, hence the unsafe
+#cast for the integer flags). Records a capture thread still appends to go in as snapshots.
+def pack(flow_list):
+    series = {field: [] for field, _ in SERIES}
+    for fl in flow_list:
+        for field, out in series.items():
+            out += (fl["fwd_" + field], fl["bwd_" + field])
+    packed = {}
+    for field, dtype in SERIES:
+        out = series[field]
+        counts = np.fromiter(map(len, out), np.int64, len(out))
+        packed[field] = (np.concatenate(out, dtype=dtype, casting="unsafe"), np.repeat(np.arange(len(out)), counts))
+    return packed
@@ -0,0 +1,77 @@
+# flow_sampling.py [Flow and packet sampling for high-rate links (--flow-sample / --packet-sample)]
+# Both decisions are taken before the flow table is looked up, so dropped traffic costs
+# one random draw or one hash of the packed flow key, and never allocates flow state.
+#   flow sampling    keep 1 in N flows, chosen by a hash of the direction-agnostic key.
+#                    A kept flow keeps every packet, so its features stay exact. The choice
+#                    only depends on the 5-tuple, N and the seed: same flows on every run,
+#                    shard and sensor.
+#   packet sampling  keep each packet with probability 1/N (seeded, reproducible). Packet,
+#                    byte and flag counts (and their per-second rates) are scaled back up
+#                    by N; length mean/std/percentiles are estimates from the sample; IAT
+#                    and active/idle columns describe the sampled stream (gaps ~N times longer).
+# Every row carries both rates (1 = not sampled).
+
+import random, zlib
+
+
+FLOW_N = 1
+PACKET_N = 1
+ENABLED = False
+SEED = 0
+_rng = random.Random(SEED)
+_flow_cut = 1 << 32
+
+GOLDEN = 0x9E3779B1      # spreads crc32 values over the 32-bit range before the cut
+SCALED = ("TotFwdPkts", "TotBwdPkts", "TotLenFwd", "TotLenBwd", "TotalBytes", "TotalPackets",
+          "BytesPerSec", "PktsPerSec",
+          "Fwd_SYN", "Fwd_FIN", "Fwd_RST", "Fwd_PSH", "Fwd_ACK", "Fwd_URG",
+          "Bwd_SYN", "Bwd_FIN", "Bwd_RST", "Bwd_PSH", "Bwd_ACK", "Bwd_URG")
+RATE_COLUMNS = ("FlowSamplingRate", "PktSamplingRate")
+
+
+def configure(flow_n=1, packet_n=1, seed=0):
+    global FLOW_N, PACKET_N, ENABLED, SEED, _flow_cut
+    FLOW_N, PACKET_N, SEED = max(1, int(flow_n)), max(1, int(packet_n)), seed
+    ENABLED = FLOW_N > 1 or PACKET_N > 1
+    _flow_cut = (1 << 32) // FLOW_N
+    reseed(0)
+
+#Independent, reproducible packet draws per input chunk / worker
+def reseed(salt):
+    global _rng
+    _rng = random.Random(SEED * 1_000_003 + salt)
+
+def options():
+    return (FLOW_N, PACKET_N, SEED)
+
+def keep_packet():
+    return PACKET_N == 1 or _rng.random() * PACKET_N < 1.0
+
+def keep_flow(key):
+    return FLOW_N == 1 or (zlib.crc32(key, SEED) * GOLDEN & 0xFFFFFFFF) < _flow_cut
+
+#Add the rate columns, scale counts when packets were sampled; returns the row
+def scale_row(row):
+    if PACKET_N > 1:
+        for name in SCALED:
+            if name in row:
+                row[name] *= PACKET_N
+    row["FlowSamplingRate"] = FLOW_N
+    row["PktSamplingRate"] = PACKET_N
+    return row
+
+#scale_row for n rows held as columns ({name: list}, flow_features batches)
+def scale_columns(cols, n):
+    if PACKET_N > 1:
+        for name in SCALED:
+            if name in cols:
+                cols[name] = [v * PACKET_N for v in cols[name]]
+    cols["FlowSamplingRate"] = [FLOW_N] * n
+    cols["PktSamplingRate"] = [PACKET_N] * n
+    return cols
+
+def describe():
+    parts = []
+    if FLOW_N > 1: parts.append(f"1 in {FLOW_N} flows")
+    if PACKET_N > 1: parts.append(f"1 in {PACKET_N} packets (counts scaled x{PACKET_N})")
+    return ", ".join(parts) or "off"
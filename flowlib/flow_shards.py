@@ -0,0 +1,122 @@
+# flow_shards.py [Hash-sharded multi-process flow assembly]
+# The parent decodes packets and routes each one by its direction-agnostic flow key to
+# one of N worker processes. Every worker owns a private (shared-nothing) flow table,
+# so all packets of a flow land in the same process and no locking is needed there.
+# Commands (e.g. "rows") are broadcast to every shard and their results gathered.
+
+import multiprocessing as mp
+import os, queue, signal, threading
+
+
+DEFAULT_BATCH = 1024     # items per queue message, keeps pickling/IPC overhead per packet low
+QUEUE_DEPTH = 256        # messages per shard before submit() blocks (back-pressure)
+
+
+#Pin the calling process to one CPU (Linux sched_setaffinity, psutil elsewhere)
+def pin_to_cpu(cpu):
+    cpu %= os.cpu_count() or 1
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, {cpu})
+        else:
+            import psutil
+            psutil.Process().cpu_affinity([cpu])
+        return True
+    except Exception as e:
+        print(f"[!] Could not pin shard to CPU {cpu}: {e}")
+        return False
+
+
+def _run_worker(worker_main, shard, inq, outq, pin_cpus, worker_args):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)   # the parent handles Ctrl+C and shuts us down
+    if pin_cpus:
+        pin_to_cpu(shard)
+    worker_main(shard, inq, outq, *worker_args)
+
+
+#Generic worker loop: on_items(list) for packet batches, on_command(cmd) -> result for broadcasts
+def serve(shard, inq, outq, on_items, on_command):
+    while True:
+        msg = inq.get()
+        if msg is None:
+            break
+        kind, payload = msg
+        if kind == "items":
+            on_items(payload)
+        else:
+            outq.put((shard, on_command(payload)))
+
+
+class ShardPool:
+    """N worker processes, each fed the items whose key hashes to it"""
+
+    def __init__(self, n_workers, worker_main, pin_cpus=False, batch_size=DEFAULT_BATCH, worker_args=()):
+        self.n = n_workers
+        self.batch_size = batch_size
+        self.inqs = [mp.Queue(maxsize=QUEUE_DEPTH) for _ in range(n_workers)]
+        self.outq = mp.Queue()
+        self.buffers = [[] for _ in range(n_workers)]
+        self.lock = threading.RLock()          # capture thread submits while the dump thread (or Ctrl+C) collects
+        self.collect_lock = threading.Lock()
+        self.procs = []
+        for shard in range(n_workers):
+            p = mp.Process(target=_run_worker, daemon=True,
+                           args=(worker_main, shard, self.inqs[shard], self.outq, pin_cpus, worker_args))
+            p.start()
+            self.procs.append(p)
+        print(f"[*] Started {n_workers} flow shard workers" + (" (pinned)" if pin_cpus else ""))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, key, item):
+        shard = hash(key) % self.n
+        with self.lock:
+            buf = self.buffers[shard]
+            buf.append(item)
+            if len(buf) < self.batch_size:
+                return
+            self.buffers[shard] = []
+        self.inqs[shard].put(("items", buf))
+
+    def flush(self):
+        with self.lock:
+            pending = [(shard, buf) for shard, buf in enumerate(self.buffers) if buf]
+            self.buffers = [[] for _ in range(self.n)]
+        for shard, buf in pending:
+            self.inqs[shard].put(("items", buf))
+
+    def collect(self, cmd):
+        """Broadcast cmd and return the per-shard results in shard order.
+        Every item submitted before the call is processed before the command runs."""
+        with self.collect_lock:
+            self.flush()
+            for q in self.inqs:
+                q.put(("cmd", cmd))
+            results = [None] * self.n
+            for _ in range(self.n):
+                while True:
+                    try:
+                        shard, result = self.outq.get(timeout=1.0)
+                        break
+                    except queue.Empty:
+                        dead = [p.pid for p in self.procs if not p.is_alive()]
+                        if dead:
+                            raise RuntimeError(f"flow shard worker(s) {dead} exited")
+                results[shard] = result
+            return results
+
+    def close(self):
+        if not self.procs:
+            return
+        self.flush()
+        for q in self.inqs:
+            q.put(None)
+        for p in self.procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        self.procs = []
@@ -0,0 +1,166 @@
+# flow_table.py [Compact flow table: packed keys and __slots__ flow records]
+# A flow used to be a dict of 13 string keys holding Python lists (a float object per
+# timestamp, an int object per length) under a key made of nested tuples of strings.
+# Here the key is one bytes object (protocol, then both endpoints as packed address +
+# port, lower endpoint first) and the record has fixed slots with typed arrays
+# (8 bytes per timestamp, 4 per length, 2 per flag word).
+# Records keep dict-style access ( f["end"], f.get("fin") ) so existing code reads them
+# unchanged. Run this file to compare bytes per flow of both layouts.
+# Threading: a record is owned by the thread that builds the flow table (the capture loop,
+# or a shard worker); only that thread calls add/extend. Any other thread (periodic dumps,
+# uploads) reads a flow through snapshot(): appending to an array while another thread
+# holds its buffer fails, and the series grow one after another during add.
+
+import socket, struct
+from array import array
+
+
+PORT = struct.Struct("!H")
+PROTO_CODES = {"TCP": b"\x06", "UDP": b"\x11"}
+
+
+#IP string + port -> 6 (IPv4) or 18 (IPv6) bytes; ordering of these is the key orientation
+def pack_endpoint(ip, port):
+    return socket.inet_pton(socket.AF_INET6 if ":" in ip else socket.AF_INET, ip) + PORT.pack(port or 0)
+
+#Direction-agnostic packed 5-tuple: same bytes for both directions of a flow
+def pack_key(proto, a_ip, a_port, b_ip, b_port):
+    a = pack_endpoint(a_ip, a_port)
+    b = pack_endpoint(b_ip, b_port)
+    p = PROTO_CODES.get(proto) or b"\x00" + bytes((len(proto),)) + proto.encode()
+    return p + a + b if a <= b else p + b + a
+
+#Packed key -> (proto, (ip, port), (ip, port)) for logs and debugging
+def unpack_key(key):
+    if key[0]:
+        proto, rest = ("TCP" if key[0] == 6 else "UDP"), key[1:]
+    else:
+        proto, rest = key[2:2 + key[1]].decode(), key[2 + key[1]:]
+    n = len(rest) // 2
+    fam = socket.AF_INET if n == 6 else socket.AF_INET6
+    return (proto,) + tuple((socket.inet_ntop(fam, ep[:-2]), PORT.unpack(ep[-2:])[0])
+                            for ep in (rest[:n], rest[n:]))
+
+
+class FlowRecord:
+    """Per-packet series of one bidirectional flow in typed arrays. Optional fields
+    (fin, seq, urls) stay unset until used, so f.get("fin", 0) / "seq" in f work as on a dict."""
+    __slots__ = ("src", "dst", "sport", "dport", "proto", "start", "end",
+                 "fwd_times", "bwd_times", "fwd_lens", "bwd_lens", "fwd_flags", "bwd_flags",
+                 "fin", "seq", "urls")
+
+    def __init__(self, src, dst, sport, dport, proto, ts, length, flags):
+        self.src, self.dst, self.sport, self.dport, self.proto = src, dst, sport, dport, proto
+        self.start = self.end = ts
+        self.fwd_times, self.bwd_times = array("d", (ts,)), array("d")
+        self.fwd_lens, self.bwd_lens = array("I", (length,)), array("I")
+        self.fwd_flags, self.bwd_flags = array("H"), array("H")
+        if flags is not None: self.fwd_flags.append(int(flags))
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return hasattr(self, name)
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def add(self, ts, length, flags, fwd):
+        if ts > self.end: self.end = ts
+        if fwd:
+            self.fwd_times.append(ts); self.fwd_lens.append(length)
+            if flags is not None: self.fwd_flags.append(int(flags))
+        else:
+            self.bwd_times.append(ts); self.bwd_lens.append(length)
+            if flags is not None: self.bwd_flags.append(int(flags))
+
+    #Append a later fragment of the same flow (its fwd side may be our bwd side)
+    def extend(self, other):
+        same = (other.src == self.src and other.dst == self.dst
+                and other.sport == self.sport and other.dport == self.dport)
+        fwd, bwd = ("fwd", "bwd") if same else ("bwd", "fwd")
+        for field in ("times", "lens", "flags"):
+            getattr(self, "fwd_" + field).extend(getattr(other, fwd + "_" + field))
+            getattr(self, "bwd_" + field).extend(getattr(other, bwd + "_" + field))
+        if other.end > self.end: self.end = other.end
+        for url in other.get("urls", ()):
+            self.add_url(url)
+
+    #Private copy for readers on other threads: the series cut to the packets they all have
+    #(add appends times, then lens, then flags; so read the lengths in the opposite order)
+    def snapshot(self):
+        snap = FlowRecord.__new__(FlowRecord)
+        for side in ("fwd_", "bwd_"):
+            flags = getattr(self, side + "flags")
+            nf = len(flags)
+            n = len(getattr(self, side + "lens"))
+            if nf: n = min(n, nf)      # TCP: one flag word per packet
+            setattr(snap, side + "flags", flags[:nf])
+            setattr(snap, side + "lens", getattr(self, side + "lens")[:n])
+            setattr(snap, side + "times", getattr(self, side + "times")[:n])
+        for name in ("src", "dst", "sport", "dport", "proto", "start", "end", "fin", "seq"):
+            if hasattr(self, name): setattr(snap, name, getattr(self, name))
+        if hasattr(self, "urls"): snap.urls = set(self.urls)
+        return snap
+
+    def packets(self):
+        return len(self.fwd_lens) + len(self.bwd_lens)
+
+    def add_url(self, url):
+        try:
+            self.urls.add(url)
+        except AttributeError:
+            self.urls = {url}
+
+
+#Deep size of a container graph (objects shared between flows, e.g. small ints, count once)
+def deep_sizeof(obj, seen=None):
+    import sys
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(deep_sizeof(v, seen) for v in obj)
+    elif hasattr(type(obj), "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, s), seen) for s in type(obj).__slots__ if hasattr(obj, s))
+    return size
+
+
+#Benchmark: bytes per flow (key + record) of the dict/tuple layout vs this one
+def benchmark(n_flows=20000, pkts=10):
+    import random
+    rng = random.Random(1)
+    old, new = {}, {}
+    for i in range(n_flows):
+        src, dst = f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", f"192.168.1.{rng.randrange(1, 255)}"
+        sport, dport, t = rng.randrange(1024, 65535), rng.choice((53, 80, 443)), rng.uniform(0, 3600)
+        f = {"src": src, "dst": dst, "sport": sport, "dport": dport, "proto": "TCP", "start": t, "end": t,
+             "fwd_times": [], "bwd_times": [], "fwd_lens": [], "bwd_lens": [], "fwd_flags": [], "bwd_flags": []}
+        r = None
+        for p in range(pkts):
+            ts, length, flags, side = t + p * 0.01, rng.randrange(40, 1500), 0x10, ("fwd", "bwd")[p & 1]
+            f[side + "_times"].append(ts); f[side + "_lens"].append(length); f[side + "_flags"].append(flags)
+            if r is None: r = FlowRecord(src, dst, sport, dport, "TCP", ts, length, flags)
+            else: r.add(ts, length, flags, side == "fwd")
+        a, b = (src, sport), (dst, dport)
+        old[("TCP", a, b) if a <= b else ("TCP", b, a)] = f
+        new[pack_key("TCP", src, sport, dst, dport)] = r
+    before, after = deep_sizeof(old) / n_flows, deep_sizeof(new) / n_flows
+    print(f"{n_flows} flows x {pkts} packets (IPv4/TCP)")
+    print(f"  dict + tuple key      : {before:8.0f} bytes/flow")
+    print(f"  FlowRecord + bytes key: {after:8.0f} bytes/flow ({after / before:.0%})")
+    return before, after
+
+
+if __name__ == "__main__":
+    import sys
+    for n in (sys.argv[2:] or ["1", "10", "100"]):
+        benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20000, int(n))
@@ -0,0 +1,152 @@
+# prefilter.py [Pre-flow packet filter: CIDR allow/deny radix tree and port sets]
+# Runs on the decoded header fields before make_bi_key(), so excluded traffic (backups,
+# scanners, whole subnets) never builds a key or allocates flow state.
+#   networks  allow/deny CIDRs (IPv4 and IPv6) in a radix tree with 8-bit strides:
+#             a lookup is at most 4 (IPv4) or 16 (IPv6) dict probes and returns the rule
+#             with the longest matching prefix, so "deny 10.0.0.0/8, allow 10.1.0.0/16"
+#             lets 10.1.x.x through. A packet is dropped if either endpoint resolves to
+#             deny; with allow rules present, one endpoint must resolve to allow.
+#   ports     deny if either port is in the deny set; with an allow set, one port must be in it.
+# The kernel side (--bpf) is separate: check_bpf() validates the expression once, the
+# capture backends attach it to their socket.
+
+import socket
+
+
+ALLOW, DENY = True, False
+
+
+class _Node:
+    __slots__ = ("children", "ends")
+
+    def __init__(self):
+        self.children = {}   # next address byte -> _Node
+        self.ends = {}       # address byte -> (prefix length, rule) for prefixes ending in this byte
+
+
+class PrefixTree:
+    """Longest-prefix match over packed IPv4/IPv6 addresses (one tree per address length)"""
+
+    def __init__(self):
+        self.roots = {}      # 4 / 16 -> (root node, [default rule of a /0])
+
+    def insert(self, cidr, rule):
+        addr, _, plen = cidr.strip().partition("/")
+        fam = socket.AF_INET6 if ":" in addr else socket.AF_INET
+        try:
+            raw = socket.inet_pton(fam, addr)
+        except OSError:
+            raise ValueError(f"bad address in {cidr!r}") from None
+        plen = int(plen) if plen else len(raw) * 8
+        if not 0 <= plen <= len(raw) * 8:
+            raise ValueError(f"bad prefix length in {cidr!r}")
+        root, default = self.roots.setdefault(len(raw), (_Node(), [None]))
+        if plen == 0:
+            default[0] = rule
+            return
+        node = root
+        k = (plen - 1) // 8                   # full bytes above the last (partial) stride
+        for b in raw[:k]:
+            node = node.children.setdefault(b, _Node())
+        span = 8 - (plen - 8 * k)             # free low bits of the last byte
+        base = raw[k] & (0xFF << span) & 0xFF
+        for b in range(base, base + (1 << span)):    # prefix expansion within the stride
+            old = node.ends.get(b)
+            if old is None or old[0] <= plen:
+                node.ends[b] = (plen, rule)
+
+    def lookup(self, raw):
+        entry = self.roots.get(len(raw))
+        if entry is None:
+            return None
+        node, (best,) = entry
+        for b in raw:
+            end = node.ends.get(b)
+            if end is not None:
+                best = end[1]
+            node = node.children.get(b)
+            if node is None:
+                break
+        return best
+
+
+def parse_ports(spec):
+    ports = set()
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        ports.update(range(int(lo), int(hi or lo) + 1))
+    return frozenset(ports)
+
+def _split(specs):
+    return [c for s in (specs or ()) for c in s.split(",") if c.strip()]
+
+
+tree = None              # PrefixTree, or None without network rules
+need_allow = False       # allow rules exist: one endpoint must match one
+allow_ports = frozenset()
+deny_ports = frozenset()
+ENABLED = False
+dropped = 0
+SPEC = None
+
+
+#Build the filter from CLI-style specs (lists of comma-separated CIDRs / port lists)
+def configure(allow_nets=(), deny_nets=(), allow_port_spec=None, deny_port_spec=None):
+    global tree, need_allow, allow_ports, deny_ports, ENABLED, SPEC, dropped
+    SPEC = (tuple(allow_nets or ()), tuple(deny_nets or ()), allow_port_spec, deny_port_spec)
+    allow, deny = _split(allow_nets), _split(deny_nets)
+    tree = None
+    if allow or deny:
+        tree = PrefixTree()
+        for cidr in allow: tree.insert(cidr, ALLOW)
+        for cidr in deny: tree.insert(cidr, DENY)
+    need_allow = bool(allow)
+    allow_ports, deny_ports = parse_ports(allow_port_spec), parse_ports(deny_port_spec)
+    ENABLED = tree is not None or bool(allow_ports) or bool(deny_ports)
+    dropped = 0
+
+def options():
+    return SPEC or ((), (), None, None)
+
+def _packed(ip):
+    return socket.inet_pton(socket.AF_INET6 if ":" in ip else socket.AF_INET, ip)
+
+#True if the packet may build flow state
+def accept(src, dst, sport, dport):
+    global dropped
+    if deny_ports and (sport in deny_ports or dport in deny_ports) or \
+       allow_ports and not (sport in allow_ports or dport in allow_ports):
+        dropped += 1
+        return False
+    if tree is not None:
+        a, b = tree.lookup(_packed(src)), tree.lookup(_packed(dst))
+        if a is DENY or b is DENY or (need_allow and a is not ALLOW and b is not ALLOW):
+            dropped += 1
+            return False
+    return True
+
+def describe():
+    parts = []
+    if SPEC and SPEC[0]: parts.append("allow " + ",".join(_split(SPEC[0])))
+    if SPEC and SPEC[1]: parts.append("deny " + ",".join(_split(SPEC[1])))
+    if allow_ports: parts.append(f"allow {len(allow_ports)} ports")
+    if deny_ports: parts.append(f"deny {len(deny_ports)} ports")
+    return "; ".join(parts) or "off"
+
+
+#Compile a BPF expression once to report syntax errors or a missing libpcap before capturing
+def check_bpf(expr, iface=None):
+    try:
+        from scapy.arch.common import compile_filter
+        compile_filter(expr, iface=iface)
+        return None
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+#Attach a BPF program to a raw socket (Linux, needs libpcap to compile)
+def attach_bpf(sock, expr, iface):
+    from scapy.arch.linux import attach_filter
+    attach_filter(sock, expr, iface)
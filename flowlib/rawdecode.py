@@ -0,0 +1,185 @@
+# rawdecode.py [Header-only packet decoder for the flow builders]
+# Unpacks Ethernet/IPv4/IPv6/TCP/UDP straight from the record bytes so the
+# per-packet path never builds (or re-serializes) a Scapy packet.
+
+import gzip, io, socket, struct, sys
+
+
+# Link types we know how to strip (pcap LINKTYPE_* values)
+DLT_NULL = 0
+DLT_EN10MB = 1
+DLT_RAW = 101
+DLT_LINUX_SLL = 113
+DLT_IPV4 = 228
+DLT_IPV6 = 229
+DLT_LINUX_SLL2 = 276
+DLT_LOOP = 108
+
+ETH_P_IP = 0x0800
+ETH_P_IPV6 = 0x86DD
+VLAN_TYPES = (0x8100, 0x88A8, 0x9100)
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+PROTO_NAMES = {IPPROTO_TCP: 'TCP', IPPROTO_UDP: 'UDP'}
+
+# IPv6 extension headers Scapy walks through before reaching TCP/UDP
+IPV6_EXT_HDRS = (0, 43, 60)
+IPV6_FRAG_HDR = 44
+
+_u16 = struct.Struct("!H").unpack_from
+
+
+#Locate the network header -> (ethertype, offset) or (None, None)
+def l3_offset(buf, linktype):
+    if linktype == DLT_EN10MB:
+        if len(buf) < 14: return None, None
+        etype = _u16(buf, 12)[0]; off = 14
+        while etype in VLAN_TYPES and len(buf) >= off + 4:
+            etype = _u16(buf, off + 2)[0]; off += 4
+        return etype, off
+    if linktype in (DLT_RAW, DLT_IPV4, DLT_IPV6):
+        if not buf: return None, None
+        ver = buf[0] >> 4
+        return (ETH_P_IP if ver == 4 else ETH_P_IPV6 if ver == 6 else None), 0
+    if linktype == DLT_LINUX_SLL:
+        if len(buf) < 16: return None, None
+        return _u16(buf, 14)[0], 16
+    if linktype == DLT_LINUX_SLL2:
+        if len(buf) < 20: return None, None
+        return _u16(buf, 0)[0], 20
+    if linktype in (DLT_NULL, DLT_LOOP):
+        if len(buf) < 4: return None, None
+        # DLT_NULL is host byte order, DLT_LOOP network order; AF_INET is 2 everywhere
+        fam = struct.unpack_from("<I" if linktype == DLT_NULL and buf[0] else "!I", buf, 0)[0]
+        if fam == 2: return ETH_P_IP, 4
+        if fam in (10, 24, 28, 30): return ETH_P_IPV6, 4
+        return None, None
+    return None, None
+
+
+#Decode the outer IP + transport header.
+#Returns (ip_version, src_bytes, dst_bytes, proto_num, sport, dport, flags) or None
+#for anything the flow builders would skip (non-IP, non-TCP/UDP, later fragments).
+def decode_headers(buf, linktype=DLT_EN10MB):
+    etype, off = l3_offset(buf, linktype)
+    if etype == ETH_P_IP:
+        if len(buf) < off + 20: return None
+        ihl = (buf[off] & 0x0F) * 4
+        if ihl < 20: return None
+        if _u16(buf, off + 6)[0] & 0x1FFF: return None   # non-first fragment: no L4 header
+        proto = buf[off + 9]
+        src = bytes(buf[off + 12:off + 16]); dst = bytes(buf[off + 16:off + 20])
+        ver = 4
+        off += ihl
+    elif etype == ETH_P_IPV6:
+        if len(buf) < off + 40: return None
+        proto = buf[off + 6]
+        src = bytes(buf[off + 8:off + 24]); dst = bytes(buf[off + 24:off + 40])
+        ver = 6
+        off += 40
+        while proto in IPV6_EXT_HDRS or proto == IPV6_FRAG_HDR:
+            if len(buf) < off + 8: return None
+            if proto == IPV6_FRAG_HDR:
+                if _u16(buf, off + 2)[0] & 0xFFF8: return None
+                proto = buf[off]; off += 8
+            else:
+                proto, off = buf[off], off + (buf[off + 1] + 1) * 8
+    else:
+        return None
+
+    if proto == IPPROTO_TCP:
+        if len(buf) < off + 14: return None
+        sport, dport = struct.unpack_from("!HH", buf, off)
+        flags = buf[off + 13] | ((buf[off + 12] & 0x01) << 8)
+        return ver, src, dst, proto, sport, dport, flags
+    if proto == IPPROTO_UDP:
+        if len(buf) < off + 4: return None
+        sport, dport = struct.unpack_from("!HH", buf, off)
+        return ver, src, dst, proto, sport, dport, None
+    return None
+
+
+def ip_to_str(ver, addr):
+    return socket.inet_ntoa(addr) if ver == 4 else socket.inet_ntop(socket.AF_INET6, addr)
+
+
+#Same fields handle_packet pulls out of a Scapy packet: (src, dst, sport, dport, proto, flags)
+def decode_packet(buf, linktype=DLT_EN10MB):
+    h = decode_headers(buf, linktype)
+    if h is None: return None
+    ver, src, dst, proto, sport, dport, flags = h
+    return ip_to_str(ver, src), ip_to_str(ver, dst), sport, dport, PROTO_NAMES[proto], flags
+
+
+#Iterate a pcap/pcapng file as (record_bytes, timestamp, linktype) without dissecting.
+#Length should be taken as len(record_bytes), i.e. the captured length in the record header.
+def iter_raw_records(path):
+    for data, ts, _, linktype in iter_capture_records(path):
+        yield data, ts, linktype
+
+#Same walk, also giving the original (wire) length: (record_bytes, ts, wirelen, linktype)
+def iter_capture_records(path):
+    from scapy.utils import RawPcapReader, RawPcapNgReader
+    with RawPcapReader(open_capture(path)) as rr:
+        if not isinstance(rr, RawPcapNgReader):   # classic pcap
+            div = 1_000_000_000 if rr.nano else 1_000_000
+            linktype = rr.linktype
+            for data, meta in rr:
+                # int/int true division is correctly rounded, same as float(pkt.time)
+                yield data, (meta.sec * div + meta.usec) / div, meta.wirelen, linktype
+        else:                     # pcapng: per-interface linktype and resolution
+            for data, meta in rr:
+                yield data, ((meta.tshigh << 32) | meta.tslow) / meta.tsresol, meta.wirelen, meta.linktype
+
+
+# ---------------- capture sources: files, stdin, compressed streams ----------------
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+STDIN = "-"
+
+#True when path has to be read front to back: stdin, or a gzip/zstd compressed capture
+def is_stream(path):
+    if path == STDIN:
+        return True
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    return magic[:2] == GZIP_MAGIC or magic == ZSTD_MAGIC
+
+#Binary file object with the uncompressed capture bytes of path ("-" = stdin).
+#gzip/zstd are detected by their magic and decompressed on the fly, never to disk.
+def open_capture(path):
+    f = sys.stdin.buffer if path == STDIN else open(path, "rb")
+    magic = f.peek(4)[:4]
+    if magic[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=f) if path == STDIN else gzip.open(_closed(f, path), "rb")
+    if magic == ZSTD_MAGIC:
+        try:
+            import zstandard
+        except ImportError:
+            if path != STDIN: f.close()
+            raise RuntimeError(f"{path}: reading zstd captures needs the 'zstandard' package")
+        # BufferedReader turns the decompressor's short reads into the exact-size reads the readers expect
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, closefd=path != STDIN),
+                                 buffer_size=1 << 20)
+    return f
+
+def _closed(f, path):
+    f.close()
+    return path
+
+
+#Live capture without dissection: Scapy's listen socket hands us raw frames.
+#Yields (frame_bytes, timestamp, linktype) until stop() returns True.
+def iter_live_frames(iface, stop=lambda: False, bpf=None):
+    import time
+    from scapy.all import conf
+    sock = conf.L2listen(iface=iface, filter=bpf)   # bpf: kernel-side filter expression
+    try:
+        while not stop():
+            cls, data, ts = sock.recv_raw()
+            if data is None: continue
+            linktype = conf.l2types.layer2num.get(cls, DLT_EN10MB)
+            yield data, (ts if ts is not None else time.time()), linktype
+    finally:
+        sock.close()
@@ -0,0 +1,138 @@
+# test_flow_features.py [compute() against the per-flow helpers the worker used before the kernel]
+
+import random, statistics
+import numpy as np
+import pytest
+import flow_features
+
+
+# ---------------- the old per-flow helpers (dashboard worker, before flow_kernel) ----------------
+def safe_mean(x):
+    return statistics.fmean(x) if x else 0.0
+
+def safe_std(x):
+    return statistics.pstdev(x) if len(x) > 1 else 0.0
+
+def safe_div(a, b):
+    return a / b if b != 0 else 0.0
+
+def pctile(lst, q):
+    return float(np.percentile(lst, q)) if lst else 0.0
+
+def iat_stats(times):
+    if len(times) < 2: return (0, 0, 0, 0)
+    gaps = [t2 - t1 for t1, t2 in zip(times[:-1], times[1:])]
+    return (safe_mean(gaps), safe_std(gaps), min(gaps), max(gaps))
+
+def iat_all(times):
+    if len(times) < 2: return (0, 0, 0, 0, 0, 0, 0, 0)
+    gaps = [t2 - t1 for t1, t2 in zip(times[:-1], times[1:])]
+    return (safe_mean(gaps), safe_std(gaps), min(gaps), max(gaps),
+            pctile(gaps, 25), pctile(gaps, 50), pctile(gaps, 75), pctile(gaps, 90))
+
+def total_iat(times):
+    if len(times) < 2: return 0.0
+    return sum(t2 - t1 for t1, t2 in zip(times[:-1], times[1:]))
+
+def active_idle_stats(times, threshold=1.0):
+    if len(times) < 2:
+        return (0, 0, 0, 0, 0, 0, 0, 0)
+    times_sorted = sorted(times)
+    gaps = [t2 - t1 for t1, t2 in zip(times_sorted[:-1], times_sorted[1:])]
+    actives, idles = [], []
+    cur_start = times_sorted[0]
+    for g in gaps:
+        if g <= threshold:
+            continue
+        actives.append(times_sorted[gaps.index(g)] - cur_start)
+        idles.append(g)
+        cur_start = times_sorted[gaps.index(g) + 1]
+    if cur_start != times_sorted[-1]:
+        actives.append(times_sorted[-1] - cur_start)
+    def stats(lst):
+        return (min(lst) if lst else 0, safe_mean(lst) if lst else 0,
+                max(lst) if lst else 0, safe_std(lst) if lst else 0)
+    return stats(actives) + stats(idles)
+
+#The statistical columns of one flow, as dump_flows_to_csv built them
+def old_row(fl):
+    dur = max(0.0, fl["end"] - fl["start"])
+    all_times = sorted(fl["fwd_times"] + fl["bwd_times"])
+    fwd, bwd = fl["fwd_lens"], fl["bwd_lens"]
+    row = {"FlowDuration": dur,
+           "TotFwdPkts": len(fwd), "TotBwdPkts": len(bwd), "TotLenFwd": sum(fwd), "TotLenBwd": sum(bwd),
+           "TotalFwdIAT": total_iat(fl["fwd_times"]), "TotalBwdIAT": total_iat(fl["bwd_times"]),
+           "TotalBytes": sum(fwd) + sum(bwd), "TotalPackets": len(fwd) + len(bwd),
+           "BytesPerSec": safe_div(sum(fwd) + sum(bwd), dur), "PktsPerSec": safe_div(len(fwd) + len(bwd), dur),
+           "FwdBwdPktRatio": safe_div(len(fwd), len(bwd)), "FwdBwdByteRatio": safe_div(sum(fwd), sum(bwd))}
+    for side, lens in (("Fwd", fwd), ("Bwd", bwd)):
+        row.update({f"{side}PktLenMean": safe_mean(lens), f"{side}PktLenStd": safe_std(lens),
+                    f"{side}PktLenMin": min(lens, default=0), f"{side}PktLenMax": max(lens, default=0)})
+        row.update({f"{side}PktLenPct{q}": pctile(lens, q) for q in (25, 50, 75, 90)})
+    for side, times in (("Flow", all_times), ("Fwd", fl["fwd_times"]), ("Bwd", fl["bwd_times"])):
+        st, allst = iat_stats(times), iat_all(times)
+        row.update(zip((f"{side}IAT{s}" for s in ("Mean", "Std", "Min", "Max")), st))
+        row.update(zip((f"{side}IAT{q}" for q in (25, 50, 75, 90)), allst[4:]))
+    for side in ("Fwd", "Bwd"):
+        flags = fl[side.lower() + "_flags"]
+        for name, mask in (("SYN", 0x02), ("FIN", 0x01), ("RST", 0x04), ("PSH", 0x08), ("ACK", 0x10), ("URG", 0x20)):
+            row[f"{side}_{name}"] = sum(1 for f in flags if f & mask)
+    names = [f"{s}{p}" for p in ("Active", "Idle") for s in ("Min", "Mean", "Max", "Std")]
+    row.update(zip(names, active_idle_stats(all_times)))
+    row["SrcPortCat"], row["DstPortCat"] = flow_features.port_cat(fl["sport"]), flow_features.port_cat(fl["dport"])
+    return row
+
+
+# ---------------- fixture flows ----------------
+def make_flow(rng, n_fwd, n_bwd, sport=40000, dport=443, spread=0.4):
+    t, times = 1000.0 + rng.random(), []
+    for _ in range(n_fwd + n_bwd):
+        t += rng.expovariate(1 / spread)
+        times.append(t)
+    rng.shuffle(times)
+    fwd_times, bwd_times = sorted(times[:n_fwd]), sorted(times[n_fwd:])
+    fl = {"sport": sport, "dport": dport, "start": min(times, default=0.0), "end": max(times, default=0.0),
+          "fwd_times": fwd_times, "bwd_times": bwd_times,
+          "fwd_lens": [rng.randint(40, 1500) for _ in fwd_times], "bwd_lens": [rng.randint(40, 1500) for _ in bwd_times],
+          "fwd_flags": [rng.choice((0x02, 0x10, 0x18, 0x11, 0x04, 0x30)) for _ in fwd_times],
+          "bwd_flags": [rng.choice((0x12, 0x10, 0x18, 0x11)) for _ in bwd_times[:-1]]}   # a UDP-ish tail
+    return fl
+
+def flows():
+    rng = random.Random(7)
+    out = [make_flow(rng, 1, 0), make_flow(rng, 2, 0, 53, 5353), make_flow(rng, 1, 1, 1935, 80),
+           make_flow(rng, 0, 3, 22, 50000), make_flow(rng, 5, 4, spread=2.0), make_flow(rng, 30, 25, 5222, 8554)]
+    out += [make_flow(rng, rng.randint(0, 12), rng.randint(1, 12), rng.randint(1, 65535), rng.randint(1, 65535),
+                      spread=rng.choice((0.05, 0.5, 1.5))) for _ in range(60)]
+    return out
+
+
+def test_compute_matches_per_flow_helpers():
+    flow_list = flows()
+    cols = flow_features.compute(flow_list)
+    assert list(cols) == list(flow_features.FEATURES)
+    for i, fl in enumerate(flow_list):
+        for name, want in old_row(fl).items():
+            got = cols[name][i]
+            assert type(got) is type(want) or isinstance(want, float), (i, name, got, want)
+            if name.endswith(("Mean", "Std", "Active", "Idle")) or "IAT" in name:
+                assert got == pytest.approx(want, rel=1e-9, abs=1e-12), (i, name)
+            else:
+                assert got == want, (i, name)
+
+
+def test_compute_selected_columns_only():
+    flow_list = flows()
+    full = flow_features.compute(flow_list)
+    cols = flow_features.compute(flow_list, ["FlowDuration", "TotalPackets", "FwdIAT90"])
+    assert list(cols) == ["FlowDuration", "TotalPackets", "FwdIAT90"]
+    assert all(cols[name] == full[name] for name in cols)
+    assert flow_features.compute([]) == {}
+
+
+def test_resolve_and_plan():
+    assert flow_features.resolve("csv") == list(flow_features.FEATURES)
+    assert flow_features.resolve("FlowDuration,model")[0] == "FlowDuration"
+    assert "flag_counts" not in flow_features.plan(flow_features.resolve("model"))
+    with pytest.raises(ValueError, match="nope"):
+        flow_features.resolve("model,nope")
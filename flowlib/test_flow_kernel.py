@@ -0,0 +1,69 @@
+# test_flow_kernel.py [Segmented kernels against per-segment NumPy/statistics calls]
+
+import statistics
+import numpy as np
+import pytest
+import flow_kernel
+from flow_kernel import PCTS, seg_percentiles, seg_stats, seg_gaps
+
+
+#Random segments (some empty, some of one value, ties) -> (values, seg, nseg, counts)
+def segments(seed, nseg=40, integer=False):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(0, 9, nseg)
+    counts[:3] = (0, 1, 2)
+    seg = np.repeat(np.arange(nseg), counts)
+    values = rng.integers(0, 20, len(seg)).astype(np.float64) if integer else rng.exponential(3.0, len(seg))
+    return values, seg, nseg, counts
+
+
+@pytest.mark.parametrize("seed,integer", [(0, False), (1, True), (2, False)])
+def test_seg_percentiles_match_np_percentile(seed, integer):
+    values, seg, nseg, counts = segments(seed, integer=integer)
+    shuffled = np.random.default_rng(seed).permutation(len(values))
+    order = np.argsort(seg[shuffled], kind="stable")   # grouped by segment, unsorted within
+    values, seg = values[shuffled][order], seg[shuffled][order]
+    got = seg_percentiles(values, seg, nseg, counts)
+    for i, q in enumerate(PCTS):
+        for s in range(nseg):
+            part = values[seg == s]
+            assert got[i][s] == (np.percentile(part, q) if len(part) else 0.0)   # bit for bit
+
+
+def test_seg_percentiles_other_quantiles():
+    values, seg, nseg, counts = segments(3)
+    qs = (0, 1, 33.3, 99, 100)
+    got = seg_percentiles(values, seg, nseg, counts, qs)
+    for i, q in enumerate(qs):
+        for s in np.flatnonzero(counts):
+            assert got[i][s] == np.percentile(values[seg == s], q)
+
+
+def test_seg_stats_match_statistics():
+    values, seg, nseg, counts = segments(4)
+    n, sums, mean, std, mins, maxs = seg_stats(values, seg, nseg)
+    assert n.tolist() == counts.tolist()
+    for s in range(nseg):
+        part = values[seg == s].tolist()
+        assert sums[s] == pytest.approx(sum(part))
+        assert mean[s] == pytest.approx(statistics.fmean(part) if part else 0.0)
+        assert std[s] == pytest.approx(statistics.pstdev(part) if len(part) > 1 else 0.0, abs=1e-12)
+        assert (mins[s], maxs[s]) == ((min(part), max(part)) if part else (0.0, 0.0))
+
+
+def test_seg_gaps_stay_within_segments():
+    values, seg, nseg, counts = segments(5)
+    gaps, gseg = seg_gaps(values, seg)
+    expected = [(s, b - a) for s in range(nseg) for a, b in zip(values[seg == s][:-1], values[seg == s][1:])]
+    assert list(zip(gseg.tolist(), gaps.tolist())) == expected
+
+
+def test_pack_keeps_direction_slots():
+    flows = [{"fwd_times": [1.0, 2.0], "bwd_times": [], "fwd_lens": [60, 70], "bwd_lens": [],
+              "fwd_flags": [2], "bwd_flags": []},
+             {"fwd_times": [], "bwd_times": [3.5], "fwd_lens": [], "bwd_lens": [1500],
+              "fwd_flags": [], "bwd_flags": [16]}]
+    packed = flow_kernel.pack(flows)
+    assert packed["times"][0].tolist() == [1.0, 2.0, 3.5] and packed["times"][1].tolist() == [0, 0, 3]
+    assert packed["lens"][0].tolist() == [60, 70, 1500]
+    assert packed["flags"][0].dtype == np.int64 and packed["flags"][1].tolist() == [0, 3]
@@ -0,0 +1,77 @@
+# test_prefilter.py [accept() over CIDR allow/deny rules and port sets]
+
+import ipaddress, random
+import pytest
+import prefilter
+
+
+@pytest.fixture(autouse=True)
+def reset():
+    yield
+    prefilter.configure()
+
+
+def test_off_by_default():
+    prefilter.configure()
+    assert not prefilter.ENABLED and prefilter.describe() == "off"
+    assert prefilter.accept("10.0.0.1", "10.0.0.2", 1, 2)
+
+
+def test_longest_prefix_wins():
+    prefilter.configure(allow_nets=["10.1.0.0/16"], deny_nets=["10.0.0.0/8,192.168.5.7"])
+    assert prefilter.accept("10.1.2.3", "8.8.8.8", 1, 2)          # allow /16 inside deny /8
+    assert not prefilter.accept("10.2.0.1", "10.1.0.1", 1, 2)     # either endpoint denied
+    assert not prefilter.accept("192.168.5.7", "10.1.0.1", 1, 2)  # host rule
+    assert not prefilter.accept("8.8.8.8", "1.1.1.1", 1, 2)       # allow rules: one endpoint must match
+    assert prefilter.dropped == 3
+
+
+def test_deny_only_and_ipv6():
+    prefilter.configure(deny_nets=["2001:db8::/32", "172.16.0.0/12"])
+    assert prefilter.accept("2001:db9::1", "fe80::1", 1, 2)
+    assert not prefilter.accept("fe80::1", "2001:db8:ffff::1", 1, 2)
+    assert prefilter.accept("172.32.0.1", "8.8.8.8", 1, 2)
+    assert not prefilter.accept("172.31.255.255", "8.8.8.8", 1, 2)
+
+
+def test_default_route():
+    prefilter.configure(allow_nets=["0.0.0.0/0"], deny_nets=["10.0.0.0/8"])
+    assert prefilter.accept("1.2.3.4", "5.6.7.8", 1, 2)
+    assert not prefilter.accept("10.9.9.9", "5.6.7.8", 1, 2)
+    assert not prefilter.accept("::1", "::2", 1, 2)               # no IPv6 allow rule
+
+
+def test_ports():
+    prefilter.configure(allow_port_spec="80,443,8000-8002", deny_port_spec="8001")
+    assert prefilter.accept("1.1.1.1", "2.2.2.2", 50000, 443)
+    assert prefilter.accept("1.1.1.1", "2.2.2.2", 8002, 50000)
+    assert not prefilter.accept("1.1.1.1", "2.2.2.2", 8001, 443)
+    assert not prefilter.accept("1.1.1.1", "2.2.2.2", 50000, 22)
+    assert not prefilter.accept("1.1.1.1", "2.2.2.2", None, None)
+
+
+def test_bad_rules():
+    with pytest.raises(ValueError):
+        prefilter.configure(deny_nets=["10.0.0.0/33"])
+    with pytest.raises(ValueError):
+        prefilter.configure(allow_nets=["10.0.0.300/8"])
+
+
+#The radix tree against a linear longest-prefix scan with ipaddress
+def test_matches_linear_scan():
+    rng = random.Random(3)
+    rules = []
+    for _ in range(200):
+        plen = rng.choice((0, 1, 7, 8, 9, 12, 15, 16, 17, 23, 24, 25, 31, 32))
+        net = ipaddress.ip_network((rng.getrandbits(32) & ~((1 << 32 - plen) - 1), plen))
+        rules.append((net, rng.random() < 0.5))
+    tree = prefilter.PrefixTree()
+    for net, rule in rules:
+        tree.insert(str(net), rule)
+    for _ in range(2000):
+        addr = ipaddress.ip_address(rng.getrandbits(32))
+        best = None
+        for net, rule in rules:        # same prefix inserted twice: the later rule wins
+            if addr in net and (best is None or net.prefixlen >= best[0]):
+                best = (net.prefixlen, rule)
+        assert tree.lookup(addr.packed) == (best and best[1])
@@ -0,0 +1,67 @@
+# test_rawdecode.py [decode_packet against the Scapy dissection it replaced, on a small fixture pcap]
+
+import pytest
+import rawdecode
+
+scapy = pytest.importorskip("scapy.all")
+from scapy.all import ARP, ICMP, IP, IPv6, TCP, UDP, Dot1Q, Ether, IPv6ExtHdrFragment, IPv6ExtHdrHopByHop, Raw, rdpcap, wrpcap
+
+
+ETH = Ether(src="02:00:00:00:00:01", dst="02:00:00:00:00:02")
+PACKETS = [
+    ETH / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=443, flags="S"),
+    ETH / IP(src="10.0.0.2", dst="10.0.0.1") / TCP(sport=443, dport=40000, flags="SA") / Raw(b"x" * 40),
+    ETH / IP(src="10.0.0.1", dst="10.0.0.2", ihl=6, options=b"\x01\x01\x01\x00") / TCP(sport=1, dport=2, flags="FPU"),
+    ETH / IP(src="10.0.0.1", dst="8.8.8.8") / UDP(sport=5353, dport=53) / Raw(b"q"),
+    ETH / Dot1Q(vlan=7) / IP(src="192.168.1.1", dst="192.168.1.2") / TCP(sport=80, dport=8080, flags="A"),
+    ETH / Dot1Q(vlan=7) / Dot1Q(vlan=8) / IPv6(src="fe80::1", dst="fe80::2") / UDP(sport=546, dport=547),
+    ETH / IPv6(src="2001:db8::1", dst="2001:db8::2") / TCP(sport=5000, dport=22, flags="R"),
+    ETH / IPv6(src="2001:db8::1", dst="2001:db8::2") / IPv6ExtHdrHopByHop() / UDP(sport=1000, dport=2000),
+    ETH / IPv6(src="2001:db8::1", dst="2001:db8::2") / IPv6ExtHdrFragment(offset=0, m=1) / TCP(sport=7, dport=9),
+    ETH / IPv6(src="2001:db8::1", dst="2001:db8::2") / IPv6ExtHdrFragment(offset=100, nh=6) / Raw(b"y" * 16),
+    ETH / IP(src="10.0.0.1", dst="10.0.0.2", frag=185, proto=6) / Raw(b"z" * 20),
+    ETH / IP(src="10.0.0.1", dst="10.0.0.2") / ICMP(),
+    ETH / ARP(psrc="10.0.0.1", pdst="10.0.0.2"),
+    ETH / IP(src="10.0.0.1", dst="10.0.0.2") / Raw(b"\x00\x01"),   # TCP header cut off
+]
+
+
+#Fields handle_packet took from the Scapy packet, or None where it skipped the packet
+def scapy_fields(pkt):
+    ip = pkt[IP] if IP in pkt else pkt[IPv6] if IPv6 in pkt else None
+    if ip is None: return None
+    if TCP in pkt: l4 = pkt[TCP]; return ip.src, ip.dst, int(l4.sport), int(l4.dport), "TCP", int(l4.flags)
+    if UDP in pkt: l4 = pkt[UDP]; return ip.src, ip.dst, int(l4.sport), int(l4.dport), "UDP", None
+    return None
+
+
+@pytest.fixture
+def fixture_pcap(tmp_path):
+    path = str(tmp_path / "fixture.pcap")
+    wrpcap(path, PACKETS)
+    return path
+
+
+def test_decode_packet_matches_scapy(fixture_pcap):
+    raw = list(rawdecode.iter_raw_records(fixture_pcap))
+    ref = rdpcap(fixture_pcap)
+    assert len(raw) == len(ref) == len(PACKETS)
+    for (data, ts, linktype), pkt in zip(raw, ref):
+        assert linktype == rawdecode.DLT_EN10MB
+        assert ts == pytest.approx(float(pkt.time))
+        assert len(data) == len(bytes(pkt))
+        assert rawdecode.decode_packet(data, linktype) == scapy_fields(pkt), pkt.summary()
+
+
+def test_decode_packet_without_ethernet():
+    pkt = IP(src="10.1.2.3", dst="10.3.2.1") / UDP(sport=1, dport=2)
+    expected = ("10.1.2.3", "10.3.2.1", 1, 2, "UDP", None)
+    assert rawdecode.decode_packet(bytes(pkt), rawdecode.DLT_RAW) == expected
+    assert rawdecode.decode_packet(b"\x02\x00\x00\x00" + bytes(pkt), rawdecode.DLT_NULL) == expected
+    assert rawdecode.decode_packet(b"\x00" * 14 + b"\x08\x00" + bytes(pkt), rawdecode.DLT_LINUX_SLL) == expected
+
+
+@pytest.mark.parametrize("cut", [0, 10, 14, 20, 33, 47])
+def test_decode_packet_truncated(cut):
+    data = bytes(PACKETS[0])[:cut]
+    assert rawdecode.decode_packet(data) is None
@@ -2,9 +2,11 @@
 # Minimal CIC-style flow features from a PCAP (Windows-friendly, no tcpdump)
 # Requires: scapy (you already have it)
 
-import argparse, csv, math, statistics, time, threading, signal, sys, os
+import argparse, csv, math, time, threading, signal, sys, os
+#Flow modules shared by the client, the dashboard worker and the legacy scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "flowlib"))
 from scapy.all import PcapReader, IP, IPv6, TCP, UDP, sniff
-import numpy as np
+import flow_features
 
 
 flows = {}
@@ -13,84 +15,7 @@ written_ids = set()
 
 
 
-#Statistical Helper Functions(To prevent mathematical errors)
-def safe_mean(x):
-    return statistics.fmean(x) if x else 0.0
-
-def safe_std(x):
-    return statistics.pstdev(x) if len(x) > 1 else 0.0
-
-
-def safe_div(a, b): 
-    return a / b if b != 0 else 0.0 #To check if safe division
-
-
-#To calculate percentiles for various metrics to provide distribution insights beyond mean/std
-def pctile(lst, q):
-    return float(np.percentile(lst, q)) if lst else 0.0
-
-
-#It takes a list of packet timestamps as input and returns the metrics below.This helps in revealing burst patters, detects retransmission/Out of order etc.
-#Small Gaps->Bursty Traffic(HTTP requests or video streaming, Large Gaps->Idle periods,delayed responses, Variable Gaps->Congested Network or mixed traffic types)
-def iat_stats(times):
-    if len(times) < 2: return (0,0,0,0)
-    gaps = [t2 - t1 for t1,t2 in zip(times[:-1], times[1:])]
-    return (safe_mean(gaps), safe_std(gaps), min(gaps), max(gaps))
-
-
-#Provides complete statistical distribution of iat, including percentiles for detailed analysis
-def iat_all(times):
-    if len(times) < 2: return (0,0,0,0,0,0,0,0)
-    gaps = [t2 - t1 for t1,t2 in zip(times[:-1], times[1:])]
-    return (
-        safe_mean(gaps), safe_std(gaps), min(gaps), max(gaps),
-        pctile(gaps,25), pctile(gaps,50), pctile(gaps,75), pctile(gaps,90)
-    )
-
-#Total sum of iat [total time span covered by the gaps between packets (excluding the actual packet processing time).]
-def total_iat(times):
-    if len(times) < 2: return 0.0
-    gaps = [t2 - t1 for t1,t2 in zip(times[:-1], times[1:])]
-    return sum(gaps)
-
-
-
-#Separates network activity into bursts (active) and pauses (idle) using a threshold (1.0 second default).
-def active_idle_stats(times, threshold=1.0):
-    #Sort timestamps 
-    if len(times) < 2:
-        return (0,0,0,0,0,0,0,0)
-    times_sorted = sorted(times)
-    gaps = [t2 - t1 for t1, t2 in zip(times_sorted[:-1], times_sorted[1:])]
-
-    #Identify gaps > threshold as idle periods , Periods between idle gaps are active bursts
-    actives, idles = [], []
-    cur_start = times_sorted[0]
-    for g in gaps:
-        if g <= threshold:
-            continue
-        else:
-            actives.append(times_sorted[gaps.index(g)] - cur_start)
-            idles.append(g)
-            cur_start = times_sorted[gaps.index(g)+1]
-    # last active
-    if cur_start != times_sorted[-1]:
-        actives.append(times_sorted[-1] - cur_start)
-
-    #Calculate statistics for both active and idle periods
-    def stats(lst):
-        return (
-            min(lst) if lst else 0,
-            safe_mean(lst) if lst else 0,
-            max(lst) if lst else 0,
-            safe_std(lst) if lst else 0
-        )
-
-    min_act, mean_act, max_act, std_act = stats(actives)
-    min_idle, mean_idle, max_idle, std_idle = stats(idles)
-
-    return (min_act, mean_act, max_act, std_act,
-            min_idle, mean_idle, max_idle, std_idle)
+#Flow features (statistics, percentiles, flags, active/idle) come from flow_features.py
 
 
 #Packet Length Extraction
@@ -110,7 +35,7 @@ def get_ip_layer(pkt):
 
 #Transport Layer Analysis->Identifies TCP/UDP Protocols,src/dst ports
 def get_l4_info(pkt):
-    if TCP in pkt: l4=pkt[TCP]; return 'TCP', int(l4.sport), int(l4.dport), l4.flags
+    if TCP in pkt: l4=pkt[TCP]; return 'TCP', int(l4.sport), int(l4.dport), int(l4.flags)
     if UDP in pkt: l4=pkt[UDP]; return 'UDP', int(l4.sport), int(l4.dport), None
     return None,None,None,None
 
@@ -181,89 +106,13 @@ def dump_flows_to_csv(filename):
         "MinIdle","MeanIdle","MaxIdle","StdIdle",
         "SrcPortCat","DstPortCat"
     ]
+    snapshot=list(flows.values())
+    feats=headers[6:]
+    cols=flow_features.compute(snapshot,feats)
     with open(filename,"w",newline="",encoding="utf-8") as fcsv:
-        w=csv.DictWriter(fcsv,fieldnames=headers); w.writeheader()
-        for idx,(key,fl) in enumerate(flows.items(),start=1):
-            dur=max(0.0,fl["end"]-fl["start"])
-            all_times=sorted(fl["fwd_times"]+fl["bwd_times"])
-            flow_iat=iat_stats(all_times)
-            fwd_iat=iat_stats(fl["fwd_times"])
-            bwd_iat=iat_stats(fl["bwd_times"])
-            fwd_len_p=[pctile(fl["fwd_lens"],q) for q in (25,50,75,90)]
-            bwd_len_p=[pctile(fl["bwd_lens"],q) for q in (25,50,75,90)]
-            flow_iat_p=iat_all(all_times)
-            fwd_iat_p=iat_all(fl["fwd_times"])
-            bwd_iat_p=iat_all(fl["bwd_times"])
-            total_bytes=sum(fl["fwd_lens"])+sum(fl["bwd_lens"])
-            total_pkts=len(fl["fwd_lens"])+len(fl["bwd_lens"])
-            bytes_per_sec=safe_div(total_bytes,dur)
-            pkts_per_sec=safe_div(total_pkts,dur)
-            pkt_ratio=safe_div(len(fl["fwd_lens"]),len(fl["bwd_lens"]))
-            byte_ratio=safe_div(sum(fl["fwd_lens"]),sum(fl["bwd_lens"]))
-            total_fiat=total_iat(fl["fwd_times"])
-            total_biat=total_iat(fl["bwd_times"])
-            act_idle=active_idle_stats(all_times)
-            def count_flags(flags_list,mask): return sum(1 for f in flags_list if f & mask)
-            fwd_syn=count_flags(fl["fwd_flags"],0x02)
-            fwd_fin=count_flags(fl["fwd_flags"],0x01)
-            fwd_rst=count_flags(fl["fwd_flags"],0x04)
-            fwd_psh=count_flags(fl["fwd_flags"],0x08)
-            fwd_ack=count_flags(fl["fwd_flags"],0x10)
-            fwd_urg=count_flags(fl["fwd_flags"],0x20)
-            bwd_syn=count_flags(fl["bwd_flags"],0x02)
-            bwd_fin=count_flags(fl["bwd_flags"],0x01)
-            bwd_rst=count_flags(fl["bwd_flags"],0x04)
-            bwd_psh=count_flags(fl["bwd_flags"],0x08)
-            bwd_ack=count_flags(fl["bwd_flags"],0x10)
-            bwd_urg=count_flags(fl["bwd_flags"],0x20)
-            def port_cat(p):
-                if p in (80,443): return "Web"
-                if p in (1935,554,8554): return "Multimedia"
-                if p in (5222,5228,443): return "Social"
-                if p<1024: return "System"
-                return "Other"
-            row={
-                "FlowID":idx,
-                "SrcIP":fl["src"],"DstIP":fl["dst"],
-                "SrcPort":fl["sport"],"DstPort":fl["dport"],"Protocol":fl["proto"],
-                "FlowDuration":dur,
-                "TotFwdPkts":len(fl["fwd_lens"]), "TotBwdPkts":len(fl["bwd_lens"]),
-                "TotLenFwd":sum(fl["fwd_lens"]), "TotLenBwd":sum(fl["bwd_lens"]),
-                "FwdPktLenMean":safe_mean(fl["fwd_lens"]), "FwdPktLenStd":safe_std(fl["fwd_lens"]),
-                "FwdPktLenMin":min(fl["fwd_lens"],default=0), "FwdPktLenMax":max(fl["fwd_lens"],default=0),
-                "BwdPktLenMean":safe_mean(fl["bwd_lens"]), "BwdPktLenStd":safe_std(fl["bwd_lens"]),
-                "BwdPktLenMin":min(fl["bwd_lens"],default=0), "BwdPktLenMax":max(fl["bwd_lens"],default=0),
-                "FlowIATMean":flow_iat[0],"FlowIATStd":flow_iat[1],
-                "FlowIATMin":flow_iat[2],"FlowIATMax":flow_iat[3],
-                "FwdIATMean":fwd_iat[0],"FwdIATStd":fwd_iat[1],
-                "FwdIATMin":fwd_iat[2],"FwdIATMax":fwd_iat[3],
-                "BwdIATMean":bwd_iat[0],"BwdIATStd":bwd_iat[1],
-                "BwdIATMin":bwd_iat[2],"BwdIATMax":bwd_iat[3],
-                "TotalFwdIAT":total_fiat,"TotalBwdIAT":total_biat,
-                "TotalBytes":total_bytes,"TotalPackets":total_pkts,
-                "BytesPerSec":bytes_per_sec,"PktsPerSec":pkts_per_sec,
-                "FwdBwdPktRatio":pkt_ratio,"FwdBwdByteRatio":byte_ratio,
-                "FwdPktLenPct25":fwd_len_p[0],"FwdPktLenPct50":fwd_len_p[1],
-                "FwdPktLenPct75":fwd_len_p[2],"FwdPktLenPct90":fwd_len_p[3],
-                "BwdPktLenPct25":bwd_len_p[0],"BwdPktLenPct50":bwd_len_p[1],
-                "BwdPktLenPct75":bwd_len_p[2],"BwdPktLenPct90":bwd_len_p[3],
-                "FlowIAT25":flow_iat_p[4],"FlowIAT50":flow_iat_p[5],
-                "FlowIAT75":flow_iat_p[6],"FlowIAT90":flow_iat_p[7],
-                "FwdIAT25":fwd_iat_p[4],"FwdIAT50":fwd_iat_p[5],
-                "FwdIAT75":fwd_iat_p[6],"FwdIAT90":fwd_iat_p[7],
-                "BwdIAT25":bwd_iat_p[4],"BwdIAT50":bwd_iat_p[5],
-                "BwdIAT75":bwd_iat_p[6],"BwdIAT90":bwd_iat_p[7],
-                "Fwd_SYN":fwd_syn,"Fwd_FIN":fwd_fin,"Fwd_RST":fwd_rst,
-                "Fwd_PSH":fwd_psh,"Fwd_ACK":fwd_ack,"Fwd_URG":fwd_urg,
-                "Bwd_SYN":bwd_syn,"Bwd_FIN":bwd_fin,"Bwd_RST":bwd_rst,
-                "Bwd_PSH":bwd_psh,"Bwd_ACK":bwd_ack,"Bwd_URG":bwd_urg,
-                "MinActive":act_idle[0],"MeanActive":act_idle[1],
-                "MaxActive":act_idle[2],"StdActive":act_idle[3],
-                "MinIdle":act_idle[4],"MeanIdle":act_idle[5],
-                "MaxIdle":act_idle[6],"StdIdle":act_idle[7],
-                "SrcPortCat":port_cat(fl["sport"]), "DstPortCat":port_cat(fl["dport"])
-            }
-            w.writerow(row)
+        w=csv.writer(fcsv); w.writerow(headers)
+        for idx,fl in enumerate(snapshot,start=1):
+            w.writerow([idx,fl["src"],fl["dst"],fl["sport"],fl["dport"],fl["proto"]]+[cols[h][idx-1] for h in feats])
     print(f"[+] Updated {filename} with {len(flows)} flows")
 
 def periodic_dump(filename, interval=30):
@@ -2,12 +2,15 @@
 
 import signal
 import sys
+import os
+#Flow modules shared by the client, the dashboard worker and the legacy scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "flowlib"))
 import csv
 import requests
 import uuid
 from scapy.all import sniff, IP, TCP, UDP
-import time, statistics
-import numpy as np
+import time
+import flow_features
 
 # ========= CONFIG =========
 CSV_FILE = "liveflows.csv"
@@ -18,16 +21,14 @@ ROUTER_ID = "ROUTER-001"
 flows = {}
 row_counter = 0  # row_id tracker
 
-# ========= SAFE HELPERS =========
-def safe_mean(x): return statistics.fmean(x) if x else 0.0
-def safe_std(x): return statistics.pstdev(x) if len(x) > 1 else 0.0
-def safe_div(a, b): return a / b if b else 0.0
-def pctile(lst, q): return float(np.percentile(lst, q)) if lst else 0.0
-
-def iat_stats(times):
-    if len(times) < 2: return (0,0,0,0)
-    gaps = [t2 - t1 for t1,t2 in zip(times[:-1], times[1:])]
-    return (safe_mean(gaps), safe_std(gaps), min(gaps), max(gaps))
+# ========= FEATURES =========
+# the subset this sniffer reports, computed by flow_features.py (nothing else is evaluated)
+FEATURE_COLUMNS = [
+    "FlowDuration", "TotFwdPkts", "TotBwdPkts", "TotLenFwd", "TotLenBwd",
+    "FwdPktLenMean", "BwdPktLenMean", "FwdPktLenStd", "BwdPktLenStd",
+    "FlowIATMean", "FlowIATStd", "FwdIATMean", "BwdIATMean",
+    "TotalBytes", "TotalPackets", "BytesPerSec", "PktsPerSec"
+]
 
 # ========= FLOW HANDLING =========
 def process_packet(src, dst, sport, dport, proto, timestamp, length, flags):
@@ -59,27 +60,8 @@ def process_packet(src, dst, sport, dport, proto, timestamp, length, flags):
     return f
 
 def compute_features(f):
-    dur = max(0.0, f["end"] - f["start"])
-    all_times = sorted(f["fwd_times"] + f["bwd_times"])
-    flow_iat = iat_stats(all_times)
-    fwd_iat = iat_stats(f["fwd_times"])
-    bwd_iat = iat_stats(f["bwd_times"])
-
-    total_bytes = sum(f["fwd_lens"]) + sum(f["bwd_lens"])
-    total_pkts = len(f["fwd_lens"]) + len(f["bwd_lens"])
-
-    return {
-        "FlowDuration": dur,
-        "TotFwdPkts": len(f["fwd_lens"]), "TotBwdPkts": len(f["bwd_lens"]),
-        "TotLenFwd": sum(f["fwd_lens"]), "TotLenBwd": sum(f["bwd_lens"]),
-        "FwdPktLenMean": safe_mean(f["fwd_lens"]), "BwdPktLenMean": safe_mean(f["bwd_lens"]),
-        "FwdPktLenStd": safe_std(f["fwd_lens"]), "BwdPktLenStd": safe_std(f["bwd_lens"]),
-        "FlowIATMean": flow_iat[0], "FlowIATStd": flow_iat[1],
-        "FwdIATMean": fwd_iat[0], "BwdIATMean": bwd_iat[0],
-        "TotalBytes": total_bytes, "TotalPackets": total_pkts,
-        "BytesPerSec": safe_div(total_bytes, dur),
-        "PktsPerSec": safe_div(total_pkts, dur)
-    }
+    cols = flow_features.compute([f], FEATURE_COLUMNS)
+    return {name: cols[name][0] for name in FEATURE_COLUMNS}
 
 # ========= CSV + API =========
 def write_flow_to_csv(flow):
@@ -133,7 +115,7 @@ def handle_packet(pkt):
     send_flow_to_api(feats)
 
 def get_l4_info(pkt):
-    if TCP in pkt: return "TCP", pkt[TCP].sport, pkt[TCP].dport, pkt[TCP].flags
+    if TCP in pkt: return "TCP", pkt[TCP].sport, pkt[TCP].dport, int(pkt[TCP].flags)
     if UDP in pkt: return "UDP", pkt[UDP].sport, pkt[UDP].dport, None
     return None, None, None, None
 